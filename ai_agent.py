@@ -1,18 +1,86 @@
 # ai_agent.py
 import os
+import re
 import json
+import time
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from dotenv import load_dotenv
-from groq import Groq
+
+import intent_classifier
+import metrics
+import tracing
 
 load_dotenv()
 
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-client = Groq(api_key=GROQ_API_KEY)
+# Tiered routing: short, simple messages go to the fast model first and are
+# escalated to the strong one when its answer looks unreliable.
+AI_FAST_MODEL = os.getenv("AI_FAST_MODEL", "llama-3.1-8b-instant")
+AI_STRONG_MODEL = os.getenv("AI_STRONG_MODEL", "llama-3.3-70b-versatile")
+AI_ROUTING = os.getenv("AI_ROUTING", "1") == "1"
+AI_FAST_MAX_CHARS = int(os.getenv("AI_FAST_MAX_CHARS", "80"))
+AI_MIN_CONFIDENCE = float(os.getenv("AI_MIN_CONFIDENCE", "0.6"))
+# Latency budget for one ask_ai_agent call (both tiers together). Past it the
+# answer comes from the answer cache or the keyword parser instead.
+AI_DEADLINE = float(os.getenv("AI_DEADLINE", "8"))
+# Send a second, identical request when the first is slower than the model's
+# recent p95; whichever valid answer arrives first is used.
+AI_HEDGE = os.getenv("AI_HEDGE", "1") == "1"
+AI_HEDGE_DELAY = float(os.getenv("AI_HEDGE_DELAY", "2"))  # until there are enough samples for a p95
+AI_HEDGE_MIN_DELAY = float(os.getenv("AI_HEDGE_MIN_DELAY", "0.3"))
+AI_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "512"))
+# Below this classifier probability the full prompt is sent; 1.01 disables sub-prompts.
+AI_FAMILY_MIN_PROB = float(os.getenv("AI_FAMILY_MIN_PROB", "0.7"))
+client = None
+
+
+def set_client(groq_client):
+    """Use this completions client instead of Groq (benchmarks inject a fake)."""
+    global client
+    client = groq_client
+
 
-SYSTEM_PROMPT = """
+def _client():
+    global client
+    if client is None:
+        from groq import Groq  # the SDK is slow to import; only load it for the first real call
+        client = Groq(api_key=GROQ_API_KEY)
+    return client
+
+# The prompt is split by intent family (see intent_classifier.FAMILY_OF):
+# when the local classifier is confident, only that family's section is
+# sent to the fast model (an answer outside the family is escalated);
+# otherwise, and always to the strong model, SYSTEM_PROMPT, which has all.
+PROMPT_HEAD = """
 You are a multilingual AI Business Assistant (Hindi/English).  
 You perform full business automation with inventory, purchase, sales, CRM, finance and reporting.
 
+JSON FORMAT (MANDATORY):
+
+{
+  "intent": "",
+  "data": {},
+  "reply": "",
+  "voice_reply": false,
+  "confidence": 1.0
+}
+
+confidence: 0 to 1, how sure you are of the intent and the extracted data.
+"""
+
+PROMPT_TAIL = """
+If user says voice/bolo/sunao/audio → voice_reply = true.
+
+SHORT replies only.
+
+Detect user language and reply in that language.
+"""
+
+FAMILY_PROMPTS = {
+    "trade": """
 You must detect:
 - Purchases (stock increases)
 - Sales (stock decreases)
@@ -22,40 +90,8 @@ You must detect:
 - Automatic customer creation
 - Automatic supplier creation
 - Item price mapping (purchase price & selling price)
-- Multi-agent routing
-
-ALLOWED INTENTS:
-[
-  "add_stock",
-  "reduce_stock",
-  "update_stock",
-  "check_stock",
-  "purchase_entry",
-  "supplier_add",
-  "sales_entry",
-  "invoice_needed",
-  "add_customer",
-  "auto_create_customer",
-  "get_customers",
-  "profit_report",
-  "sales_report",
-  "purchase_report",
-  "daily_report",
-  "weekly_report",
-  "mixed_transaction",
-  "general_chat"
-]
 
-JSON FORMAT (MANDATORY):
-
-{
-  "intent": "",
-  "data": {},
-  "reply": "",
-  "voice_reply": false
-}
-
-DATA RULES:
+INTENTS: "purchase_entry", "sales_entry", "mixed_transaction", "supplier_add", "invoice_needed", "create_invoice"
 
 For purchase_entry:
 {
@@ -75,6 +111,16 @@ For sales_entry:
   "notes": ""
 }
 
+For mixed_transaction:
+{
+  "purchases": [...],
+  "sales": [...]
+}
+""",
+    "stock": """
+INTENTS: "add_stock", "reduce_stock", "update_stock", "check_stock", "add_inventory", "update_inventory",
+"get_inventory", "low_stock_check"
+
 For add_stock:
 {
   "product": "",
@@ -87,49 +133,423 @@ For reduce_stock:
   "product": "",
   "quantity": ""
 }
+""",
+    "crm": """
+INTENTS: "add_customer", "auto_create_customer", "get_customers", "get_customer_profile", "add_task",
+"get_tasks", "add_finance", "get_finance"
+""",
+    "service": """
+INTENTS: "add_service", "update_service", "get_service_status", "list_services"
 
-For mixed_transaction:
+For update_service:
 {
-  "purchases": [...],
-  "sales": [...]
+  "service_id": "",
+  "status": "",
+  "technician": "",
+  "cost": "",
+  "notes": ""
 }
-if intent == "suggestions":
-    reply = generate_suggestions()
-    return await update.message.reply_text("🔍 Business Insights:\n" + reply)
 
-"add_service",
-"update_service",
-"get_service_status",
-"get_customer_profile",
+For list_services (all fields optional):
+{
+  "status": "",
+  "technician": "",
+  "customer": ""
+}
+""",
+    "reports": """
+INTENTS: "profit_report", "sales_report", "purchase_report", "daily_report", "weekly_report", "suggestions"
 
-If user says voice/bolo/sunao/audio → voice_reply = true.
+For profit_report, sales_report and purchase_report (all fields optional;
+period is one of today, yesterday, week, month, year, all; dates are YYYY-MM-DD):
+{
+  "period": "",
+  "start": "",
+  "end": ""
+}
 
-SHORT replies only.
+For daily_report and weekly_report (refresh = true only if the user asks for
+fresh/updated numbers):
+{
+  "refresh": false
+}
+""",
+    "chat": """
+INTENTS: "general_chat"
+""",
+}
 
-Detect user language and reply in that language.
-"""
+SYSTEM_PROMPT = (
+    PROMPT_HEAD
+    + "\nUse one of the intents below (general_chat if none fits).\n"
+    + "".join(FAMILY_PROMPTS[family] for family in intent_classifier.FAMILIES)
+    + PROMPT_TAIL
+)
 
-def ask_ai_agent(message: str, memory: str | None = None):
+
+def system_prompt(family=None):
+    """The full prompt, or the head, one family's section and the tail."""
+    if family not in FAMILY_PROMPTS:
+        return SYSTEM_PROMPT
+    chat = "" if family == "chat" else FAMILY_PROMPTS["chat"]
+    return PROMPT_HEAD + FAMILY_PROMPTS[family] + chat + PROMPT_TAIL
+
+# ---------- MODEL ROUTING ----------
+# intents the bot acts on; anything else from the fast model is escalated
+KNOWN_INTENTS = {
+    "add_customer", "get_customers", "add_task", "get_tasks",
+    "add_inventory", "update_inventory", "get_inventory", "low_stock_check",
+    "purchase_entry", "sales_entry", "mixed_transaction",
+    "add_finance", "get_finance", "create_invoice",
+    "get_customer_profile", "add_service", "get_service_status", "update_service", "list_services",
+    "sales_report", "purchase_report", "profit_report", "daily_report", "weekly_report",
+    "suggestions", "general_chat",
+}
+# always answered by the strong model
+STRONG_INTENTS = {"mixed_transaction", "create_invoice", "invoice_needed"}
+# data the bot cannot act without: per field, the keys its handler reads it from
+_PRODUCT_KEYS = ("Product", "product", "product_name", "item", "name")
+REQUIRED_DATA = {
+    "purchase_entry": (("product",), ("quantity",), ("price_each",)),
+    "sales_entry": (("product",), ("quantity",), ("selling_price",)),
+    "add_inventory": (_PRODUCT_KEYS,),
+    "update_inventory": (_PRODUCT_KEYS,),
+    "add_finance": (("Amount", "amount"),),
+    "update_service": (("service_id",),),
+}
+# required fields the sheet writes convert with float()
+_NUMERIC_DATA = {"quantity", "price_each", "selling_price", "Amount", "amount"}
+
+_BUY_WORDS = re.compile(r"\b(aay[ae]|aaya|kharid\w*|purchas\w*|bought|mang\w*)\b|आय|आए|खरीद", re.I)
+_SELL_WORDS = re.compile(r"\b(bik\w*|bech\w*|sold|sell\w*|sale)\b|बिक|बेच", re.I)
+_INVOICE_WORDS = re.compile(r"\b(bill|invoice|receipt)\b|बिल", re.I)
+_NUMBER = re.compile(r"\d+")
+
+
+def route(message):
+    """'fast' or 'strong' for a user message, before any model has seen it."""
+    if not AI_ROUTING:
+        return "strong"
+    text = message or ""
+    if len(text) > AI_FAST_MAX_CHARS or _INVOICE_WORDS.search(text):
+        return "strong"
+    if _BUY_WORDS.search(text) and _SELL_WORDS.search(text):
+        return "strong"  # a purchase and a sale in one message
+    if len(_NUMBER.findall(text)) > 3:
+        return "strong"
+    return "fast"
+
+
+def escalation_reason(ai_raw):
+    """Why a fast-model answer should be redone by the strong model, or None."""
+    try:
+        ai = json.loads(ai_raw)
+    except (TypeError, ValueError):
+        return "unparseable"
+    if not isinstance(ai, dict):
+        return "unparseable"
+    intent = ai.get("intent")
+    if intent not in KNOWN_INTENTS:
+        return "unknown_intent"
+    if intent in STRONG_INTENTS:
+        return "complex_intent"
     try:
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT},
-        ]
-        if memory:
-            messages.append({
-                "role": "system",
-                "content": f"Conversation memory (last messages):\n{memory}"
-            })
-        messages.append({"role": "user", "content": message})
-
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        if float(ai.get("confidence", 1)) < AI_MIN_CONFIDENCE:
+            return "low_confidence"
+    except (TypeError, ValueError):
+        return "low_confidence"
+    data = ai.get("data") if isinstance(ai.get("data"), dict) else {}
+    if missing_data(intent, data):
+        return "missing_data"
+    return None
+
+
+def missing_data(intent, data):
+    """Required fields of intent that data lacks (or holds a non-number for), by their first key."""
+    missing = []
+    for keys in REQUIRED_DATA.get(intent, ()):
+        value = next((data.get(key) for key in keys if data.get(key) not in (None, "")), None)
+        if value is not None and keys[0] in _NUMERIC_DATA:
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                value = None
+        if value is None:
+            missing.append(keys[0])
+    return missing
+
+
+# ---------- DEADLINES AND HEDGING ----------
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv("AI_WORKERS", "8")), thread_name_prefix="llm")
+
+
+class _Latencies:
+    """Recent completion latencies per model, for the hedge delay."""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = {}  # model -> deque of seconds
+        self._size = size
+        self._lock = threading.Lock()
+
+    def add(self, model, seconds):
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self._size)).append(seconds)
+
+    def hedge_delay(self, model):
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < self.min_samples:
+            return AI_HEDGE_DELAY
+        return max(AI_HEDGE_MIN_DELAY, samples[int(len(samples) * 0.95) - 1])
+
+
+_latencies = _Latencies()
+
+
+def _request(model, tier, messages, timeout):
+    start = time.perf_counter()
+    with metrics.timer("llm_request_latency_seconds", "Latency per ask_ai_agent completion", model=model, tier=tier), \
+            tracing.span("llm", model):
+        response = _client().chat.completions.create(
+            model=model,
             messages=messages,
-            temperature=0.2
+            temperature=0.2,
+            timeout=timeout
         )
-        ai_text = response.choices[0].message.content
+    _latencies.add(model, time.perf_counter() - start)
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metrics.count_llm_tokens(model, usage.prompt_tokens, usage.completion_tokens)
+    return response.choices[0].message.content
+
+
+def _is_json(text):
+    try:
+        return isinstance(json.loads(text), dict)
+    except (TypeError, ValueError):
+        return False
+
+
+def _transient(error):
+    """Worth retrying at once: timeouts, connection errors, 5xx. Not 429s or other 4xx."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        return isinstance(error, (OSError, TimeoutError)) or "Timeout" in type(error).__name__ \
+            or "Connection" in type(error).__name__
+    return status >= 500
+
+
+def _complete(tier, messages, deadline):
+    """
+    One completion from the tier's model, finished by `deadline` (monotonic).
+    A hedge request goes out if the first is still running after the model's
+    p95 latency, or straight away if the first fails; the first JSON answer
+    wins. Raises TimeoutError when nothing usable arrives in time.
+    """
+    model = AI_FAST_MODEL if tier == "fast" else AI_STRONG_MODEL
+
+    def submit():
+        # the request timeout makes a losing call give up at the deadline
+        # instead of holding a worker thread
+        timeout = max(0.1, deadline - time.monotonic())
+        return _pool.submit(contextvars.copy_context().run, _request, model, tier, messages, timeout)
+
+    pending = {submit()}
+    primary = next(iter(pending))
+    hedged = not AI_HEDGE
+    hedge_at = time.monotonic() + _latencies.hedge_delay(model)
+    fallback, error = None, None
+    while True:
+        now = time.monotonic()
+        # hedge a slow request, or retry a transient failure; never a 429/4xx
+        slow = pending and now >= hedge_at
+        if not hedged and now < deadline and (slow or (not pending and _transient(error))):
+            pending.add(submit())
+            hedged = True
+            metrics.inc("llm_hedges_total", "Hedge requests sent", model=model)
+        if not pending or now >= deadline:
+            break
+        until = deadline if hedged else min(deadline, hedge_at)
+        done, pending = wait(pending, timeout=max(0.0, until - now), return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                text = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if _is_json(text):
+                for loser in pending:
+                    loser.cancel()
+                if hedged and AI_HEDGE:
+                    metrics.inc("llm_hedge_wins_total", "Which request answered when a hedge was sent",
+                                model=model, winner="primary" if future is primary else "hedge")
+                return text
+            fallback = text
+    for loser in pending:
+        loser.cancel()
+    if fallback is not None:
+        return fallback  # not JSON, but better than nothing; escalation/parsing deal with it
+    if error is not None and not pending:
+        raise error
+    raise TimeoutError(f"{model} did not answer within the deadline")
+
+# ---------- FALLBACKS ----------
+# Only answers that mean the same whoever asks and whatever was said before
+# are cached ("stock dikhao"), so a fallback never replays another user's
+# context-dependent reply.
+CACHEABLE_INTENTS = {
+    "get_inventory", "low_stock_check", "get_customers", "get_tasks", "get_finance", "list_services",
+    "sales_report", "purchase_report", "profit_report", "daily_report", "weekly_report", "suggestions",
+}
+_answers = OrderedDict()  # normalized message -> last good answer
+_answers_lock = threading.Lock()
+
+
+def _key(message):
+    return " ".join((message or "").casefold().split())
+
+
+def _remember(message, ai_text):
+    try:
+        ai = json.loads(ai_text)
+    except (TypeError, ValueError):
+        return
+    if not isinstance(ai, dict) or ai.get("intent") not in CACHEABLE_INTENTS:
+        return
+    ai_text = json.dumps(dict(ai, reply=""), ensure_ascii=False)  # the bot renders these itself
+    with _answers_lock:
+        _answers[_key(message)] = ai_text
+        _answers.move_to_end(_key(message))
+        while len(_answers) > AI_CACHE_SIZE:
+            _answers.popitem(last=False)
+
+
+def cached_answer(message):
+    with _answers_lock:
+        return _answers.get(_key(message))
+
+
+# keyword -> intent for the read-only requests counter staff send most
+_KEYWORD_INTENTS = [
+    (re.compile(r"\blow stock\b|stock (kam|khatam)|कम स्टॉक", re.I), "low_stock_check"),
+    (re.compile(r"\b(stock|inventory|maal)\b.*\b(dikhao|batao|list|show)\b|स्टॉक", re.I), "get_inventory"),
+    (re.compile(r"\bcustomers?\b.*\b(dikhao|batao|list|show)\b", re.I), "get_customers"),
+    (re.compile(r"\btasks?\b.*\b(dikhao|batao|list|show)\b", re.I), "get_tasks"),
+    (re.compile(r"\bfinance\b.*\b(dikhao|batao|list|show)\b", re.I), "get_finance"),
+    (re.compile(r"\b(pending|open) (jobs|services|repairs)\b", re.I), "list_services"),
+    (re.compile(r"\b(aaj|today)\b.*\breport\b|\bdaily report\b", re.I), "daily_report"),
+    (re.compile(r"\bweekly report\b|\b(hafte|week)\b.*\breport\b", re.I), "weekly_report"),
+    (re.compile(r"\bprofit\b", re.I), "profit_report"),
+    (re.compile(r"\bsales report\b", re.I), "sales_report"),
+    (re.compile(r"\bpurchase report\b", re.I), "purchase_report"),
+]
+# "10 chawal aaye 40 ke" / "2 cheeni beche 50 me"
+# The price is required: a Sales or Purchase row cannot be written without it.
+_ENTRY = re.compile(
+    r"^\s*(?P<quantity>\d+(?:\.\d+)?)\s+(?P<product>[^\d]+?)\s+"
+    r"(?P<verb>aaye|aaya|aayi|kharide|kharida|bought|purchased|beche|becha|bik gaye|bika|biki|sold)"
+    r"\s+(?P<price>\d+(?:\.\d+)?)\s*(?:ke|ka|ki|me|mein|rs|each)?\s*$", re.I)
+
+
+def quick_parse(message):
+    """
+    Intent and data for simple messages without a model, or None. Only used
+    when the models are out of time, so it errs on the side of None.
+    """
+    text = (message or "").strip()
+    m = _ENTRY.match(text)
+    if m:
+        sale = m["verb"].lower().startswith(("b", "s")) and m["verb"].lower() != "bought"
+        data = {"product": m["product"].strip(), "quantity": m["quantity"],
+                "selling_price" if sale else "price_each": m["price"]}
+        return {"intent": "sales_entry" if sale else "purchase_entry", "data": data, "reply": "", "voice_reply": False}
+    for pattern, intent in _KEYWORD_INTENTS:
+        if pattern.search(text):
+            return {"intent": intent, "data": {}, "reply": "", "voice_reply": False}
+    return None
+
+
+def _fallback(message):
+    ai_text = cached_answer(message)
+    if ai_text is not None:
+        metrics.inc("llm_fallbacks_total", "Answers served without a model", source="cache")
+        return ai_text
+    parsed = quick_parse(message)
+    if parsed is not None:
+        metrics.inc("llm_fallbacks_total", "Answers served without a model", source="parser")
+        return json.dumps(parsed, ensure_ascii=False)
+    metrics.inc("llm_fallbacks_total", "Answers served without a model", source="none")
+    return None
+
+
+def _messages(system, message, memory):
+    messages = [
+        {"role": "system", "content": system},
+    ]
+    if memory:
+        messages.append({
+            "role": "system",
+            "content": f"Conversation memory (last messages):\n{memory}"
+        })
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+def prompt_family(message):
+    """Intent family whose sub-prompt is enough for this message, or None for the full prompt."""
+    family, probability = intent_classifier.predict(message)
+    if probability < AI_FAMILY_MIN_PROB:
+        metrics.inc("llm_prompt_total", "Prompts sent by family", family="full")
+        return None
+    metrics.inc("llm_prompt_total", "Prompts sent by family", family=family)
+    return family
+
+
+def _off_family(ai_text, family):
+    # the model picked an intent its sub-prompt does not describe
+    try:
+        intent = json.loads(ai_text).get("intent")
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return intent_classifier.FAMILY_OF.get(intent) not in (family, "chat")
+
+
+def ask_ai_agent(message: str, memory: str | None = None):
+    deadline = time.monotonic() + AI_DEADLINE
+    try:
+        tier = route(message)
+        if tier == "fast":
+            family = prompt_family(message)
+            messages = _messages(system_prompt(family), message, memory)
+            try:
+                # the fast model gets half the budget, so an escalation still fits
+                ai_text = _complete("fast", messages, time.monotonic() + AI_DEADLINE / 2)
+                reason = escalation_reason(ai_text)
+                if reason is None and family and _off_family(ai_text, family):
+                    reason = "off_family"
+            except Exception as e:
+                print("AI ERROR (fast model):", e)
+                reason = "error"
+            if reason is None:
+                metrics.inc("llm_route_total", "ask_ai_agent answers by tier and outcome", tier="fast", outcome="answered")
+                _remember(message, ai_text)
+                return ai_text
+            metrics.inc("llm_route_total", "ask_ai_agent answers by tier and outcome", tier="fast", outcome="escalated")
+            metrics.inc("llm_escalations_total", "Fast-model answers redone by the strong model", reason=reason)
+
+        # the strong model always gets every schema: nothing checks its answer against a family
+        metrics.inc("llm_prompt_total", "Prompts sent by family", family="full")
+        ai_text = _complete("strong", _messages(SYSTEM_PROMPT, message, memory), deadline)
+        metrics.inc("llm_route_total", "ask_ai_agent answers by tier and outcome", tier="strong",
+                    outcome="answered" if tier == "strong" else "escalation")
+        _remember(message, ai_text)
         return ai_text
     except Exception as e:
         print("AI ERROR:", e)
+        ai_text = _fallback(message)
+        if ai_text is not None:
+            return ai_text
         return json.dumps({
             "intent": "error",
             "data": {},
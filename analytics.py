@@ -0,0 +1,361 @@
+# analytics.py - columnar Sales/Purchase/Finance tables for reports
+#
+# Each sheet is loaded once into typed columns: dates as day ordinals,
+# product/customer/supplier names dictionary-encoded as int codes, amounts as
+# doubles. After that only new rows are read (one open-ended range per tab),
+# with a full reload every ANALYTICS_RELOAD seconds to pick up hand edits.
+# With SHEETS_PARTITIONS=1 the base tab and past months' partitions are
+# closed: they are loaded first, kept across reloads and not read again
+# (refresh(force=True) re-reads them), so a reload costs the same in year
+# three as in month one.
+# Date filters, grouped sums and top-N run vectorized under NumPy when it is
+# installed, and as loops over array.array columns otherwise.
+import os
+import time
+import logging
+import threading
+from array import array
+from datetime import date, datetime, timedelta
+
+import google_sheets as gs
+
+_numpy = None  # module, or False when not installed; loaded with the first query
+
+ANALYTICS_TTL = float(os.getenv("ANALYTICS_TTL", "30"))  # seconds before looking for new rows
+ANALYTICS_RELOAD = float(os.getenv("ANALYTICS_RELOAD", "900"))  # seconds before a full reload
+
+# sheet -> (date column, dictionary-encoded columns, numeric columns)
+SCHEMAS = {
+    "Sales": ("Date", ("Product", "Customer"), ("Quantity", "Total", "Profit")),
+    "Purchase": ("Date", ("Product", "Supplier"), ("Quantity", "Total")),
+    "Finance": ("Date", ("Customer", "Type"), ("Amount",)),
+}
+
+def _np():
+    # NumPy is optional (the array path gives the same answers) and slow to
+    # import, so it is loaded on first use like the other heavy dependencies
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+_SHEETS_EPOCH = date(1899, 12, 30).toordinal()  # day 0 of Sheets date serials
+_FAR_FUTURE = date.max.toordinal()
+
+
+def _day(value):
+    """Day ordinal of an ISO date/timestamp or a Sheets date serial; 0 if unparseable."""
+    if isinstance(value, (int, float)):
+        return _SHEETS_EPOCH + int(value)
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return 0
+
+
+def _number(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace(",", "") or 0)
+    except ValueError:
+        return 0.0
+
+
+class Table:
+    """One sheet (all of its tabs) as typed columns. Append-only, like the sheet."""
+
+    def __init__(self, base):
+        self.base = base
+        self.date_column, self.dims, self.measures = SCHEMAS[base]
+        self._lock = threading.RLock()  # numpy views block array resizes
+        self._clear()
+
+    def _clear(self):
+        self.day = array("q")
+        self.codes = {dim: array("q") for dim in self.dims}
+        self.names = {dim: [] for dim in self.dims}  # code -> name, first spelling seen
+        self._lookup = {dim: {} for dim in self.dims}  # casefolded name -> code
+        self.values = {m: array("d") for m in self.measures}
+        self._next_row = {}  # tab -> first row not loaded yet
+        self._closed = []  # [(closed month tab, rows loaded up to its end)], loaded first
+        self.loaded_at = self.refreshed_at = None
+
+    def _restart(self, kept):
+        """
+        Start a reload keeping the rows of the closed tabs in `kept`, a prefix
+        of self._closed. Builds new columns: the old ones stay intact in case
+        the reload fails.
+        """
+        if not kept:
+            self._clear()
+            return
+        n = kept[-1][1]
+        self.day = self.day[:n]
+        self.codes = {dim: codes[:n] for dim, codes in self.codes.items()}
+        self.names = {dim: list(names) for dim, names in self.names.items()}
+        self._lookup = {dim: dict(lookup) for dim, lookup in self._lookup.items()}
+        self.values = {m: values[:n] for m, values in self.values.items()}
+        self._next_row = {tab: self._next_row[tab] for tab, _ in kept}
+        self._closed = list(kept)
+        self.loaded_at = self.refreshed_at = None
+
+    def _closed_tabs(self):
+        # tabs nothing is appended to: partitions of past months, and the base
+        # tab once partitioning is on and it has partitions after it
+        if self.base not in ("Sales", "Purchase"):
+            return []
+        parts = gs.partitions(self.base)
+        this_month = datetime.utcnow().date().replace(day=1)
+        closed = [title for year, month, title in parts if date(year, month, 1) < this_month]
+        return ([self.base] if gs.SHEETS_PARTITIONS and parts else []) + closed
+
+    def __len__(self):
+        return len(self.day)
+
+    def refresh(self, force=False):
+        """Read rows appended since the last call; reload everything now and then."""
+        with self._lock:
+            now = time.monotonic()
+            reload = force or self.loaded_at is None or now - self.loaded_at > ANALYTICS_RELOAD
+            if not reload and now - self.refreshed_at <= ANALYTICS_TTL:
+                return self
+            previous = dict(vars(self)) if reload else None  # _restart() swaps in new columns
+            try:
+                with gs.analytics_priority():
+                    closed = self._closed_tabs()
+                    if reload:
+                        kept = []
+                        for tab, end in ([] if force else self._closed):
+                            if tab not in closed:
+                                break
+                            kept.append((tab, end))
+                        self._restart(kept)
+                    done = {tab for tab, _ in self._closed}
+                    # on a reload newly closed tabs go right after the kept ones
+                    todo = [tab for tab in closed if tab not in done] if reload else []
+                    todo += [tab for tab in gs.tabs(self.base) if tab not in done and tab not in todo]
+                    for tab in todo:
+                        first = self._next_row.get(tab, 2)
+                        names = (self.date_column,) + self.dims + self.measures
+                        columns, next_row = gs.get_columns(tab, names, first)
+                        self._extend(columns)
+                        self._next_row[tab] = next_row
+                        if reload and tab in closed:
+                            self._closed.append((tab, len(self.day)))
+            except Exception as e:
+                if previous is not None:
+                    vars(self).update(previous)
+                if self.loaded_at is None:
+                    raise  # nothing loaded yet, nothing to fall back on
+                # keep serving the columns we have; the next call tries again
+                logging.error("Refreshing %s failed, serving loaded rows: %s", self.base, e)
+                return self
+            if reload:
+                self.loaded_at = now
+            self.refreshed_at = now
+        return self
+
+    def _extend(self, columns):
+        self.day.extend(_day(v) for v in columns[self.date_column])
+        for dim in self.dims:
+            lookup, names, codes = self._lookup[dim], self.names[dim], self.codes[dim]
+            for value in columns[dim]:
+                key = " ".join(str(value).casefold().split())
+                code = lookup.get(key)
+                if code is None:
+                    code = lookup[key] = len(names)
+                    names.append(str(value).strip())
+                codes.append(code)
+        for measure in self.measures:
+            self.values[measure].extend(_number(v) for v in columns[measure])
+
+    # ---------- QUERIES ----------
+    def _rows(self, start=None, end=None):
+        """Selected rows: a boolean mask (NumPy), a list of indices, or None for all."""
+        if start is None and end is None:
+            return None
+        np = _np()
+        lo = start.toordinal() if start else 1
+        hi = end.toordinal() if end else _FAR_FUTURE
+        if np is not None:
+            days = _view(self.day, np.int64)
+            return (days >= lo) & (days <= hi)
+        return [i for i, d in enumerate(self.day) if lo <= d <= hi]
+
+    def total(self, measure, start=None, end=None):
+        """Sum of a numeric column over rows dated start..end (inclusive)."""
+        with self._lock:
+            return self._total(measure, start, end)
+
+    def _total(self, measure, start, end):
+        np = _np()
+        rows = self._rows(start, end)
+        values = self.values[measure]
+        if np is not None:
+            column = _view(values, np.float64)
+            return float(column.sum() if rows is None else column[rows].sum())
+        return float(sum(values) if rows is None else sum(values[i] for i in rows))
+
+    def count(self, start=None, end=None):
+        with self._lock:
+            rows = self._rows(start, end)
+            if rows is None:
+                return len(self)
+            return int(rows.sum()) if _np() is not None else len(rows)
+
+    def group_sum(self, dim, measure, start=None, end=None):
+        """{name: sum of measure} over rows dated start..end."""
+        with self._lock:
+            return self._group_sum(dim, measure, start, end)
+
+    def _group_sum(self, dim, measure, start, end):
+        np = _np()
+        rows = self._rows(start, end)
+        codes, values, names = self.codes[dim], self.values[measure], self.names[dim]
+        if np is not None:
+            codes, values = _view(codes, np.int64), _view(values, np.float64)
+            if rows is not None:
+                codes, values = codes[rows], values[rows]
+            sums = np.bincount(codes, weights=values, minlength=len(names))
+            present = np.bincount(codes, minlength=len(names)) > 0
+            return {names[c]: float(sums[c]) for c in np.flatnonzero(present)}
+        sums = {}
+        for i in (range(len(codes)) if rows is None else rows):
+            sums[codes[i]] = sums.get(codes[i], 0.0) + values[i]
+        return {names[c]: total for c, total in sums.items()}
+
+    def top(self, dim, measure, n=3, start=None, end=None):
+        """[(name, sum)] of the n largest groups, ties by name."""
+        sums = self.group_sum(dim, measure, start, end)
+        ranked = sorted(sums.items(), key=lambda item: (-item[1], item[0]))
+        return [(name, total) for name, total in ranked if name][:n]
+
+
+def _view(column, dtype):
+    # zero-copy view of an array.array; frombuffer rejects empty buffers
+    np = _np()
+    return np.frombuffer(column, dtype=dtype) if len(column) else np.zeros(0, dtype=dtype)
+
+
+_tables = {base: Table(base) for base in SCHEMAS}
+
+
+def table(base):
+    """The loaded table for Sales, Purchase or Finance, refreshed if stale."""
+    return _tables[base].refresh()
+
+
+def warm():
+    """Load every table so the first report does not pay for it."""
+    for t in _tables.values():
+        t.refresh()
+
+
+def reset():
+    """Forget loaded rows (after set_client, or when the sheets were rewritten)."""
+    for t in _tables.values():
+        with t._lock:
+            t._clear()
+
+# ---------- PERIODS ----------
+PERIODS = ("today", "yesterday", "week", "month", "year", "all")
+
+
+def period_range(period=None, start=None, end=None):
+    """
+    (start, end) dates for a report. Explicit YYYY-MM-DD start/end win over a
+    named period; the default is the last 7 days.
+    """
+    today = datetime.utcnow().date()
+
+    def parse(value):
+        try:
+            return date.fromisoformat(str(value)[:10]) if value else None
+        except ValueError:
+            return None
+
+    start, end = parse(start), parse(end)
+    if start or end:
+        return start, end or today
+    period = (period or "week").lower()
+    if period == "today":
+        return today, today
+    if period == "yesterday":
+        return today - timedelta(days=1), today - timedelta(days=1)
+    if period == "month":
+        return today.replace(day=1), today
+    if period == "year":
+        return today.replace(month=1, day=1), today
+    if period == "all":
+        return None, None
+    return today - timedelta(days=6), today
+
+# ---------- REPORTS ----------
+def sales_report(start=None, end=None, top_n=5):
+    sales = table("Sales")
+    return {
+        "start": start, "end": end,
+        "count": sales.count(start, end),
+        "quantity": sales.total("Quantity", start, end),
+        "revenue": sales.total("Total", start, end),
+        "profit": sales.total("Profit", start, end),
+        "top_products": sales.top("Product", "Quantity", top_n, start, end),
+        "top_customers": sales.top("Customer", "Total", top_n, start, end),
+    }
+
+
+def purchase_report(start=None, end=None, top_n=5):
+    purchases = table("Purchase")
+    return {
+        "start": start, "end": end,
+        "count": purchases.count(start, end),
+        "quantity": purchases.total("Quantity", start, end),
+        "spent": purchases.total("Total", start, end),
+        "top_products": purchases.top("Product", "Total", top_n, start, end),
+        "top_suppliers": purchases.top("Supplier", "Total", top_n, start, end),
+    }
+
+
+def profit_report(start=None, end=None, top_n=5):
+    sales = table("Sales")
+    revenue = sales.total("Total", start, end)
+    profit = sales.total("Profit", start, end)
+    return {
+        "start": start, "end": end,
+        "revenue": revenue,
+        "profit": profit,
+        "margin": profit / revenue * 100 if revenue else 0.0,
+        "spent": table("Purchase").total("Total", start, end),
+        "top_products": sales.top("Product", "Profit", top_n, start, end),
+    }
+
+
+def finance_totals(start=None, end=None):
+    """(income, expense) from Finance; any Type other than income counts as expense."""
+    by_type = table("Finance").group_sum("Type", "Amount", start, end)
+    income = sum(v for k, v in by_type.items() if k.lower() == "income")
+    return income, sum(by_type.values()) - income
+
+
+def top_selling(limit=3):
+    return table("Sales").top("Product", "Quantity", limit)
+
+
+def total_profit():
+    return table("Sales").total("Profit")
+
+
+def today_summary():
+    today = datetime.utcnow().date()
+    sales = table("Sales")
+    return {
+        "purchases": table("Purchase").total("Total", today, today),
+        "sales": sales.total("Total", today, today),
+        "profit": sales.total("Profit", today, today),
+    }
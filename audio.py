@@ -0,0 +1,62 @@
+# audio.py - voice note preprocessing before speech-to-text
+#
+# One ffmpeg pass turns a Telegram voice note (OGG/Opus) into what STT
+# engines want and nothing more: leading and trailing silence trimmed with
+# ffmpeg's energy-based silenceremove filter, mono, 16 kHz, 16-bit PCM, and
+# at most VOICE_MAX_SECONDS long. Pauses from the shop floor no longer get
+# uploaded (once per recognition language) or decoded.
+import os
+import wave
+import shutil
+import subprocess
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+# ffmpeg binary; defaults to the one on PATH, then the old Windows install location
+FFMPEG_PATH = os.getenv("FFMPEG_PATH") or shutil.which("ffmpeg") or r"C:\ffmpeg\bin\ffmpeg.exe"
+VOICE_SAMPLE_RATE = int(os.getenv("VOICE_SAMPLE_RATE", "16000"))
+VOICE_MAX_SECONDS = float(os.getenv("VOICE_MAX_SECONDS", "60"))
+VOICE_SILENCE_DB = float(os.getenv("VOICE_SILENCE_DB", "-40"))  # quieter than this is silence
+VOICE_PAD_SECONDS = float(os.getenv("VOICE_PAD_SECONDS", "0.15"))  # silence kept around the speech
+VOICE_MIN_SPEECH = float(os.getenv("VOICE_MIN_SPEECH", "0.3"))  # shorter than this after trimming is empty
+
+SECONDS_BUCKETS = (0.5, 1, 2, 3, 5, 8, 13, 21, 34, 60, 120)
+
+
+def speech_filter():
+    """ffmpeg -af chain: trim leading silence, reverse, trim again, reverse back."""
+    trim = (f"silenceremove=start_periods=1:start_threshold={VOICE_SILENCE_DB}dB"
+            f":start_silence={VOICE_PAD_SECONDS}:detection=peak")
+    return ",".join([trim, "areverse", trim, "areverse"])
+
+
+def prepare_for_stt(src, dst):
+    """
+    Convert `src` to a trimmed mono 16 kHz WAV at `dst`. Returns the seconds
+    of audio left, 0 when the note was all silence. Raises
+    subprocess.CalledProcessError / OSError if ffmpeg fails.
+    """
+    cmd = [
+        FFMPEG_PATH, "-y", "-hide_banner", "-loglevel", "error",
+        "-t", str(VOICE_MAX_SECONDS * 2),  # decode a bounded prefix; silence may be trimmed off it
+        "-i", src,
+        "-af", speech_filter(),
+        "-ac", "1", "-ar", str(VOICE_SAMPLE_RATE), "-sample_fmt", "s16",
+        "-t", str(VOICE_MAX_SECONDS),
+        dst,
+    ]
+    subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    seconds = duration(dst)
+    metrics.observe("voice_speech_seconds", seconds, "Voice note length after silence trimming",
+                    buckets=SECONDS_BUCKETS)
+    return seconds if seconds >= VOICE_MIN_SPEECH else 0.0
+
+
+def duration(path):
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getnframes() / float(w.getframerate() or 1)
+    except (OSError, EOFError, wave.Error):
+        return 0.0
@@ -0,0 +1,114 @@
+# bench/budgets.py - per-intent upper bounds on outbound calls
+#
+#   python -m bench.budgets            # exit 1 if any intent goes over budget
+#   python -m pytest bench/test_budgets.py   # the same, one test per intent
+#
+# Each canned message from bench.suites is run through handle_message against
+# the in-memory fakes while tracing.recording() captures every Sheets/LLM/
+# STT/TTS call. Lower a budget whenever an optimization lands so it cannot
+# creep back.
+import os
+import sys
+import asyncio
+import logging
+import argparse
+import tempfile
+
+os.environ.setdefault("SHEETS_REQUESTS_PER_MINUTE", "1000000000")
+
+from bench import suites
+from bench.fakes import FakeContext, FakeUpdate
+
+# intent -> {"sheets": API requests, "downloads": full-table reads, "llm": completions}
+BUDGETS = {
+    "add_customer": {"sheets": 4, "downloads": 0, "llm": 1},
+    "get_customers": {"sheets": 4, "downloads": 0, "llm": 1},
+    "add_task": {"sheets": 4, "downloads": 0, "llm": 1},
+    "get_tasks": {"sheets": 4, "downloads": 0, "llm": 1},
+    "add_inventory": {"sheets": 4, "downloads": 0, "llm": 1},
+    "update_inventory": {"sheets": 6, "downloads": 0, "llm": 1},
+    "get_inventory": {"sheets": 4, "downloads": 0, "llm": 1},
+    "low_stock_check": {"sheets": 3, "downloads": 0, "llm": 1},
+    "purchase_entry": {"sheets": 7, "downloads": 0, "llm": 1},
+    "sales_entry": {"sheets": 7, "downloads": 0, "llm": 1},
+    "mixed_transaction": {"sheets": 11, "downloads": 0, "llm": 1},
+    "add_finance": {"sheets": 4, "downloads": 0, "llm": 1},
+    "get_finance": {"sheets": 4, "downloads": 0, "llm": 1},
+    "create_invoice": {"sheets": 4, "downloads": 0, "llm": 1},
+    "get_customer_profile": {"sheets": 2, "downloads": 0, "llm": 1},
+    "add_service": {"sheets": 2, "downloads": 0, "llm": 1},
+    "get_service_status": {"sheets": 2, "downloads": 0, "llm": 1},
+    "update_service": {"sheets": 3, "downloads": 0, "llm": 1},
+    "list_services": {"sheets": 1, "downloads": 0, "llm": 1},
+    "sales_report": {"sheets": 3, "downloads": 0, "llm": 1},
+    "purchase_report": {"sheets": 3, "downloads": 0, "llm": 1},
+    "profit_report": {"sheets": 3, "downloads": 0, "llm": 1},
+    "weekly_report": {"sheets": 3, "downloads": 0, "llm": 1},
+    "daily_report": {"sheets": 3, "downloads": 0, "llm": 1},
+    "suggestions": {"sheets": 1, "downloads": 0, "llm": 1},
+    "general_chat": {"sheets": 3, "downloads": 0, "llm": 1},
+}
+
+
+def trace_intents(rows=1000):
+    """Run every canned message once. Returns {intent: (counts, calls)}."""
+    import bot
+    import tracing
+
+    logging.getLogger().setLevel(logging.WARNING)
+    loop = asyncio.new_event_loop()
+    traces = {}
+    try:
+        for message, reply in suites.INTENT_MESSAGES.items():
+            suites.install_fakes(rows)
+            with tracing.recording() as calls:
+                loop.run_until_complete(bot.handle_message(FakeUpdate(message, user_id=7), FakeContext()))
+            traces[reply["intent"]] = (tracing.summarize(calls), list(calls))
+    finally:
+        loop.close()
+    return traces
+
+
+def check(traces, budgets=BUDGETS):
+    """List of (intent, kind, used, allowed) over budget."""
+    over = []
+    for intent, (counts, _) in traces.items():
+        for kind, allowed in budgets.get(intent, {}).items():
+            if counts.get(kind, 0) > allowed:
+                over.append((intent, kind, counts.get(kind, 0), allowed))
+    return over
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-intent outbound call budgets")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("-v", action="store_true", help="print every traced call")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            traces = trace_intents(args.rows)
+        finally:
+            os.chdir(cwd)
+
+    for intent, (counts, calls) in traces.items():
+        budget = BUDGETS.get(intent, {})
+        used = "  ".join(f"{k} {counts.get(k, 0)}/{v}" for k, v in budget.items())
+        print(f"{intent:<22} {used}")
+        if args.v:
+            print("    ", calls)
+
+    missing = sorted(set(traces) - set(BUDGETS))
+    if missing:
+        print("no budget for:", ", ".join(missing))
+
+    over = check(traces)
+    for intent, kind, used, allowed in over:
+        print(f"OVER BUDGET {intent}: {kind} {used} > {allowed}")
+    return 1 if over or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
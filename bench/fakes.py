@@ -0,0 +1,398 @@
+# bench/fakes.py - in-memory stand-ins for gspread, Groq and Telegram objects
+import re
+import json
+import itertools
+
+import gspread
+
+# ---------- GSPREAD ----------
+_A1 = re.compile(r"^([A-Z]*)(\d*)$")
+
+
+def col_to_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + (ord(ch) - 64)
+    return n
+
+
+def index_to_col(n):
+    letters = ""
+    while n:
+        n, rem = divmod(n - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def parse_range(range_name, max_rows, max_cols):
+    """'B2:D10' / 'A2:D' / 'C5' -> (row1, col1, row2, col2), 1-based inclusive."""
+    range_name = range_name.split("!")[-1]
+    start, _, end = range_name.partition(":")
+    end = end or start
+    c1, r1 = _A1.match(start).groups()
+    c2, r2 = _A1.match(end).groups()
+    return (
+        int(r1) if r1 else 1,
+        col_to_index(c1) if c1 else 1,
+        int(r2) if r2 else max_rows,
+        col_to_index(c2) if c2 else max_cols,
+    )
+
+
+class FakeCell:
+    def __init__(self, row, col, value):
+        self.row = row
+        self.col = col
+        self.value = value
+
+
+class FakeWorksheet:
+    """The subset of gspread.Worksheet the bot uses. Row 1 is the header."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, title, rows=None, cols=26, row_count=1000):
+        self.id = next(self._ids)
+        self.title = title
+        self.rows = [list(r) for r in (rows or [])]
+        self.col_count = cols
+        self._row_count = row_count
+        self.calls = []
+
+    @property
+    def row_count(self):
+        return max(self._row_count, len(self.rows))
+
+    def _log(self, name):
+        self.calls.append(name)
+
+    def _cell(self, row, col):
+        if row <= len(self.rows):
+            r = self.rows[row - 1]
+            if col <= len(r):
+                return r[col - 1]
+        return ""
+
+    def _set(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([])
+        r = self.rows[row - 1]
+        while len(r) < col:
+            r.append("")
+        r[col - 1] = value
+
+    def get_all_records(self, **kwargs):
+        self._log("get_all_records")
+        if not self.rows:
+            return []
+        header = self.rows[0]
+        width = len(header)
+        return [
+            dict(zip(header, r + [""] * (width - len(r)) if len(r) < width else r))
+            for r in self.rows[1:]
+        ]
+
+    def get_all_values(self, **kwargs):
+        self._log("get_all_values")
+        return [list(r) for r in self.rows]
+
+    def get_values(self, range_name=None, **kwargs):
+        self._log("get_values")
+        if range_name is None:
+            return [list(r) for r in self.rows]
+        r1, c1, r2, c2 = parse_range(range_name, len(self.rows), self.col_count)
+        out = []
+        for row in self.rows[r1 - 1:r2]:
+            out.append([row[c - 1] if c <= len(row) else "" for c in range(c1, c2 + 1)])
+        # like the API: trailing empty rows/cells are not returned
+        while out and not any(v != "" for v in out[-1]):
+            out.pop()
+        return [_rstrip(r) for r in out]
+
+    get = get_values
+
+    def row_values(self, row, **kwargs):
+        self._log("row_values")
+        return _rstrip(list(self.rows[row - 1])) if row <= len(self.rows) else []
+
+    def col_values(self, col, **kwargs):
+        self._log("col_values")
+        values = [r[col - 1] if col <= len(r) else "" for r in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def acell(self, label, **kwargs):
+        self._log("acell")
+        r1, c1, _, _ = parse_range(label, len(self.rows), self.col_count)
+        return FakeCell(r1, c1, self._cell(r1, c1))
+
+    def cell(self, row, col, **kwargs):
+        self._log("cell")
+        return FakeCell(row, col, self._cell(row, col))
+
+    def _appended(self, first, count, width):
+        # same shape as the Sheets values.append response gspread returns
+        last_col = index_to_col(max(width, 1))
+        return {"updates": {
+            "updatedRange": f"'{self.title}'!A{first}:{last_col}{first + count - 1}",
+            "updatedRows": count,
+        }}
+
+    def _trim(self):
+        # like the API, appends go right after the last non-empty row
+        while len(self.rows) > 1 and not any(v != "" for v in self.rows[-1]):
+            self.rows.pop()
+
+    def append_row(self, values, **kwargs):
+        self._log("append_row")
+        self._trim()
+        self.rows.append(list(values))
+        return self._appended(len(self.rows), 1, len(values))
+
+    def append_rows(self, values, **kwargs):
+        self._log("append_rows")
+        values = [list(v) for v in values]
+        self._trim()
+        self.rows.extend(values)
+        return self._appended(len(self.rows) - len(values) + 1, len(values), max(map(len, values), default=1))
+
+    def update_cell(self, row, col, value):
+        self._log("update_cell")
+        self._set(row, col, value)
+
+    def _set_range(self, range_name, values):
+        r1, c1, _, _ = parse_range(range_name or "A1", len(self.rows), self.col_count)
+        for i, row in enumerate(values or []):
+            for j, value in enumerate(row):
+                self._set(r1 + i, c1 + j, value)
+
+    def update(self, range_name=None, values=None, **kwargs):
+        self._log("update")
+        # gspread 6 prefers update(values, range_name); accept both orders
+        if isinstance(range_name, list):
+            range_name, values = values, range_name
+        self._set_range(range_name, values)
+
+    def batch_update(self, data, **kwargs):
+        self._log("batch_update")
+        for item in data:
+            self._set_range(item["range"], item["values"])
+
+    def batch_clear(self, ranges):
+        self._log("batch_clear")
+        for range_name in ranges:
+            r1, c1, r2, c2 = parse_range(range_name, len(self.rows), self.col_count)
+            for row in range(r1, min(r2, len(self.rows)) + 1):
+                for col in range(c1, c2 + 1):
+                    if col <= len(self.rows[row - 1]):
+                        self.rows[row - 1][col - 1] = ""
+
+    def delete_rows(self, start_index, end_index=None):
+        self._log("delete_rows")
+        end_index = end_index or start_index
+        del self.rows[start_index - 1:end_index]
+        self._row_count = max(self._row_count - (end_index - start_index + 1), len(self.rows), 1)
+
+    def clear(self):
+        self._log("clear")
+        self.rows = []
+
+    def resize(self, rows=None, cols=None):
+        self._log("resize")
+        if rows is not None:
+            self._row_count = rows
+            del self.rows[rows:]
+        if cols is not None:
+            self.col_count = cols
+
+
+def _rstrip(row):
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+
+class FakeSpreadsheet:
+    def __init__(self, key="bench"):
+        self.id = key
+        self.sheets = {}
+        self.calls = []
+
+    def add(self, ws):
+        self.sheets[ws.title] = ws
+        return ws
+
+    def worksheet(self, title):
+        self.calls.append("worksheet")
+        try:
+            return self.sheets[title]
+        except KeyError:
+            raise gspread.WorksheetNotFound(title)
+
+    def worksheets(self, **kwargs):
+        self.calls.append("worksheets")
+        return list(self.sheets.values())
+
+    def add_worksheet(self, title, rows=1000, cols=26, **kwargs):
+        self.calls.append("add_worksheet")
+        return self.add(FakeWorksheet(title, cols=cols, row_count=rows))
+
+    def del_worksheet(self, ws):
+        self.calls.append("del_worksheet")
+        self.sheets.pop(ws.title, None)
+
+    def batch_update(self, body):
+        self.calls.append("batch_update")
+        replies = []
+        for request in body.get("requests", []):
+            if "addSheet" in request:
+                props = request["addSheet"]["properties"]
+                grid = props.get("gridProperties", {})
+                ws = self.add(FakeWorksheet(props["title"], cols=grid.get("columnCount", 26),
+                                            row_count=grid.get("rowCount", 1000)))
+                replies.append({"addSheet": {"properties": {"title": ws.title, "sheetId": ws.id}}})
+            else:
+                replies.append({})
+        return {"replies": replies}
+
+    def values_batch_get(self, ranges, params=None):
+        self.calls.append("values_batch_get")
+        out = []
+        for range_name in ranges:
+            title = range_name.split("!")[0].strip("'")
+            ws = self.sheets[title]
+            r1, c1, r2, c2 = parse_range(range_name, len(ws.rows), ws.col_count)
+            values = [_rstrip(row[c1 - 1:c2]) for row in ws.rows[r1 - 1:r2]]
+            out.append({"range": range_name, "values": values} if any(values) else {"range": range_name})
+        return {"valueRanges": out}
+
+    def values_batch_update(self, body):
+        self.calls.append("values_batch_update")
+        for item in body.get("data", []):
+            title, _, cells = item["range"].partition("!")
+            self.sheets[title.strip("'")]._set_range(cells, item["values"])
+        return {}
+
+
+class FakeClient:
+    """Stands in for the object returned by gspread.service_account()."""
+
+    def __init__(self, spreadsheet=None):
+        self.spreadsheet = spreadsheet or FakeSpreadsheet()
+
+    def open_by_key(self, key):
+        self.spreadsheet.calls.append("open_by_key")
+        return self.spreadsheet
+
+# ---------- FAILURES ----------
+class FakeResponse:
+    """The parts of a requests.Response that gspread's APIError reads."""
+
+    def __init__(self, status_code, message="fake failure"):
+        self.status_code = status_code
+        self.text = json.dumps({"error": {"code": status_code, "message": message, "status": ""}})
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def api_error(status_code):
+    """gspread.exceptions.APIError as raised for an HTTP `status_code` reply."""
+    return gspread.exceptions.APIError(FakeResponse(status_code))
+
+
+class Failing:
+    """
+    Makes one method of a fake raise `error` on its next `times` calls (on
+    every call while times is None) before reaching the fake. heal() puts
+    the method back. attempts counts the calls made through it.
+    """
+
+    def __init__(self, target, method, error, times=None):
+        self.target = target
+        self.method = method
+        self.error = error
+        self.left = times
+        self.attempts = 0
+        original = getattr(target, method)
+
+        def call(*args, **kwargs):
+            self.attempts += 1
+            if self.left is None or self.left > 0:
+                if self.left is not None:
+                    self.left -= 1
+                raise self.error
+            return original(*args, **kwargs)
+        call.__name__ = method
+        setattr(target, method, call)
+
+    def heal(self):
+        self.target.__dict__.pop(self.method, None)
+
+# ---------- GROQ ----------
+class _Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class FakeGroq:
+    """
+    Groq client whose chat.completions.create() answers from a table of
+    canned replies keyed by the user's message.
+    """
+
+    def __init__(self, replies, default=None):
+        self.replies = replies
+        self.default = default or {"intent": "general_chat", "data": {}, "reply": "Okay.", "voice_reply": False}
+        self.calls = []
+        self.chat = _Obj(completions=_Obj(create=self._create))
+
+    def _create(self, model, messages, **kwargs):
+        self.calls.append(model)
+        text = messages[-1]["content"]
+        reply = self.replies.get(text, self.default)
+        content = reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+        prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+        return _Obj(
+            choices=[_Obj(message=_Obj(content=content))],
+            usage=_Obj(prompt_tokens=prompt_tokens, completion_tokens=len(content) // 4),
+            model=model,
+        )
+
+# ---------- TELEGRAM ----------
+class FakeMessage:
+    def __init__(self, text="", chat_id=1, voice=None):
+        self.text = text
+        self.voice = voice
+        self.chat_id = chat_id
+        self.sent = []
+
+    async def reply_text(self, text, **kwargs):
+        self.sent.append(("text", text))
+
+    async def reply_document(self, document, **kwargs):
+        self.sent.append(("document", kwargs.get("filename")))
+
+    async def reply_audio(self, audio=None, **kwargs):
+        self.sent.append(("audio", None))
+
+
+class FakeUpdate:
+    def __init__(self, text="", user_id=1):
+        self.message = FakeMessage(text, chat_id=user_id)
+        self.effective_message = self.message
+        self.effective_user = _Obj(id=user_id)
+        self.effective_chat = _Obj(id=user_id)
+        self.callback_query = None
+
+
+class FakeContext:
+    def __init__(self, **kwargs):
+        self.bot = None
+        self.args = []
+        self.user_data = {}
+        self.chat_data = {}
+        self.bot_data = {}
+        self.__dict__.update(kwargs)
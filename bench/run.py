@@ -0,0 +1,208 @@
+# bench/run.py - offline benchmark runner
+#
+#   python -m bench.run                      # all suites, all sizes
+#   python -m bench.run --suite sheets --sizes 100,1000 -k stock
+#   python -m bench.run --compare bench/results/<earlier>.json
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime
+
+# no quota throttling against in-memory fakes
+os.environ.setdefault("SHEETS_REQUESTS_PER_MINUTE", "1000000000")
+
+from bench import suites
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+class Benchmark:
+    """Minimal pytest-benchmark compatible fixture: benchmark(fn, *args)."""
+
+    def __init__(self, min_time=0.2, min_rounds=3, max_rounds=200):
+        self.min_time = min_time
+        self.min_rounds = min_rounds
+        self.max_rounds = max_rounds
+        self.timings = []
+
+    def __call__(self, fn, *args, **kwargs):
+        result = None
+        started = time.perf_counter()
+        while len(self.timings) < self.max_rounds:
+            t0 = time.perf_counter()
+            result = fn(*args, **kwargs)
+            self.timings.append(time.perf_counter() - t0)
+            if len(self.timings) >= self.min_rounds and time.perf_counter() - started >= self.min_time:
+                break
+        return result
+
+    def stats(self):
+        t = self.timings
+        return {
+            "rounds": len(t),
+            "min": min(t),
+            "max": max(t),
+            "mean": statistics.fmean(t),
+            "median": statistics.median(t),
+            "stddev": statistics.stdev(t) if len(t) > 1 else 0.0,
+            "ops": 1 / statistics.fmean(t) if statistics.fmean(t) else 0.0,
+        }
+
+
+def _measure(name, suite, case, rows, run_case, sh, args):
+    """Run one case; first round is also used to count Sheets API calls."""
+    bench = Benchmark(args.min_time, args.min_rounds, args.max_rounds)
+    before = suites.api_calls(sh)
+    calls = None
+    error = None
+    try:
+        probe = Benchmark(0, 1, 1)
+        run_case(probe)
+        calls = suites.api_calls(sh) - before
+        run_case(bench)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    entry = {"name": name, "suite": suite, "case": case, "rows": rows, "api_calls": calls}
+    if error:
+        entry["error"] = error
+    elif bench.timings:
+        entry["stats"] = bench.stats()
+    return entry
+
+
+def run(args):
+    import google_sheets as gs
+
+    results = []
+    loop = asyncio.new_event_loop()
+    bot = None
+    if args.suite in ("all", "bot"):
+        import bot
+        # bot.py logs every AI reply at INFO; keep the benchmark output readable
+        logging.getLogger().setLevel(logging.WARNING)
+
+    for rows in args.sizes:
+        if args.suite in ("all", "sheets"):
+            for case in suites.SHEETS_CASES:
+                if args.k and args.k not in case:
+                    continue
+                sh = suites.install_fakes(rows)
+                name = f"sheets.{case}[{rows}]"
+                results.append(_measure(name, "sheets", case, rows,
+                                        lambda b: suites.sheets_suite(b, gs, case, rows), sh, args))
+                _report(results[-1])
+
+        if args.suite in ("all", "bot"):
+            for message, reply in suites.INTENT_MESSAGES.items():
+                case = reply["intent"]
+                if args.k and args.k not in case:
+                    continue
+                sh = suites.install_fakes(rows)
+                name = f"bot.{case}[{rows}]"
+                results.append(_measure(name, "bot", case, rows,
+                                        lambda b: suites.bot_suite(b, bot, message, loop), sh, args))
+                _report(results[-1])
+    loop.close()
+    return results
+
+
+def _report(entry):
+    if "error" in entry:
+        print(f"{entry['name']:<45} ERROR {entry['error']}")
+        return
+    s = entry["stats"]
+    print(f"{entry['name']:<45} median {s['median'] * 1000:9.3f} ms  "
+          f"min {s['min'] * 1000:9.3f} ms  rounds {s['rounds']:4d}  api calls {entry['api_calls']}")
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+
+def save(results, path=None):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    rev = _git_rev()
+    path = path or os.path.join(RESULTS_DIR, f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}_{rev}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "created": datetime.utcnow().isoformat(),
+                "git": rev,
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+            },
+            "results": results,
+        }, f, indent=2)
+    return path
+
+
+def compare(results, baseline_path, threshold):
+    """Print median change per case; return names that regressed past threshold."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        old = baseline.get(r["name"])
+        if not old or "stats" not in old or "stats" not in r:
+            continue
+        change = r["stats"]["median"] / old["stats"]["median"] - 1 if old["stats"]["median"] else 0.0
+        calls = ""
+        if old.get("api_calls") is not None and r.get("api_calls") is not None and old["api_calls"] != r["api_calls"]:
+            calls = f"  api calls {old['api_calls']} -> {r['api_calls']}"
+        flag = ""
+        if change > threshold or (calls and r["api_calls"] > old["api_calls"]):
+            flag = "  REGRESSION"
+            regressions.append(r["name"])
+        print(f"{r['name']:<45} {change * 100:+7.1f}%{calls}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks against in-memory fakes")
+    parser.add_argument("--suite", choices=("all", "sheets", "bot"), default="all")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in suites.SIZES),
+                        help="comma separated sheet sizes (data rows)")
+    parser.add_argument("-k", default="", help="only cases whose name contains this")
+    parser.add_argument("--min-time", type=float, default=0.2)
+    parser.add_argument("--min-rounds", type=int, default=3)
+    parser.add_argument("--max-rounds", type=int, default=200)
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", help="earlier results file to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed median slowdown (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+    args.sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    # invoices and TTS write files into the working directory
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            results = run(args)
+        finally:
+            os.chdir(cwd)
+
+    if not args.no_save:
+        print("saved", save(results))
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
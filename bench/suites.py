@@ -0,0 +1,195 @@
+# bench/suites.py - benchmark cases for google_sheets functions and handle_message intents
+#
+# Cases take a pytest-benchmark style `benchmark` callable plus a fixture, so
+# they run the same under bench.run or pytest-benchmark (bench/test_benchmarks.py).
+import asyncio
+from datetime import datetime, timedelta
+
+from bench.fakes import FakeClient, FakeContext, FakeGroq, FakeSpreadsheet, FakeUpdate, FakeWorksheet
+
+SIZES = (100, 1000, 10000, 100000)
+
+HEADERS = {
+    "Customer": ["Name", "Email", "Phone", "Company", "CreatedAt"],
+    "Task": ["Task Name", "Assigned To", "Status", "CreatedAt"],
+    "Inventory": ["Product", "Quantity", "Price", "UpdatedAt"],
+    "Finance": ["Customer", "Amount", "Type", "Date", "Notes"],
+    "Report": ["Timestamp", "Report"],
+    "Memory": ["UserID", "Timestamp", "Role", "Text"],
+    "Invoice": ["InvoiceID", "Date", "Customer", "ItemsJSON", "Subtotal", "TaxRate",
+                "Discount", "GrandTotal", "Paid", "Due"],
+    "Purchase": ["PurchaseID", "Date", "Supplier", "Product", "Quantity", "PriceEach", "Total", "Notes"],
+    "Sales": ["SaleID", "Date", "Customer", "Product", "Quantity", "PriceEach", "Total", "Profit", "Notes"],
+    "CRM": ["Customer", "Phone", "Email", "LastVisit", "TotalPurchases", "TotalSpent",
+            "TotalProfit", "Notes", "Tags"],
+    "ServiceHistory": ["ServiceID", "Date", "Customer", "Device", "Problem", "Status",
+                       "Cost", "Technician", "Notes"],
+}
+
+# ---------- FIXTURES ----------
+def build_spreadsheet(rows):
+    """
+    A fake spreadsheet with `rows` data rows in every transactional sheet.
+    Dates ascend over the past year and end today, like a real append-only log.
+    """
+    sh = FakeSpreadsheet()
+    now = datetime.utcnow()
+    # shared pools keep 100k-row fixtures small in memory
+    products = [f"Product {i}" for i in range(min(rows, 5000))]
+    customers = [f"Customer {i}" for i in range(min(rows, 5000))]
+    stamps = [(now - timedelta(minutes=(rows - i) * 525600 // rows)).isoformat() for i in range(rows)]
+
+    def sheet(title, make_row):
+        data = [HEADERS[title]] + [make_row(i) for i in range(rows)]
+        sh.add(FakeWorksheet(title, data, cols=len(HEADERS[title])))
+
+    sheet("Customer", lambda i: [customers[i % len(customers)], "c@example.com", "9876543210", "Acme", stamps[i]])
+    sheet("Task", lambda i: [f"Task {i}", "self", "pending" if i % 3 else "done", stamps[i]])
+    sheet("Inventory", lambda i: [f"Product {i}", (i * 7) % 50, 100 + i % 900, stamps[i]])
+    sheet("Finance", lambda i: [customers[i % len(customers)], 500, "income" if i % 2 else "expense",
+                                stamps[i][:10], ""])
+    sheet("Report", lambda i: [stamps[i], "report"])
+    sheet("Memory", lambda i: [str(i % 50), stamps[i], "user" if i % 2 else "assistant", "hello"])
+    sheet("Invoice", lambda i: [f"INV-{i}", stamps[i], customers[i % len(customers)], "[]",
+                                100, 0, 0, 100, 100, 0])
+    sheet("Purchase", lambda i: [f"P-{i}", stamps[i], "Supplier", products[i % len(products)],
+                                 5, 100, 500, ""])
+    sheet("Sales", lambda i: [f"S-{i}", stamps[i], customers[i % len(customers)], products[i % len(products)],
+                              1, 150, 150, 50, ""])
+    sheet("CRM", lambda i: [f"Customer {i}", "9876543210", "c@example.com", stamps[i][:10],
+                            3, 450, 150, "", ""])
+    sheet("ServiceHistory", lambda i: [f"JOB-{i}", stamps[i], customers[i % len(customers)], "Laptop",
+                                       "Screen", "Pending" if i % 4 else "Done", 0, "Ravi", ""])
+    return sh
+
+
+def api_calls(sh):
+    return len(sh.calls) + sum(len(ws.calls) for ws in sh.sheets.values())
+
+# ---------- GOOGLE SHEETS SUITE ----------
+def _last_product(rows):
+    return f"Product {rows - 1}"
+
+
+SHEETS_CASES = {
+    "add_customer": lambda gs, n: gs.add_customer("Bench", "b@example.com", "9000000000", "Acme"),
+    "get_customers": lambda gs, n: gs.get_customers(),
+    "add_task": lambda gs, n: gs.add_task("Bench task"),
+    "get_tasks": lambda gs, n: gs.get_tasks(),
+    "add_inventory": lambda gs, n: gs.add_inventory("Bench item", 5, 100),
+    "update_inventory": lambda gs, n: gs.update_inventory(_last_product(n), 10, 120),
+    "get_inventory": lambda gs, n: gs.get_inventory(),
+    "low_stock_items": lambda gs, n: gs.low_stock_items(),
+    "add_finance": lambda gs, n: gs.add_finance("Bench", 100, "income"),
+    "get_finance": lambda gs, n: gs.get_finance(),
+    "add_report": lambda gs, n: gs.add_report("bench"),
+    "add_memory": lambda gs, n: gs.add_memory(7, "user", "hello"),
+    "get_memory": lambda gs, n: gs.get_memory(7),
+    "add_invoice": lambda gs, n: gs.add_invoice("Bench", [], 100, 0, 0, 100, 100, 0),
+    "add_purchase": lambda gs, n: gs.add_purchase("Supplier", "Product 1", 2, 100),
+    "add_sale": lambda gs, n: gs.add_sale("Bench", "Product 1", 1, 150, 100),
+    "increase_stock": lambda gs, n: gs.increase_stock(_last_product(n), 1, 100),
+    "decrease_stock": lambda gs, n: gs.decrease_stock(_last_product(n), 1),
+    "get_purchase_price": lambda gs, n: gs.get_purchase_price(_last_product(n)),
+    "get_low_stock": lambda gs, n: gs.get_low_stock(),
+    "get_top_selling": lambda gs, n: gs.get_top_selling(),
+    "get_total_profit": lambda gs, n: gs.get_total_profit(),
+    "get_today_summary": lambda gs, n: gs.get_today_summary(),
+    "crm_add_or_update": lambda gs, n: gs.crm_add_or_update(f"Customer {n - 1}", notes="vip"),
+    "crm_update_sales": lambda gs, n: gs.crm_update_sales(f"Customer {n - 1}", 150, 50),
+    "get_crm": lambda gs, n: gs.get_crm(),
+    "get_customer_profile": lambda gs, n: gs.get_customer_profile(f"Customer {n - 1}"),
+    "add_service": lambda gs, n: gs.add_service("Bench", "Laptop", "Screen"),
+    "get_service_history": lambda gs, n: gs.get_service_history(),
+    "get_service": lambda gs, n: gs.get_service(f"JOB-{n - 1}"),
+    "update_service": lambda gs, n: gs.update_service(f"JOB-{n - 1}", status="Done"),
+    "list_services": lambda gs, n: gs.list_services(status="Pending", technician="Ravi"),
+}
+
+
+def sheets_suite(benchmark, gs, case, rows):
+    fn = SHEETS_CASES[case]
+    return benchmark(fn, gs, rows)
+
+# ---------- HANDLE_MESSAGE SUITE ----------
+def _ai(intent, data=None, reply=""):
+    return {"intent": intent, "data": data or {}, "reply": reply, "voice_reply": False}
+
+
+# user text -> (intent name, canned model reply)
+INTENT_MESSAGES = {
+    "add customer Rahul 9876543210": _ai("add_customer", {"name": "Rahul", "phone": "9876543210"}),
+    "customers dikhao": _ai("get_customers"),
+    "task: call supplier": _ai("add_task", {"task": "call supplier"}),
+    "tasks dikhao": _ai("get_tasks"),
+    "add 10 mouse at 300": _ai("add_inventory", {"product": "Mouse", "quantity": 10, "price": 300}),
+    "mouse stock 20 karo": _ai("update_inventory", {"product": "Product 1", "quantity": 20, "price": 300}),
+    "stock dikhao": _ai("get_inventory"),
+    "low stock": _ai("low_stock_check"),
+    "10 Product 1 aaye 100 ke": _ai("purchase_entry", {"supplier": "Supplier", "product": "Product 1",
+                                                       "quantity": 10, "price_each": 100}),
+    "2 Product 1 beche 150 me": _ai("sales_entry", {"customer": "Customer 1", "product": "Product 1",
+                                                   "quantity": 2, "selling_price": 150}),
+    "5 aaye aur 2 bik gaye": _ai("mixed_transaction", {
+        "purchases": [{"product": "Product 2", "quantity": 5, "price_each": 100}],
+        "sales": [{"product": "Product 2", "quantity": 2, "selling_price": 150}],
+    }),
+    "5000 income from Rahul": _ai("add_finance", {"customer": "Rahul", "amount": 5000, "type": "income"}),
+    "finance dikhao": _ai("get_finance"),
+    "bill banao Rahul": _ai("create_invoice", {"customer": "Rahul", "items": [
+        {"product": "Product 1", "quantity": 1, "price": 150}]}),
+    "Customer 1 profile": _ai("get_customer_profile", {"customer": "Customer 1"}),
+    "laptop repair Rahul": _ai("add_service", {"customer": "Rahul", "device": "Laptop", "problem": "Screen"}),
+    "JOB-1 status": _ai("get_service_status", {"service_id": "JOB-1"}),
+    "JOB-1 done": _ai("update_service", {"service_id": "JOB-1", "status": "Done"}),
+    "pending jobs": _ai("list_services", {"status": "Pending"}),
+    "sales this month": _ai("sales_report", {"period": "month"}),
+    "purchase report": _ai("purchase_report", {"period": "week"}),
+    "profit kitna hua": _ai("profit_report", {"period": "all"}),
+    "weekly report": _ai("weekly_report"),
+    "aaj ki report": _ai("daily_report"),
+    "business insights": _ai("suggestions"),
+    "hello": _ai("general_chat", reply="Hello!"),
+}
+
+
+def intent_of(message):
+    return INTENT_MESSAGES[message]["intent"]
+
+
+def fake_groq():
+    return FakeGroq(INTENT_MESSAGES)
+
+
+def bot_suite(benchmark, bot, message, loop=None):
+    loop = loop or asyncio.new_event_loop()
+    context = FakeContext()
+
+    def run():
+        update = FakeUpdate(message, user_id=7)
+        loop.run_until_complete(bot.handle_message(update, context))
+        return update
+
+    return benchmark(run)
+
+
+def install_fakes(rows):
+    """
+    Point google_sheets and ai_agent at fresh fakes and run the startup
+    bootstrap and cache warm-up, so cases measure the warm request path.
+    Returns the spreadsheet.
+    """
+    import ai_agent
+    import analytics
+    import google_sheets as gs
+    import weekly_report
+
+    sh = build_spreadsheet(rows)
+    gs.set_client(FakeClient(sh))
+    ai_agent.set_client(fake_groq())
+    gs.bootstrap()
+    gs.warm_caches()
+    analytics.reset()
+    analytics.warm()
+    weekly_report.refresh_reports()
+    return sh
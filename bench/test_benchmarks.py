@@ -0,0 +1,44 @@
+# bench/test_benchmarks.py - the bench.suites cases as a pytest-benchmark session
+#
+#   python -m pytest bench/test_benchmarks.py --benchmark-only
+#   BENCH_SIZES=100,10000 python -m pytest bench/test_benchmarks.py -k stock
+#
+# Same cases and fixtures as bench.run; use whichever reporting you prefer.
+# Skipped when pytest-benchmark is not installed.
+import os
+import asyncio
+
+import pytest
+
+os.environ.setdefault("SHEETS_REQUESTS_PER_MINUTE", "1000000000")
+pytest.importorskip("pytest_benchmark")
+
+from bench import suites
+
+SIZES = [int(s) for s in os.getenv("BENCH_SIZES", "100,1000").split(",") if s]
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # invoices and TTS write files into the working directory
+    monkeypatch.chdir(tmp_path)
+
+
+@pytest.mark.parametrize("rows", SIZES)
+@pytest.mark.parametrize("case", list(suites.SHEETS_CASES))
+def test_sheets(benchmark, case, rows):
+    import google_sheets as gs
+    suites.install_fakes(rows)
+    suites.sheets_suite(benchmark, gs, case, rows)
+
+
+@pytest.mark.parametrize("rows", SIZES)
+@pytest.mark.parametrize("message", list(suites.INTENT_MESSAGES), ids=suites.intent_of)
+def test_bot(benchmark, message, rows):
+    import bot
+    suites.install_fakes(rows)
+    loop = asyncio.new_event_loop()
+    try:
+        suites.bot_suite(benchmark, bot, message, loop)
+    finally:
+        loop.close()
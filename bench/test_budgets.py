@@ -0,0 +1,33 @@
+# bench/test_budgets.py - bench.budgets as tests, one per intent
+#
+#   python -m pytest bench/test_budgets.py
+#   BENCH_BUDGET_ROWS=10000 python -m pytest bench/test_budgets.py -k stock
+#
+# Fails when an intent makes more Sheets/LLM/... calls than BUDGETS allows,
+# or when a canned message has no budget at all.
+import os
+
+import pytest
+
+from bench import budgets, suites
+
+ROWS = int(os.getenv("BENCH_BUDGET_ROWS", "1000"))
+
+
+@pytest.fixture(scope="module")
+def traces(tmp_path_factory):
+    # invoices and TTS write files into the working directory
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("budgets"))
+    try:
+        return budgets.trace_intents(ROWS)
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize("intent", sorted({suites.intent_of(m) for m in suites.INTENT_MESSAGES}))
+def test_within_budget(traces, intent):
+    assert intent in budgets.BUDGETS, f"no budget for {intent}"
+    counts, calls = traces[intent]
+    over = budgets.check({intent: (counts, calls)})
+    assert not over, "; ".join(f"{kind} {used} > {allowed}" for _, kind, used, allowed in over) + f"\n{calls}"
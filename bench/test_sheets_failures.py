@@ -0,0 +1,196 @@
+# bench/test_sheets_failures.py - google_sheets when the API fails
+#
+#   python -m pytest bench/test_sheets_failures.py
+#
+# Retries and backoff on 429/5xx, the circuit breaker, snapshot reads and
+# the write journal, driven by bench.fakes.Failing on the in-memory fakes.
+import json
+import time
+
+import pytest
+
+from bench import suites
+from bench.fakes import Failing, api_error
+
+RETRIES = 3
+BACKOFF = 0.01
+COOLDOWN = 0.05
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def sheets(tmp_path, monkeypatch):
+    """google_sheets on fresh fakes, with its own breaker, snapshots and journal."""
+    import google_sheets as gs
+    monkeypatch.setattr(gs, "SHEETS_MAX_RETRIES", RETRIES)
+    monkeypatch.setattr(gs, "SHEETS_BACKOFF_BASE", BACKOFF)
+    monkeypatch.setattr(gs, "_scheduler", gs._Scheduler(1000000000))
+    monkeypatch.setattr(gs, "_breaker", gs._Breaker(3, COOLDOWN, gs._probe))
+    monkeypatch.setattr(gs, "_snapshots", gs._Snapshots(gs.SHEETS_SNAPSHOT_ENTRIES))
+    monkeypatch.setattr(gs, "_journal", gs._Journal(str(tmp_path / "journal.jsonl")))
+    sh = suites.install_fakes(20)
+    failures = []
+
+    def fail(target, method, error, times=None):
+        failures.append(Failing(target, method, error, times))
+        return failures[-1]
+
+    yield gs, sh, fail
+    # no probe or replay thread may outlive the test and touch later fakes
+    for failure in failures:
+        failure.heal()
+    wait_for(gs._breaker.allow)
+    wait_for(lambda: not gs._journal.replaying)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays, taken at their upper bound and not slept."""
+    import google_sheets as gs
+    delays = []
+    monkeypatch.setattr(gs.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(gs.time, "sleep", delays.append)
+    return delays
+
+
+def open_breaker(gs, sh, fail):
+    # reads fail on a timeout, and so does the probe until the test heals it
+    probe = fail(gs.gc, "open_by_key", OSError("timed out"))
+    ws = sh.worksheet("Inventory")
+    gs._read(ws, "get_all_records")  # a snapshot to serve
+    reads = fail(ws, "get_all_records", OSError("timed out"))
+    for _ in range(3):
+        gs._read(ws, "get_all_records")
+    assert not gs._breaker.allow()
+    return probe, reads
+
+
+@pytest.mark.parametrize("status", [500, 503])
+def test_5xx_is_retried_with_backoff(sheets, sleeps, status):
+    gs, sh, fail = sheets
+    ws = sh.worksheet("Inventory")
+    expected = ws.get_all_records()
+    failing = fail(ws, "get_all_records", api_error(status), times=2)
+    assert gs._read(ws, "get_all_records") == expected
+    assert failing.attempts == 3
+    assert sleeps == [BACKOFF, BACKOFF * 2]
+    assert gs._breaker.allow() and gs._breaker.failures == 0
+
+
+def test_429_is_retried_without_counting_as_an_outage(sheets, sleeps):
+    gs, sh, fail = sheets
+    ws = sh.worksheet("Inventory")
+    failing = fail(ws, "append_row", api_error(429), times=RETRIES)
+    gs._write(ws, "append_row", ["Pen", 5, 10, ""])
+    assert failing.attempts == RETRIES + 1
+    assert sleeps == [BACKOFF * 2 ** i for i in range(RETRIES)]
+    assert ws.rows[-1] == ["Pen", 5, 10, ""]
+    assert gs._breaker.failures == 0
+
+
+def test_429_gives_up_after_max_retries(sheets, sleeps):
+    gs, sh, fail = sheets
+    ws = sh.worksheet("Inventory")
+    failing = fail(ws, "get_all_records", api_error(429))
+    with pytest.raises(gs._gspread().exceptions.APIError):
+        gs._read(ws, "get_all_records")
+    assert failing.attempts == RETRIES + 1
+
+
+def test_4xx_is_not_retried(sheets, sleeps):
+    gs, sh, fail = sheets
+    ws = sh.worksheet("Inventory")
+    failing = fail(ws, "update_cell", api_error(400))
+    with pytest.raises(gs._gspread().exceptions.APIError):
+        gs._write(ws, "update_cell", 2, 2, 99)
+    assert failing.attempts == 1 and sleeps == []
+    assert gs._breaker.allow() and not gs._journal.pending()
+
+
+def test_breaker_opens_probes_and_closes(sheets):
+    gs, sh, fail = sheets
+    probe, reads = open_breaker(gs, sh, fail)
+    # open: callers no longer reach Sheets
+    gs._read(sh.worksheet("Inventory"), "get_all_records")
+    assert reads.attempts == 3
+    # half-open: every cooldown one probe goes out; a failed one keeps it open
+    wait_for(lambda: probe.attempts >= 2)
+    assert not gs._breaker.allow()
+    probe.heal()
+    wait_for(gs._breaker.allow)
+    reads.heal()
+    gs._read(sh.worksheet("Inventory"), "get_all_records")
+    assert reads.attempts == 3 and gs._breaker.failures == 0
+
+
+def test_5xx_opens_breaker_and_stops_retrying(sheets, sleeps):
+    gs, sh, fail = sheets
+    ws = sh.worksheet("Inventory")
+    fail(gs.gc, "open_by_key", OSError("timed out"))
+    before = gs._read(ws, "get_all_records")
+    failing = fail(ws, "get_all_records", api_error(503))
+    # the third failure opens the circuit: no fourth attempt, the snapshot answers
+    assert gs._read(ws, "get_all_records") == before
+    assert failing.attempts == 3 and len(sleeps) == 2
+    assert not gs._breaker.allow()
+
+
+def test_snapshot_serves_the_last_read(sheets):
+    gs, sh, fail = sheets
+    ws = sh.worksheet("Inventory")
+    before = gs._read(ws, "get_all_records")
+    gs._read(ws, "row_values", 1)
+    open_breaker(gs, sh, fail)
+    assert gs._read(ws, "get_all_records") == before
+    assert gs._read(ws, "row_values", 1) == ws.rows[0]
+    # single rows come from the sheet's snapshot
+    assert gs._read(ws, "row_values", 2) == [before[0][h] for h in gs._headers("Inventory")]
+    with pytest.raises(gs.SheetsUnavailable):
+        gs._read(ws, "get_values", "Z1:Z9")
+
+
+def test_writes_are_journaled_while_down_and_replayed_in_order(sheets):
+    gs, sh, fail = sheets
+    probe, reads = open_breaker(gs, sh, fail)
+    sales, tasks = sh.worksheet("Sales"), sh.worksheet("Task")
+    sales_before, tasks_before = len(sales.rows), len(tasks.rows)
+    gs._write(sales, "append_row", ["S-1", "2026-10-19", "Ali", "Pen", 1, 10, 10, 2, ""])
+    gs._write(tasks, "append_row", ["Call Ali", "self", "pending", "2026-10-19"])
+    gs._write(sales, "append_row", ["S-2", "2026-10-19", "Sara", "Ink", 2, 20, 40, 8, ""])
+    gs._write(sales, "update_cell", sales_before + 1, 9, "paid")
+
+    with open(gs._journal.path, encoding="utf-8") as f:
+        journaled = [json.loads(line) for line in f]
+    assert [(e["sheet"], e["method"]) for e in journaled] == [
+        ("Sales", "append_row"), ("Task", "append_row"), ("Sales", "append_row"), ("Sales", "update_cell"),
+    ]
+    assert len(sales.rows) == sales_before and len(tasks.rows) == tasks_before
+    assert gs._journal.pending()
+
+    sales.calls.clear()
+    probe.heal()
+    wait_for(lambda: not gs._journal.pending())
+    assert [row[0] for row in sales.rows[sales_before:]] == ["S-1", "S-2"]
+    assert sales.rows[sales_before][8] == "paid"
+    assert tasks.rows[-1][0] == "Call Ali"
+    # the run of Sales appends goes out as one request, before the cell update
+    assert sales.calls == ["append_rows", "batch_update"]
+
+
+def test_writes_queue_behind_the_journal_after_recovery(sheets):
+    gs, sh, fail = sheets
+    ws = sh.worksheet("Inventory")
+    gs._journal.add(ws, "append_row", (["Pen", 1, 10, ""],), {})
+    gs._journal.replaying = True  # hold the replay
+    gs._write(ws, "append_row", ["Ink", 2, 20, ""])
+    assert ws.rows[-1][0] != "Ink"
+    gs._journal.replaying = False
+    gs._journal.start_replay()
+    wait_for(lambda: not gs._journal.pending())
+    assert [row[0] for row in ws.rows[-2:]] == ["Pen", "Ink"]
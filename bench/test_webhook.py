@@ -0,0 +1,87 @@
+# bench/test_webhook.py - a non-registering replica must never touch the Bot API
+#
+#   python -m pytest bench/test_webhook.py
+import json
+import asyncio
+import socket
+import urllib.error
+import urllib.request
+
+import webhook_receiver
+
+
+class RecordingBot:
+    """Bot stand-in: any Bot API method called on it is recorded."""
+    defaults = None
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def method(*args, **kwargs):
+            self.calls.append(name)
+        return method
+
+
+class FakeApp:
+    def __init__(self):
+        self.bot = RecordingBot()
+        self.update_queue = asyncio.Queue()
+        self.running = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def start(self):
+        self.running = True
+
+    async def stop(self):
+        self.running = False
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _post(port, path, payload, secret=None):
+    req = urllib.request.Request(f"http://127.0.0.1:{port}/{path}", json.dumps(payload).encode(), method="POST")
+    req.add_header("Content-Type", "application/json")
+    if secret:
+        req.add_header(webhook_receiver.SECRET_HEADER, secret)
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_unregistered_webhook_queues_updates_without_bot_api_calls():
+    app = FakeApp()
+    port = _free_port()
+
+    async def scenario():
+        stop = asyncio.Event()
+        server = asyncio.create_task(webhook_receiver.serve(app, "127.0.0.1", port, "telegram", "s3cret", stop))
+        while not app.running:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)  # receiver thread listening
+        statuses = [
+            await asyncio.to_thread(_post, port, "telegram", {"update_id": 1}, "s3cret"),
+            await asyncio.to_thread(_post, port, "telegram", {"update_id": 2}, "wrong"),
+            await asyncio.to_thread(_post, port, "other", {"update_id": 3}, "s3cret"),
+        ]
+        stop.set()
+        await server
+        return statuses
+
+    assert asyncio.run(scenario()) == [200, 403, 404]
+    assert app.update_queue.qsize() == 1
+    assert app.bot.calls == []  # no setWebhook/deleteWebhook (or anything else)
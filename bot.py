@@ -1,27 +1,63 @@
 # bot.py - final multilingual bot
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import os
+import asyncio
 import logging
-import subprocess
 import tempfile
+import threading
 from dotenv import load_dotenv
 
-from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import Application, CallbackQueryHandler, CommandHandler, MessageHandler, ContextTypes, filters
 from datetime import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-# Voice libs
-import speech_recognition as sr
-from gtts import gTTS
+# reportlab, speech_recognition and gTTS are imported where they are used,
+# so startup only pays for them once an invoice/voice message needs them
 
 # Local modules
-from ai_agent import ask_ai_agent, parse_ai_response
+from ai_agent import ask_ai_agent, missing_data, parse_ai_response
+import analytics
+import audio
 import google_sheets as gs
-from weekly_report import generate_weekly_report
+import intent_classifier
+import media_pool
+import metrics
+import status_server
+import stock_alerts
+import stt
+import tracing
+import weekly_report
 
 load_dotenv()
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 
+# "polling" (default) or "webhook"
+BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+# Webhook mode: the reverse proxy forwards WEBHOOK_URL to WEBHOOK_LISTEN:WEBHOOK_PORT/WEBHOOK_PATH.
+# Give each replica its own WEBHOOK_PORT/STATUS_PORT and let only one of them
+# register the webhook with Telegram (WEBHOOK_REGISTER=1).
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "telegram").strip("/")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or None
+WEBHOOK_URL = os.getenv("WEBHOOK_URL") or None
+WEBHOOK_REGISTER = os.getenv("WEBHOOK_REGISTER", "1") == "1"
+# Health (/healthz) and readiness (/readyz) probes
+STATUS_HOST = os.getenv("STATUS_HOST", "127.0.0.1")
+STATUS_PORT = int(os.getenv("STATUS_PORT", "8080"))
+# >0: this process only receives updates and N worker processes handle them
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "0"))
+# rows per page of the customer/inventory/task/finance listings
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", "20"))
+# Telegram rejects messages over 4096 characters
+MAX_MESSAGE_CHARS = 4000
+# Background jobs (memory compaction). With several webhook replicas enable them on one only.
+RUN_JOBS = os.getenv("RUN_JOBS", "1") == "1"
+MEMORY_COMPACT_HOURS = float(os.getenv("MEMORY_COMPACT_HOURS", "24"))
+# Daily/weekly reports are rebuilt in the background this often and served from memory
+REPORTS_REFRESH_MINUTES = float(os.getenv("REPORTS_REFRESH_MINUTES", "30"))
+
 logging.basicConfig(format="%(asctime)s - %(levelname)s - %(message)s", level=logging.INFO)
 
 # -----------------------------
@@ -40,6 +76,9 @@ def generate_invoice_pdf(
     discount, grand_total, paid, due,
     pdf_path
 ):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
     c = canvas.Canvas(pdf_path, pagesize=A4)
     width, height = A4
     y = height - 50
@@ -92,11 +131,147 @@ def generate_invoice_pdf(
 # helper: save memory and send reply
 from typing import Optional
 
-async def reply_with_memory(update: Update, user_id: int, user_text: str, reply_text: str):
+async def reply_with_memory(update: Update, user_id: int, user_text: str, reply_text: str, reply_markup=None):
     # store both sides in Memory sheet
-    gs.add_memory(user_id, "user", user_text)
-    gs.add_memory(user_id, "assistant", reply_text)
-    return await update.message.reply_text(reply_text)
+    await asyncio.to_thread(gs.add_memory, user_id, "user", user_text)
+    await asyncio.to_thread(gs.add_memory, user_id, "assistant", reply_text)
+    return await update.message.reply_text(reply_text, reply_markup=reply_markup)
+
+# -----------------------------
+# Paginated listings
+# -----------------------------
+def _customer_line(c):
+    name = c.get("Name") or c.get("name") or ""
+    email = c.get("Email") or c.get("email") or ""
+    phone = c.get("Phone") or c.get("phone") or ""
+    company = c.get("Company") or c.get("company") or ""
+    return f"{name} - {phone} - {email} - {company}"
+
+def _task_line(t):
+    task_name = t.get("Task Name") or t.get("task_name") or t.get("Task") or ""
+    assigned = t.get("Assigned To") or t.get("assigned_to") or ""
+    status = t.get("Status") or t.get("status") or ""
+    return f"{task_name} | {assigned} | {status}"
+
+def _inventory_line(i):
+    product = i.get("Product") or ""
+    qty = i.get("Quantity") or ""
+    price = i.get("Price") or ""
+    return f"{product} — {qty} pcs — ₹{price}"
+
+def _finance_line(f):
+    customer = f.get("Customer") or ""
+    amount = f.get("Amount") or ""
+    ftype = f.get("Type") or ""
+    date = f.get("Date") or ""
+    return f"{customer} - ₹{amount} - {ftype} - {date}"
+
+# kind -> (sheet, empty message, row formatter); kind is used in callback data
+LISTINGS = {
+    "customers": ("Customer", "No customers found.", _customer_line),
+    "tasks": ("Task", "No tasks found.", _task_line),
+    "inventory": ("Inventory", "Inventory is empty.", _inventory_line),
+    "finance": ("Finance", "No finance records found.", _finance_line),
+}
+
+def render_page(kind, offset=0):
+    """
+    One page of a listing: (text, inline keyboard or None). Reads only the
+    page's rows and stops early rather than exceed Telegram's message limit.
+    """
+    title, empty, line = LISTINGS[kind]
+    records, has_more = gs.get_page(title, offset, LIST_PAGE_SIZE)
+    if not records:
+        return (empty if offset == 0 else "No more records."), None
+
+    lines = []
+    size = 0
+    for r in records:
+        text = line(r)[:MAX_MESSAGE_CHARS // 4]
+        if size + len(text) + 1 > MAX_MESSAGE_CHARS - 40:
+            has_more = True
+            break
+        lines.append(text)
+        size += len(text) + 1
+    shown = len(lines)
+    lines.append(f"({offset + 1}–{offset + shown})")
+
+    buttons = []
+    if offset > 0:
+        buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"page:{kind}:{max(offset - LIST_PAGE_SIZE, 0)}"))
+    if has_more:
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"page:{kind}:{offset + shown}"))
+    return "\n".join(lines), (InlineKeyboardMarkup([buttons]) if buttons else None)
+
+def _service_list(jobs):
+    """Filtered service jobs, cut off (with a count) before Telegram's message limit."""
+    lines = []
+    size = 0
+    for r in jobs:
+        text = f"{r['ServiceID']} | {r['Customer']} | {r['Device']} | {r['Status']} | {r['Technician']}"
+        text = text[:MAX_MESSAGE_CHARS // 4]
+        if size + len(text) + 1 > MAX_MESSAGE_CHARS - 80:
+            break
+        lines.append(text)
+        size += len(text) + 1
+    if len(lines) < len(jobs):
+        lines.append(f"…and {len(jobs) - len(lines)} more; filter by status, technician or customer.")
+    return "\n".join(lines)
+
+def _missing_entries(intent, data):
+    """Missing fields of a purchase/sales entry, or of any line of a mixed transaction."""
+    if intent != "mixed_transaction":
+        return missing_data(intent, data)
+    missing = []
+    for kind, items in (("purchase_entry", data.get("purchases")), ("sales_entry", data.get("sales"))):
+        for item in items or []:
+            for field in missing_data(kind, item if isinstance(item, dict) else {}):
+                if field not in missing:
+                    missing.append(field)
+    return missing
+
+@metrics.track_update("page_handler")
+async def page_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    _, kind, offset = query.data.split(":")
+    metrics.set_intent(f"page_{kind}")
+    await query.answer()
+    text, markup = await asyncio.to_thread(render_page, kind, int(offset))
+    await query.edit_message_text(text, reply_markup=markup)
+# -----------------------------
+# Precomputed daily/weekly reports
+# -----------------------------
+def render_report(kind):
+    """Cached report text and its Daily/Weekly/Refresh buttons. Never reads Sheets."""
+    other = "weekly" if kind == "daily" else "daily"
+    markup = InlineKeyboardMarkup([[
+        InlineKeyboardButton(f"{other.title()} 📊", callback_data=f"report:{other}"),
+        InlineKeyboardButton("🔄 Refresh", callback_data=f"report:{kind}:refresh"),
+    ]])
+    cached = weekly_report.cached_report(kind)
+    if cached is None:
+        return "⏳ The report is being prepared, tap Refresh in a moment.", markup
+    generated_at, text = cached
+    age = int((datetime.utcnow() - generated_at).total_seconds() // 60)
+    return f"{text}\n🕒 Updated {generated_at:%H:%M} UTC ({age} min ago)", markup
+
+async def refresh_report(kind):
+    # explicit refresh: rebuild now and keep a copy in the Report sheet
+    await asyncio.to_thread(weekly_report.refresh_report, kind, True)
+
+@metrics.track_update("report_handler")
+async def report_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    _, kind, *action = query.data.split(":")
+    metrics.set_intent(f"{kind}_report")
+    if action == ["refresh"]:
+        await query.answer("Refreshing…")
+        await refresh_report(kind)
+    else:
+        await query.answer()
+    text, markup = await asyncio.to_thread(render_report, kind)
+    await query.edit_message_text(text, reply_markup=markup)
+
 # -----------------------------
 # Menu (Bilingual single-line)
 # -----------------------------
@@ -128,8 +303,10 @@ async def menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # -----------------------------
 # Menu button handler
 # -----------------------------
+@metrics.track_update("menu_handler")
 async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text or ""
+    metrics.set_intent("menu")
     # normalize exact left part (English) for matching
     if text.startswith("Customers"):
         keyboard = [["Add Customer (ग्राहक जोड़ें)"], ["View Customers (ग्राहकों को देखें)"], ["⬅️ Back to Menu (वापस जाएं)"]]
@@ -148,8 +325,9 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.message.reply_text("Finance options:", reply_markup=ReplyKeyboardMarkup(keyboard, resize_keyboard=True))
 
     if text.startswith("Reports"):
-        report_text = generate_weekly_report()
-        return await update.message.reply_text(report_text, reply_markup=get_back_menu())
+        metrics.set_intent("weekly_report")
+        report_text, markup = await asyncio.to_thread(render_report, "weekly")
+        return await update.message.reply_text(report_text, reply_markup=markup)
 
     if text.startswith("🎙 Voice Assistant"):
         # prompt user to send voice
@@ -169,7 +347,7 @@ def generate_suggestions():
     if low:
         s = "⚠️ Low Stock Items:\n"
         for p, q in low:
-            s += f"• {p} — {q} pcs left\n"
+            s += f"• {p} — {q:g} pcs left\n"
         suggestions.append(s)
 
     # Best selling products
@@ -200,33 +378,89 @@ def generate_suggestions():
 
     return "\n\n".join(suggestions)
 
+# -----------------------------
+# Sales / purchase / profit reports
+# -----------------------------
+REPORTS = {
+    "sales_report": analytics.sales_report,
+    "purchase_report": analytics.purchase_report,
+    "profit_report": analytics.profit_report,
+}
+
+
+def _period_label(start, end):
+    if start is None and end is None:
+        return "all time"
+    if start == end:
+        return start.isoformat()
+    return f"{start.isoformat() if start else 'start'} to {end.isoformat()}"
+
+
+def _top_lines(title, items, money=True):
+    if not items:
+        return []
+    return [title] + [f"• {name}: ₹{value:.2f}" if money else f"• {name}: {value:g}" for name, value in items]
+
+
+def format_report(intent, r):
+    label = _period_label(r["start"], r["end"])
+    if intent == "sales_report":
+        lines = [
+            f"📈 Sales ({label})",
+            f"• Entries: {r['count']}  • Items: {r['quantity']:g}",
+            f"• Revenue: ₹{r['revenue']:.2f}",
+            f"• Profit: ₹{r['profit']:.2f}",
+        ]
+        lines += _top_lines("🔥 Top products (qty):", r["top_products"], money=False)
+        lines += _top_lines("👥 Top customers:", r["top_customers"])
+    elif intent == "purchase_report":
+        lines = [
+            f"📦 Purchases ({label})",
+            f"• Entries: {r['count']}  • Items: {r['quantity']:g}",
+            f"• Spent: ₹{r['spent']:.2f}",
+        ]
+        lines += _top_lines("🛒 Top products:", r["top_products"])
+        lines += _top_lines("🏭 Top suppliers:", r["top_suppliers"])
+    else:
+        lines = [
+            f"💰 Profit ({label})",
+            f"• Revenue: ₹{r['revenue']:.2f}",
+            f"• Profit: ₹{r['profit']:.2f} ({r['margin']:.1f}% margin)",
+            f"• Purchases: ₹{r['spent']:.2f}",
+        ]
+        lines += _top_lines("🔥 Most profitable:", r["top_products"])
+    return "\n".join(lines)
+
 # -----------------------------
 # AI routing (text messages)
 # -----------------------------
+@metrics.track_update("handle_message")
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_text = update.message.text or ""
     user_id = update.effective_user.id
 
     # ---- load last few messages from Memory sheet ----
-    mem_records = gs.get_memory(user_id, limit=6)
+    mem_records = await asyncio.to_thread(gs.get_memory, user_id, limit=6)
     memory_text = ""
     if mem_records:
         memory_text = "\n".join(f"{m.get('Role')}: {m.get('Text')}" for m in mem_records)
 
     # ---- call AI with memory ----
-    ai_raw = ask_ai_agent(user_text, memory_text)
+    ai_raw = await asyncio.to_thread(ask_ai_agent, user_text, memory_text)
     ai = parse_ai_response(ai_raw)
 
     logging.info("AI RAW: %s", ai_raw)
     logging.info("AI PARSED: %s", ai)
 
     intent = ai.get("intent")
+    metrics.set_intent(intent)
+    intent_classifier.log_example(user_text, intent)  # training data for the prompt-family classifier
     data = ai.get("data", {})
     reply_message = ai.get("reply", "")
 
     # ---------- CUSTOMER ----------
     if intent == "add_customer":
-        gs.add_customer(
+        await asyncio.to_thread(gs.add_customer,
             data.get("Name") or data.get("name"),
             data.get("Email") or data.get("email", ""),
             data.get("Phone") or data.get("phone", ""),
@@ -236,24 +470,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await reply_with_memory(update, user_id, user_text, reply_message)
 
     if intent == "get_customers":
-        customers = gs.get_customers()
-        if not customers:
-            reply_message = "No customers found."
-            return await reply_with_memory(update, user_id, user_text, reply_message)
-
-        result = ""
-        for c in customers:
-            name = c.get("Name") or c.get("name") or ""
-            email = c.get("Email") or c.get("email") or ""
-            phone = c.get("Phone") or c.get("phone") or ""
-            company = c.get("Company") or c.get("company") or ""
-            result += f"{name} - {phone} - {email} - {company}\n"
-
-        return await reply_with_memory(update, user_id, user_text, result)
+        result, markup = await asyncio.to_thread(render_page, "customers")
+        return await reply_with_memory(update, user_id, user_text, result, markup)
 
     # ---------- TASK ----------
     if intent == "add_task":
-        gs.add_task(
+        await asyncio.to_thread(gs.add_task,
             data.get("Task Name") or data.get("task_name") or data.get("task"),
             data.get("Assigned To") or data.get("assigned_to") or "self",
             data.get("Status") or data.get("status") or "pending"
@@ -262,19 +484,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await reply_with_memory(update, user_id, user_text, reply_message)
 
     if intent == "get_tasks":
-        tasks = gs.get_tasks()
-        if not tasks:
-            reply_message = "No tasks found."
-            return await reply_with_memory(update, user_id, user_text, reply_message)
-
-        result = ""
-        for t in tasks:
-            task_name = t.get("Task Name") or t.get("task_name") or t.get("Task") or ""
-            assigned = t.get("Assigned To") or t.get("assigned_to") or ""
-            status = t.get("Status") or t.get("status") or ""
-            result += f"{task_name} | {assigned} | {status}\n"
-
-        return await reply_with_memory(update, user_id, user_text, result)
+        result, markup = await asyncio.to_thread(render_page, "tasks")
+        return await reply_with_memory(update, user_id, user_text, result, markup)
 
     # ---------- INVENTORY ----------
     if intent == "add_inventory":
@@ -293,7 +504,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             data.get("rate") or data.get("cost")
         )
 
-        gs.add_inventory(product, quantity, price)
+        await asyncio.to_thread(gs.add_inventory, product, quantity, price)
         reply_message = reply_message or "Inventory added."
         return await reply_with_memory(update, user_id, user_text, reply_message)
 
@@ -313,27 +524,16 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             data.get("rate") or data.get("cost")
         )
 
-        gs.update_inventory(product, quantity, price)
+        await asyncio.to_thread(gs.update_inventory, product, quantity, price)
         reply_message = reply_message or "Inventory updated."
         return await reply_with_memory(update, user_id, user_text, reply_message)
 
     if intent == "get_inventory":
-        items = gs.get_inventory()
-        if not items:
-            reply_message = "Inventory is empty."
-            return await reply_with_memory(update, user_id, user_text, reply_message)
-
-        result = ""
-        for i in items:
-            product = i.get("Product") or ""
-            qty = i.get("Quantity") or ""
-            price = i.get("Price") or ""
-            result += f"{product} — {qty} pcs — ₹{price}\n"
-
-        return await reply_with_memory(update, user_id, user_text, result)
+        result, markup = await asyncio.to_thread(render_page, "inventory")
+        return await reply_with_memory(update, user_id, user_text, result, markup)
 
     if intent == "low_stock_check":
-        low = gs.low_stock_items()
+        low = await asyncio.to_thread(gs.low_stock_items)
         if not low:
             reply_message = "All stock levels are OK 👍"
             return await reply_with_memory(update, user_id, user_text, reply_message)
@@ -341,56 +541,63 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         result = "⚠️ Low Stock:\n"
         for i in low:
             product = i.get("Product") or ""
-            qty = i.get("Quantity") or ""
-            result += f"{product}: {qty} pcs left\n"
+            qty = i.get("Quantity") or 0
+            result += f"{product}: {qty:g} pcs left\n"
 
         return await reply_with_memory(update, user_id, user_text, result)
     
 
+    # ---------- ENTRY CHECKS ----------
+    # every field is checked before the first stock write, so a half-read
+    # entry never changes stock without its Purchase/Sales row
+    if intent in ("purchase_entry", "sales_entry", "mixed_transaction"):
+        missing = _missing_entries(intent, data)
+        if missing:
+            return await update.message.reply_text(
+                "⚠️ I need " + ", ".join(field.replace("_", " ") for field in missing) + " to record this. "
+                "Please send it again with quantity and price, e.g. \"10 chawal aaye 40 ke\"."
+            )
+
     # ---------- PURCHASE ENTRY ----------
     if intent == "purchase_entry":
         supplier = data.get("supplier") or "Unknown Supplier"
-        product = data.get("product")
+        product = await asyncio.to_thread(gs.resolve_product, data.get("product"))
         qty = data.get("quantity")
         price = data.get("price_each")
 
         # Increase stock
-        gs.increase_stock(product, qty, price)
+        await asyncio.to_thread(gs.increase_stock, product, qty, price)
 
         # Add purchase record
-        pid, total = gs.add_purchase(supplier, product, qty, price)
+        pid, total = await asyncio.to_thread(gs.add_purchase, supplier, product, qty, price)
 
         reply = reply_message or f"✔ Purchased {qty} {product} from {supplier}. Total ₹{total}."
 
-        gs.add_memory(user_id, "user", user_text)
-        gs.add_memory(user_id, "assistant", reply)
+        await asyncio.to_thread(gs.add_memory, user_id, "user", user_text)
+        await asyncio.to_thread(gs.add_memory, user_id, "assistant", reply)
         return await update.message.reply_text(reply)
     
-    suggest = generate_suggestions()
-    await update.message.reply_text("🔎 Suggestions:\n" + suggest)
     
     # ---------- SALES ENTRY ----------
     if intent == "sales_entry":
         customer = data.get("customer") or "Walk-in Customer"
-        product = data.get("product")
+        product = await asyncio.to_thread(gs.resolve_product, data.get("product"))
         qty = data.get("quantity")
         selling_price = data.get("selling_price")
 
-        purchase_price = gs.get_purchase_price(product)
+        purchase_price = await asyncio.to_thread(gs.get_purchase_price, product)
 
         # Decrease stock
-        gs.decrease_stock(product, qty)
+        await asyncio.to_thread(gs.decrease_stock, product, qty)
 
         # Add sale record
-        sid, total, profit = gs.add_sale(customer, product, qty, selling_price, purchase_price)
+        sid, total, profit = await asyncio.to_thread(gs.add_sale, customer, product, qty, selling_price, purchase_price)
 
         reply = reply_message or f"✔ Sold {qty} {product} to {customer}. Profit ₹{profit}."
 
-        gs.add_memory(user_id, "user", user_text)
-        gs.add_memory(user_id, "assistant", reply)
+        await asyncio.to_thread(gs.add_memory, user_id, "user", user_text)
+        await asyncio.to_thread(gs.add_memory, user_id, "assistant", reply)
         return await update.message.reply_text(reply)
-    suggest = generate_suggestions()
-    await update.message.reply_text("🔎 Suggestions:\n" + suggest)
     
     # ---------- MIXED TRANSACTION ----------
     if intent == "mixed_transaction":
@@ -401,38 +608,36 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Purchases
         for p in purchases:
             supplier = p.get("supplier") or "Unknown Supplier"
-            product = p.get("product")
+            product = await asyncio.to_thread(gs.resolve_product, p.get("product"))
             qty = p.get("quantity")
             price = p.get("price_each")
 
-            gs.increase_stock(product, qty, price)
-            pid, total = gs.add_purchase(supplier, product, qty, price)
+            await asyncio.to_thread(gs.increase_stock, product, qty, price)
+            pid, total = await asyncio.to_thread(gs.add_purchase, supplier, product, qty, price)
             reply_lines.append(f"✔ Purchased {qty} {product} (₹{total}).")
 
         # Sales
         for s in sales:
             customer = s.get("customer") or "Walk-in Customer"
-            product = s.get("product")
+            product = await asyncio.to_thread(gs.resolve_product, s.get("product"))
             qty = s.get("quantity")
             selling_price = s.get("selling_price")
 
-            purchase_price = gs.get_purchase_price(product)
+            purchase_price = await asyncio.to_thread(gs.get_purchase_price, product)
 
-            gs.decrease_stock(product, qty)
-            sid, total, profit = gs.add_sale(customer, product, qty, selling_price, purchase_price)
+            await asyncio.to_thread(gs.decrease_stock, product, qty)
+            sid, total, profit = await asyncio.to_thread(gs.add_sale, customer, product, qty, selling_price, purchase_price)
             reply_lines.append(f"✔ Sold {qty} {product}. Profit ₹{profit}.")
 
         final_reply = "\n".join(reply_lines)
 
-        gs.add_memory(user_id, "user", user_text)
-        gs.add_memory(user_id, "assistant", final_reply)
+        await asyncio.to_thread(gs.add_memory, user_id, "user", user_text)
+        await asyncio.to_thread(gs.add_memory, user_id, "assistant", final_reply)
         return await update.message.reply_text(final_reply)
-    suggest = generate_suggestions()
-    await update.message.reply_text("🔎 Suggestions:\n" + suggest)
 
     # ---------- FINANCE ----------
     if intent == "add_finance":
-        gs.add_finance(
+        await asyncio.to_thread(gs.add_finance,
             data.get("Customer") or data.get("customer"),
             data.get("Amount") or data.get("amount"),
             data.get("Type") or data.get("type"),
@@ -443,20 +648,8 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await reply_with_memory(update, user_id, user_text, reply_message)
 
     if intent == "get_finance":
-        finance = gs.get_finance()
-        if not finance:
-            reply_message = "No finance records found."
-            return await reply_with_memory(update, user_id, user_text, reply_message)
-
-        result = ""
-        for f in finance:
-            customer = f.get("Customer") or ""
-            amount = f.get("Amount") or ""
-            ftype = f.get("Type") or ""
-            date = f.get("Date") or ""
-            result += f"{customer} - ₹{amount} - {ftype} - {date}\n"
-
-        return await reply_with_memory(update, user_id, user_text, result)
+        result, markup = await asyncio.to_thread(render_page, "finance")
+        return await reply_with_memory(update, user_id, user_text, result, markup)
     
     # ---------- BILLING / INVOICE ----------
     if intent == "create_invoice":
@@ -497,7 +690,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         grand_total = subtotal + tax_amount - discount
         due = grand_total - paid
 
-        invoice_id = gs.add_invoice(
+        invoice_id = await asyncio.to_thread(gs.add_invoice,
             customer=customer,
             items=normalized_items,
             subtotal=subtotal,
@@ -509,18 +702,19 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
         pdf_path = f"invoice_{invoice_id}.pdf"
-        generate_invoice_pdf(
-            invoice_id, customer, normalized_items,
-            subtotal, tax_rate, tax_amount,
-            discount, grand_total, paid, due,
-            pdf_path
-        )
+        with metrics.stage("pdf"):
+            await asyncio.to_thread(generate_invoice_pdf,
+                invoice_id, customer, normalized_items,
+                subtotal, tax_rate, tax_amount,
+                discount, grand_total, paid, due,
+                pdf_path
+            )
 
         summary = reply_message or f"Invoice {invoice_id} created for {customer} (₹{grand_total:.2f})."
 
         # save memory
-        gs.add_memory(user_id, "user", user_text)
-        gs.add_memory(user_id, "assistant", summary)
+        await asyncio.to_thread(gs.add_memory, user_id, "user", user_text)
+        await asyncio.to_thread(gs.add_memory, user_id, "assistant", summary)
 
         # send text + PDF
         await update.message.reply_text(summary)
@@ -531,24 +725,22 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if intent == "get_customer_profile":
         customer = data.get("customer")
-        ws = gs._crm_ws()
-        records = ws.get_all_records()
-
-        for r in records:
-            if r["Customer"].lower() == customer.lower():
-                reply = (
-                    f"📇 Customer Profile\n"
-                    f"Name: {r['Customer']}\n"
-                    f"Phone: {r['Phone']}\n"
-                    f"Email: {r['Email']}\n"
-                    f"Last Visit: {r['LastVisit']}\n"
-                    f"Total Purchases: {r['TotalPurchases']}\n"
-                    f"Total Spent: ₹{r['TotalSpent']}\n"
-                    f"Total Profit: ₹{r['TotalProfit']}\n"
-                    f"Notes: {r['Notes']}\n"
-                    f"Tags: {r['Tags']}\n"
-                )
-                return await update.message.reply_text(reply)
+        r = await asyncio.to_thread(gs.get_customer_profile, customer)
+
+        if r:
+            reply = (
+                f"📇 Customer Profile\n"
+                f"Name: {r['Customer']}\n"
+                f"Phone: {r['Phone']}\n"
+                f"Email: {r['Email']}\n"
+                f"Last Visit: {r['LastVisit']}\n"
+                f"Total Purchases: {r['TotalPurchases']}\n"
+                f"Total Spent: ₹{r['TotalSpent']}\n"
+                f"Total Profit: ₹{r['TotalProfit']}\n"
+                f"Notes: {r['Notes']}\n"
+                f"Tags: {r['Tags']}\n"
+            )
+            return await update.message.reply_text(reply)
 
         return await update.message.reply_text("Customer not found.")
     
@@ -558,7 +750,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         problem = data.get("problem")
         tech = data.get("technician") or ""
 
-        sid = gs.add_service(customer, device, problem, "Pending", 0, tech, "")
+        sid = await asyncio.to_thread(gs.add_service, customer, device, problem, "Pending", 0, tech, "")
 
         reply = f"🛠 Service Job Created\nID: {sid}\nCustomer: {customer}\nDevice: {device}\nProblem: {problem}"
 
@@ -567,42 +759,75 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if intent == "get_service_status":
         job_id = data.get("service_id")
-        ws = gs._service_ws()
-        records = ws.get_all_records()
-
-        for r in records:
-            if r["ServiceID"] == job_id:
-                reply = (
-                    f"📝 Service Status\n"
-                    f"ID: {job_id}\n"
-                    f"Customer: {r['Customer']}\n"
-                    f"Device: {r['Device']}\n"
-                    f"Problem: {r['Problem']}\n"
-                    f"Status: {r['Status']}\n"
-                    f"Technician: {r['Technician']}\n"
-                    f"Cost: ₹{r['Cost']}\n"
-                )
-                return await update.message.reply_text(reply)
+        r = await asyncio.to_thread(gs.get_service, job_id)
+
+        if r:
+            reply = (
+                f"📝 Service Status\n"
+                f"ID: {job_id}\n"
+                f"Customer: {r['Customer']}\n"
+                f"Device: {r['Device']}\n"
+                f"Problem: {r['Problem']}\n"
+                f"Status: {r['Status']}\n"
+                f"Technician: {r['Technician']}\n"
+                f"Cost: ₹{r['Cost']}\n"
+            )
+            return await update.message.reply_text(reply)
 
         return await update.message.reply_text("No such job found.")
+
+    if intent == "update_service":
+        job_id = data.get("service_id")
+        r = await asyncio.to_thread(gs.update_service,
+            job_id,
+            status=data.get("status"),
+            cost=data.get("cost"),
+            technician=data.get("technician"),
+            notes=data.get("notes"),
+        )
+        if not r:
+            return await update.message.reply_text("No such job found.")
+
+        reply = reply_message or f"🛠 {job_id}: {r['Status']}"
+        return await update.message.reply_text(reply)
+
+    if intent == "list_services":
+        jobs = await asyncio.to_thread(gs.list_services,
+            status=data.get("status"),
+            technician=data.get("technician"),
+            customer=data.get("customer"),
+        )
+        if not jobs:
+            return await update.message.reply_text("No matching jobs.")
+
+        return await update.message.reply_text(_service_list(jobs))
     # ---------- REPORT ----------
-    if intent == "weekly_report":
-        report = generate_weekly_report()
+    if intent in REPORTS:
+        start, end = analytics.period_range(data.get("period"), data.get("start"), data.get("end"))
+        report = format_report(intent, await asyncio.to_thread(REPORTS[intent], start, end))
         return await reply_with_memory(update, user_id, user_text, report)
 
+    if intent in ("daily_report", "weekly_report"):
+        kind = intent.split("_")[0]
+        if data.get("refresh"):
+            await refresh_report(kind)
+        report, markup = await asyncio.to_thread(render_report, kind)
+        return await reply_with_memory(update, user_id, user_text, report, reply_markup=markup)
+
     # ---------- GENERAL CHAT / FALLBACK ----------
     if ai.get("voice_reply", False):
         lang = detect_language(reply_message)
-        mp3 = "reply_text.mp3"
-        tts = gTTS(text=reply_message, lang=lang)
-        tts.save(mp3)
-        with open(mp3, "rb") as f:
-            await update.message.reply_audio(f)
+        # one file per reply: concurrent replies must not overwrite each other's audio
+        with tempfile.TemporaryDirectory() as tmpdir:
+            mp3 = os.path.join(tmpdir, "reply.mp3")
+            await media_pool.pool.run(synthesize, reply_message, lang, mp3)
+            with open(mp3, "rb") as f:
+                await update.message.reply_audio(f)
             
 
     if intent == "suggestions":
-       reply = generate_suggestions()
-    return await update.message.reply_text("🔍 Business Insights:\n" + reply)
+        reply = await asyncio.to_thread(generate_suggestions)
+        return await update.message.reply_text("🔍 Business Insights:\n" + reply)
 
     # store memory even for general chat
     return await reply_with_memory(update, user_id, user_text, reply_message or "Okay.")
@@ -610,11 +835,35 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # -----------------------------
 # VOICE HANDLER (final)
 # -----------------------------
+def synthesize(text, lang, path):
+    """gTTS to an mp3 file; blocking, run it on the media pool."""
+    with metrics.stage("tts"), tracing.span("tts", "gtts"):
+        from gtts import gTTS
+        tts = gTTS(text=text, lang=lang)
+        tts.save(path)
+
+
+@metrics.track_update("voice_handler")
 async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     voice = update.message.voice
     if not voice:
         return
 
+    # conversion, STT and TTS run on the media pool so text updates are not held up
+    metrics.set_intent("voice_note")
+    outcome = media_pool.pool.submit(update.effective_chat.id, process_voice, update, context)
+    if outcome == media_pool.QUEUED:
+        ahead = max(media_pool.pool.pending() - media_pool.pool.workers - 1, 0)
+        await update.message.reply_text(f"⏳ Processing your voice note ({ahead} ahead of it)...")
+    elif outcome == media_pool.BUSY:
+        await update.message.reply_text("⏳ Still working on your previous voice notes. Please send this one again in a moment.")
+    elif outcome == media_pool.FULL:
+        await update.message.reply_text("⏳ Lots of voice notes right now. Please try again in a minute, or type your message.")
+
+
+@metrics.track_update("voice_note")
+async def process_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    voice = update.message.voice
     with tempfile.TemporaryDirectory() as tmpdir:
         ogg_path = os.path.join(tmpdir, "voice.ogg")
         wav_path = os.path.join(tmpdir, "voice.wav")
@@ -623,33 +872,23 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         file = await voice.get_file()
         await file.download_to_drive(ogg_path)
 
-        ffmpeg_path = r"C:\ffmpeg\bin\ffmpeg.exe"  # adjust if different
-
         try:
-            subprocess.run([ffmpeg_path, "-y", "-i", ogg_path, wav_path], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            with metrics.stage("ffmpeg"):
+                # trimmed, mono, 16 kHz: smaller STT uploads, faster recognition
+                speech_seconds = await media_pool.pool.run(audio.prepare_for_stt, ogg_path, wav_path)
         except Exception as e:
             logging.error("FFmpeg conversion error: %s", e)
             return await update.message.reply_text("⚠️ Audio conversion failed.")
+        if not speech_seconds:
+            return await update.message.reply_text("⚠️ I couldn't understand your voice. Please try again.")
 
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(wav_path) as source:
-            audio_data = recognizer.record(source)
-
-        # multi-language recognition
-        def recognize_multilang():
-            results = []
-            for lang in ["hi-IN", "en-IN"]:
-                try:
-                    txt = recognizer.recognize_google(audio_data, language=lang)
-                    results.append((txt, len(txt), lang))
-                except:
-                    pass
-            if not results:
-                return "", "en-IN"
-            best = max(results, key=lambda x: x[1])
-            return best[0], best[2]
-
-        text, detected_lang = recognize_multilang()
+        # multi-language recognition (Google or the local engine, see stt.py)
+        try:
+            with metrics.stage("stt"):
+                text, detected_lang = await media_pool.pool.run(stt.transcribe, wav_path)
+        except stt.STTUnavailable as e:
+            logging.error("STT unavailable: %s", e)
+            return await update.message.reply_text("⚠️ Speech recognition is unavailable right now. Please type your message.")
         if not text:
             return await update.message.reply_text("⚠️ I couldn't understand your voice. Please try again.")
 
@@ -657,37 +896,163 @@ async def voice_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         user_id = update.effective_user.id
 
-        ai_raw = ask_ai_agent(text, "")
+        ai_raw = await asyncio.to_thread(ask_ai_agent, text, "")
         ai = parse_ai_response(ai_raw)
+        metrics.set_intent(ai.get("intent"))
         reply_message = ai.get("reply", "ठीक है।")
 
 # save memory for voice conversation
-        gs.add_memory(user_id, "user", text)
-        gs.add_memory(user_id, "assistant", reply_message)
+        await asyncio.to_thread(gs.add_memory, user_id, "user", text)
+        await asyncio.to_thread(gs.add_memory, user_id, "assistant", reply_message)
 
         await update.message.reply_text(reply_message)
 
         # voice reply if requested
         if ai.get("voice_reply", False):
             lang_code = "hi" if detected_lang.startswith("hi") else "en"
-            tts = gTTS(text=reply_message, lang=lang_code)
-            tts.save(mp3_path)
+            await media_pool.pool.run(synthesize, reply_message, lang_code, mp3_path)
             with open(mp3_path, "rb") as audio_file:
                 await update.message.reply_audio(audio=audio_file)
 
 # -----------------------------
 # Run the bot
 # -----------------------------
-def main():
+async def error_handler(update, context: ContextTypes.DEFAULT_TYPE):
+    if not isinstance(context.error, gs.SheetsUnavailable):
+        logging.error("Update handling failed", exc_info=context.error)
+        return
+    # degraded mode had no cached copy of what this request needed
+    logging.warning("Sheets unavailable: %s", context.error)
+    message = getattr(update, "effective_message", None)
+    if message is not None:
+        await message.reply_text("⚠️ Google Sheets is unreachable right now. Sales and stock entries still "
+                                 "work and will sync automatically; please try this again in a few minutes.")
+
+def build_application():
     app = Application.builder().token(TELEGRAM_TOKEN).build()
+    app.add_error_handler(error_handler)
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("menu", menu))
+    app.add_handler(CallbackQueryHandler(page_handler, pattern=r"^page:"))
+    app.add_handler(CallbackQueryHandler(report_handler, pattern=r"^report:"))
 
     # voice must come before text handler
     app.add_handler(MessageHandler(filters.VOICE, voice_handler))
 
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, menu_handler))
+    return app
+
+def warm_up():
+    # create/check all worksheets and build lookup indexes once so no request pays for it
+    try:
+        gs.bootstrap()
+        gs.warm_caches()
+        analytics.warm()
+        weekly_report.refresh_reports()
+    except Exception as e:
+        logging.error("Sheets bootstrap failed, will retry on first use: %s", e)
+    stt.warm()
+
+def start_warm_up():
+    # warm-up reads every tab; run it beside polling instead of before it.
+    # Requests that arrive first bootstrap on use and reports say they are being prepared.
+    def run():
+        started = time.perf_counter()
+        warm_up()
+        logging.info("Warm-up took %.0f ms", (time.perf_counter() - started) * 1000)
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+async def compact_memory_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await asyncio.to_thread(gs.compact_memory)
+    except Exception as e:
+        logging.error("Memory compaction failed: %s", e)
+
+async def refresh_reports_job(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await asyncio.to_thread(weekly_report.refresh_reports)
+    except Exception as e:
+        logging.error("Report refresh failed: %s", e)
+
+async def stock_alerts_job(context: ContextTypes.DEFAULT_TYPE):
+    due = stock_alerts.watcher.due_alerts()
+    if due:
+        try:
+            await context.bot.send_message(chat_id=stock_alerts.OWNER_CHAT_ID, text=stock_alerts.format_alert(due))
+        except Exception as e:
+            logging.error("Low stock alert failed: %s", e)
+
+def schedule_local_jobs(app):
+    # every process that answers users keeps its own reports and stock levels
+    if app.job_queue is None:
+        logging.warning("No JobQueue; reports are only rebuilt on explicit refresh and stock alerts are off")
+        return
+    # the first reports come from the warm-up
+    interval = REPORTS_REFRESH_MINUTES * 60
+    app.job_queue.run_repeating(refresh_reports_job, interval=interval, first=interval, name="refresh_reports")
+    if stock_alerts.OWNER_CHAT_ID:
+        app.job_queue.run_repeating(stock_alerts_job, interval=max(stock_alerts.STOCK_ALERT_DELAY, 1),
+                                    name="stock_alerts")
+
+def schedule_jobs(app):
+    if not RUN_JOBS:
+        return
+    if app.job_queue is None:
+        logging.warning("No JobQueue (pip install \"python-telegram-bot[job-queue]\"); background jobs disabled")
+        return
+    app.job_queue.run_repeating(compact_memory_job, interval=MEMORY_COMPACT_HOURS * 3600, first=300,
+                                name="compact_memory")
+
+def is_ready(app):
+    return app.running and app.updater is not None and app.updater.running
+
+def main():
+    supervisor = None
+    if BOT_WORKERS > 0:
+        import workers
+        app = workers.build_intake_application(TELEGRAM_TOKEN, BOT_WORKERS)
+        supervisor = workers.Supervisor(BOT_WORKERS)
+        supervisor.start()
+        ready = lambda: is_ready(app) and supervisor.alive() > 0
+    else:
+        app = build_application()
+        ready = lambda: is_ready(app)
+
+    status_server.add_health_routes(ready)
+    metrics.add_metrics_route()
+    status_server.start(STATUS_HOST, STATUS_PORT)
+    if supervisor is None:
+        start_warm_up()
+        schedule_local_jobs(app)
+    schedule_jobs(app)
+    logging.info("Startup took %.0f ms", (time.perf_counter() - _IMPORT_STARTED) * 1000)
+
+    try:
+        run_application(app)
+    finally:
+        if supervisor:
+            supervisor.stop()
+
+def run_application(app):
+    if BOT_MODE == "webhook":
+        if WEBHOOK_REGISTER and not WEBHOOK_URL:
+            raise SystemExit("WEBHOOK_URL is required when WEBHOOK_REGISTER=1")
+        print(f"Bot Running (webhook) on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_PATH}...")
+        if not WEBHOOK_REGISTER:
+            # run_webhook would call setWebhook with a URL built from listen/port
+            import webhook_receiver
+            asyncio.run(webhook_receiver.serve(app, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET))
+            return
+        app.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET,
+            webhook_url=WEBHOOK_URL,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        return
 
     print("Bot Running with Multilingual Menu + Voice Enabled...")
     app.run_polling()
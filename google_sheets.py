@@ -1,143 +1,1080 @@
 # google_sheets.py
 import os
+import re
+import gzip
 import json
+import time
+import heapq
+import random
+import logging
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from dotenv import load_dotenv
-import gspread
 from datetime import datetime
 
+import metrics
+import tracing
+import product_index
+import stock_alerts
+
 load_dotenv()
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID")
 
-gc = gspread.service_account(filename="service_account.json")
+# Google allows 60 requests/minute/user by default; raise if your quota is higher
+SHEETS_REQUESTS_PER_MINUTE = int(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60"))
+SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+SHEETS_BACKOFF_BASE = float(os.getenv("SHEETS_BACKOFF_BASE", "1"))
+SHEETS_BACKOFF_CAP = float(os.getenv("SHEETS_BACKOFF_CAP", "32"))
+# how stale a row index may be before a miss re-reads its sheet
+# (other worker processes may have appended the row meanwhile)
+SHEETS_INDEX_TTL = float(os.getenv("SHEETS_INDEX_TTL", "60"))
+# Memory retention: rows kept per user in the Memory sheet; older rows go to
+# gzip JSON lines under MEMORY_ARCHIVE_DIR ("file") or Memory_Archive_YYYY_MM
+# worksheets ("sheet")
+MEMORY_KEEP_PER_USER = int(os.getenv("MEMORY_KEEP_PER_USER", "50"))
+MEMORY_ARCHIVE = os.getenv("MEMORY_ARCHIVE", "file").lower()
+MEMORY_ARCHIVE_DIR = os.getenv("MEMORY_ARCHIVE_DIR", "memory_archive")
+# SHEETS_PARTITIONS=1: Sales and Purchase rows go to monthly tabs (Sales_2026_10, ...)
+SHEETS_PARTITIONS = os.getenv("SHEETS_PARTITIONS", "0") == "1"
+# Degraded mode: after SHEETS_BREAKER_FAILURES failed calls in a row (timeouts,
+# connection errors, 5xx) the circuit opens for SHEETS_BREAKER_COOLDOWN
+# seconds. Reads are then served from snapshots of earlier reads and writes
+# go to the SHEETS_JOURNAL file, replayed in order once a call succeeds.
+SHEETS_TIMEOUT = float(os.getenv("SHEETS_TIMEOUT", "10"))
+SHEETS_BREAKER_FAILURES = int(os.getenv("SHEETS_BREAKER_FAILURES", "3"))
+SHEETS_BREAKER_COOLDOWN = float(os.getenv("SHEETS_BREAKER_COOLDOWN", "30"))
+SHEETS_SNAPSHOT_ENTRIES = int(os.getenv("SHEETS_SNAPSHOT_ENTRIES", "512"))
+SHEETS_JOURNAL = os.getenv("SHEETS_JOURNAL", "sheets_journal.jsonl")
+
+gc = None
+
+
+def set_client(client):
+    """Use this gspread client instead of the service account (benchmarks inject a fake)."""
+    global gc, _sheet
+    gc = client
+    # cached handles belong to the previous client
+    _sheet = None
+    for index in _row_indexes():
+        index.reset()
+    stock_alerts.watcher.reset()
+    _worksheets.clear()
+    _columns.clear()
+    _end_marks.clear()
+    _snapshots.clear()
+
+
+def _gspread():
+    # gspread pulls in google-auth and requests; load it with the first Sheets call
+    import gspread
+    return gspread
+
+
+def _client():
+    global gc
+    if gc is None:
+        gc = _gspread().service_account(filename="service_account.json")
+        # fail fast instead of hanging a handler when Google is slow
+        gc.set_timeout(SHEETS_TIMEOUT)
+    return gc
+
+# ---------- REQUEST SCHEDULER ----------
+# Every Sheets API call goes through _read()/_write() so the whole process
+# shares one token bucket. Lower number = served first.
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+PRIORITY_ANALYTICS = 2
+
+_local = threading.local()
+
+
+class _Pending:
+    """Result slot shared by duplicate reads waiting on one request."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+    def wait(self):
+        self.event.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class _Scheduler:
+    """Token bucket sized to the per-minute quota, served in priority order."""
+
+    def __init__(self, per_minute):
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.cond = threading.Condition()
+        self.waiting = []  # heap of (priority, seq) tickets
+        self.seq = itertools.count()
+        self.inflight = {}  # read key -> _Pending
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, priority):
+        ticket = (priority, next(self.seq))
+        with self.cond:
+            heapq.heappush(self.waiting, ticket)
+            while True:
+                self._refill()
+                if self.waiting[0] == ticket:
+                    if self.tokens >= 1:
+                        heapq.heappop(self.waiting)
+                        self.tokens -= 1
+                        self.cond.notify_all()
+                        return
+                    self.cond.wait((1 - self.tokens) / self.rate)
+                else:
+                    self.cond.wait()
+
+    def drain(self):
+        """Quota exhausted server-side: make everyone wait for a refill."""
+        with self.cond:
+            self.tokens = 0.0
+            self.updated = time.monotonic()
+
+    def run(self, fn, args, kwargs, priority, key=None):
+        if key is None:
+            return self._execute(fn, args, kwargs, priority)
+
+        with self.cond:
+            pending = self.inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self.inflight[key] = _Pending()
+        if not owner:
+            return pending.wait()
+
+        try:
+            pending.result = self._execute(fn, args, kwargs, priority)
+            return pending.result
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self.cond:
+                self.inflight.pop(key, None)
+            pending.event.set()
+
+    def _execute(self, fn, args, kwargs, priority):
+        for attempt in itertools.count():
+            self.acquire(priority)
+            name = getattr(fn, "__name__", "call")
+            metrics.count_sheets_call(name)
+            try:
+                with tracing.span("sheets", name):
+                    result = fn(*args, **kwargs)
+            except OSError as e:  # timeouts and connection errors (requests' exceptions are OSErrors)
+                _breaker.failure()
+                raise SheetsUnavailable(f"{name}: {e}") from e
+            except _gspread().exceptions.APIError as e:
+                status = _status_code(e)
+                if status != 429 and status < 500:
+                    _breaker.success()  # the API answered; the request was at fault
+                    raise
+                if status >= 500:
+                    _breaker.failure()
+                    if attempt >= SHEETS_MAX_RETRIES or _breaker.is_open():
+                        raise SheetsUnavailable(f"{name}: {e}") from e
+                elif attempt >= SHEETS_MAX_RETRIES:
+                    raise
+                if status == 429:
+                    self.drain()
+                delay = random.uniform(0, min(SHEETS_BACKOFF_CAP, SHEETS_BACKOFF_BASE * 2 ** attempt))
+                logging.warning("Sheets API %s on %s, retry %d in %.1fs",
+                                status, getattr(fn, "__name__", fn), attempt + 1, delay)
+                time.sleep(delay)
+            else:
+                if _breaker.success() or _journal.pending():
+                    _journal.start_replay()
+                return result
+
+
+def _status_code(error):
+    response = getattr(error, "response", None)
+    try:
+        return int(getattr(response, "status_code", 0) or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+_scheduler = _Scheduler(SHEETS_REQUESTS_PER_MINUTE)
+
+
+@contextmanager
+def analytics_priority():
+    """Run reads inside the block behind writes and interactive reads."""
+    previous = getattr(_local, "read_priority", PRIORITY_READ)
+    _local.read_priority = PRIORITY_ANALYTICS
+    try:
+        yield
+    finally:
+        _local.read_priority = previous
+
+
+def _analytics(fn):
+    def wrapper(*args, **kwargs):
+        with analytics_priority():
+            return fn(*args, **kwargs)
+    wrapper.__name__ = fn.__name__
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
+
+def _read(target, method, *args, **kwargs):
+    """
+    Scheduled read; identical reads already queued share one request. While
+    Sheets is unavailable the last result of the same read is returned.
+    """
+    key = (type(target).__name__, getattr(target, "id", None), method, repr(args), repr(kwargs))
+    if not _breaker.allow():
+        return _snapshots.get(key, target, method, args)
+    priority = getattr(_local, "read_priority", PRIORITY_READ)
+    try:
+        result = _scheduler.run(getattr(target, method), args, kwargs, priority, key)
+    except SheetsUnavailable:
+        return _snapshots.get(key, target, method, args)
+    if priority != PRIORITY_ANALYTICS:  # analytics keeps its own columnar copy
+        _snapshots.put(key, method, args, result)
+    return result
+
+
+def _write(target, method, *args, **kwargs):
+    """
+    Scheduled write. While Sheets is unavailable, or earlier writes are still
+    waiting in the journal, it is journaled instead (appends then return {}).
+    Spreadsheet-level changes (new tabs, header rows in bootstrap) cannot be
+    journaled and do not depend on journaled row writes, so they go straight
+    out, journal or not, and raise SheetsUnavailable while Sheets is down.
+    """
+    if not _is_worksheet(target):
+        if not _breaker.allow():
+            raise SheetsUnavailable(f"{method}: Sheets unavailable and spreadsheet changes cannot be journaled")
+        return _scheduler.run(getattr(target, method), args, kwargs, PRIORITY_WRITE)
+    if _journal.pending() or not _breaker.allow():
+        result = _journal.add(target, method, args, kwargs)
+    else:
+        try:
+            result = _scheduler.run(getattr(target, method), args, kwargs, PRIORITY_WRITE)
+        except SheetsUnavailable:
+            result = _journal.add(target, method, args, kwargs)
+    _snapshots.patch(target, method, args)
+    return result
+
+# ---------- DEGRADED MODE ----------
+class SheetsUnavailable(Exception):
+    """Sheets cannot be reached and there is no snapshot or journal to fall back on."""
+
+
+class _Breaker:
+    """
+    Circuit breaker: closed -> open after repeated failures. While open no
+    caller goes to Sheets; a background thread probes every cooldown and a
+    successful probe closes it, so no user request waits on a dead API.
+    """
+
+    def __init__(self, failures, cooldown, probe):
+        self.threshold = max(1, failures)
+        self.cooldown = cooldown
+        self.probe = probe
+        self.failures = 0
+        self.opened_at = None
+        self.prober = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self):
+        """May a call go to Sheets now?"""
+        return self.opened_at is None
+
+    def success(self):
+        """Record a call that reached Sheets. True if this closed an open circuit."""
+        with self.lock:
+            recovered = self.opened_at is not None
+            self.failures = 0
+            self.opened_at = None
+        if recovered:
+            logging.warning("Sheets API reachable again, leaving degraded mode")
+        return recovered
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.opened_at is None and self.failures < self.threshold:
+                return
+            if self.opened_at is None:
+                logging.error("Sheets API unavailable, serving snapshots and journaling writes")
+            self.opened_at = time.monotonic()  # a failed probe restarts the cooldown
+            if self.prober is None:
+                self.prober = threading.Thread(target=self._probe_loop, name="sheets-probe", daemon=True)
+                self.prober.start()
+
+    def _probe_loop(self):
+        try:
+            while True:
+                with self.lock:
+                    if self.opened_at is None:
+                        return
+                    wait = self.opened_at + self.cooldown - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                    continue
+                try:
+                    self.probe()  # success()/failure() are recorded by the scheduler
+                except Exception as e:
+                    logging.warning("Sheets probe failed: %s", e)
+                    with self.lock:
+                        if self.opened_at is not None:
+                            self.opened_at = time.monotonic()
+        finally:
+            with self.lock:
+                self.prober = None
+
+
+def _headers(title):
+    cols = _columns.get(title) or {}
+    return [name for name, _ in sorted(cols.items(), key=lambda item: item[1])] or _schema_headers(title)
+
+
+class _Snapshots:
+    """
+    Last result of recent reads. Whole-sheet get_all_records results are kept
+    per sheet and patched with our own writes, so single rows can be served
+    from them too; other reads are kept in a bounded LRU.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.tables = {}  # worksheet id -> (key, records)
+        self.recent = OrderedDict()  # read key -> (args, result)
+        self.lock = threading.Lock()
+
+    def clear(self):
+        with self.lock:
+            self.tables.clear()
+            self.recent.clear()
+
+    def put(self, key, method, args, result):
+        result = _copied(result)  # patch() edits the snapshot, never what the reader holds
+        with self.lock:
+            if method == "get_all_records" and not args:
+                self.tables[key[1]] = (key, result)
+                return
+            self.recent[key] = (args, result)
+            self.recent.move_to_end(key)
+            while len(self.recent) > self.size:
+                self.recent.popitem(last=False)
+
+    def get(self, key, target, method, args):
+        with self.lock:
+            table = self.tables.get(key[1])
+            if table is not None and table[0] == key:
+                return _copied(table[1])
+            if key in self.recent:
+                return _copied(self.recent[key][1])
+            if method == "row_values" and table is not None and 2 <= args[0] <= len(table[1]) + 1:
+                record = table[1][args[0] - 2]
+                return [record.get(h, "") for h in _headers(target.title)]
+        raise SheetsUnavailable(f"{method} on {getattr(target, 'title', target)}: no snapshot")
+
+    def patch(self, target, method, args):
+        """Apply one of our writes to the snapshots of that worksheet."""
+        if not _is_worksheet(target) or method not in ("update_cell", "append_row", "append_rows"):
+            return
+        title = target.title
+        headers = _headers(title)
+        with self.lock:
+            table = self.tables.get(getattr(target, "id", None))
+            records = table[1] if table is not None else None
+            if method == "update_cell":
+                row, col, value = args[:3]
+                if records is not None and 2 <= row <= len(records) + 1 and col <= len(headers):
+                    records[row - 2][headers[col - 1]] = value
+                for key, (read_args, values) in self.recent.items():
+                    if key[1] == target.id and key[2] == "row_values" and read_args[:1] == (row,):
+                        values.extend([""] * (col - len(values)))
+                        values[col - 1] = value
+            elif records is not None:
+                rows = [args[0]] if method == "append_row" else args[0]
+                for values in rows:
+                    records.append(dict(zip(headers, list(values) + [""] * (len(headers) - len(values)))))
+
+
+def _copied(result):
+    """Copy of a read result down to its rows (lists and dicts); other objects are shared."""
+    if isinstance(result, list):
+        return [_copied(item) if isinstance(item, (list, dict)) else item for item in result]
+    if isinstance(result, dict):
+        return {k: _copied(v) if isinstance(v, (list, dict)) else v for k, v in result.items()}
+    return result
+
+
+def _is_worksheet(target):
+    # spreadsheets have a title and id too, but no grid
+    return hasattr(target, "row_count") and hasattr(target, "title")
+
+
+class _Journal:
+    """
+    Writes made while Sheets was unavailable, one JSON object per line, in
+    order. Replay keeps the order within each sheet but sends a sheet's run
+    of appends as one append_rows and its run of cell updates as one
+    batch_update, even when writes to other sheets came in between.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = None  # loaded on first use
+        self.replaying = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        if self.entries is None:
+            self.entries = []
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    self.entries = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                pass
+            if self.entries:
+                logging.warning("%d journaled Sheets write(s) waiting in %s", len(self.entries), self.path)
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self.entries:
+                f.write(json.dumps(entry, default=str) + "\n")
+        os.replace(tmp, self.path)
+
+    def pending(self):
+        with self.lock:
+            self._load()
+            return bool(self.entries)
+
+    def add(self, target, method, args, kwargs):
+        if not _is_worksheet(target):
+            raise SheetsUnavailable(f"{method}: Sheets unavailable and spreadsheet changes cannot be journaled")
+        entry = {"sheet": target.title, "method": method, "args": list(args), "kwargs": kwargs,
+                 "at": datetime.utcnow().isoformat()}
+        with self.lock:
+            self._load()
+            self.entries.append(entry)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        metrics.count_sheets_call(f"journal_{method}")
+        # appends have no row number yet: {} makes row indexes rebuild
+        return {} if method.startswith("append") else None
+
+    def start_replay(self):
+        with self.lock:
+            self._load()
+            if self.replaying or not self.entries:
+                return
+            self.replaying = True
+        threading.Thread(target=self._replay, name="sheets-journal", daemon=True).start()
+
+    def _replay(self):
+        try:
+            while True:
+                with self.lock:
+                    if not self.entries:
+                        logging.warning("Sheets journal replayed")
+                        return
+                    picked = _next_group(self.entries)
+                    group = [self.entries[i] for i in picked]
+                try:
+                    _replay_group(group)
+                except SheetsUnavailable as e:
+                    logging.warning("Journal replay paused: %s", e)
+                    return
+                except Exception as e:
+                    # a write Sheets rejects would block everything behind it
+                    logging.error("Journaled %s on %s failed, moved to %s.failed: %s",
+                                  group[0]["method"], group[0]["sheet"], self.path, e)
+                    with open(self.path + ".failed", "a", encoding="utf-8") as f:
+                        for entry in group:
+                            f.write(json.dumps(entry, default=str) + "\n")
+                with self.lock:
+                    for i in reversed(picked):
+                        del self.entries[i]
+                    self._save()
+        finally:
+            with self.lock:
+                self.replaying = False
+
+
+def _next_group(entries):
+    """Indexes of the entries that replay as one request with the first one."""
+    first = entries[0]
+    if first["method"] not in ("append_row", "update_cell"):
+        return [0]
+    picked = [0]
+    for i in range(1, len(entries)):
+        entry = entries[i]
+        if entry["sheet"] != first["sheet"]:
+            continue  # other sheets are independent
+        if entry["method"] != first["method"] or entry["kwargs"] != first["kwargs"]:
+            break
+        picked.append(i)
+    return picked
+
+
+def _replay_group(group):
+    first = group[0]
+    method, kwargs = first["method"], first["kwargs"]
+    if method == "add_worksheet":
+        ws = _create_ws(first["sheet"], kwargs["header"], kwargs["rows"])
+        with _create_lock:
+            _worksheets[first["sheet"]] = ws
+        return
+    ws = _ws(first["sheet"])
+    if method == "append_row":
+        rows = [entry["args"][0] for entry in group]
+        _scheduler.run(ws.append_rows, (rows,), kwargs, PRIORITY_WRITE)
+    elif method == "update_cell":
+        data = [{"range": f"{_col_letter(e['args'][1])}{e['args'][0]}", "values": [[e["args"][2]]]} for e in group]
+        # update_cell parses values like typed input
+        _scheduler.run(ws.batch_update, (data,), {"value_input_option": "USER_ENTERED"}, PRIORITY_WRITE)
+    else:
+        _scheduler.run(getattr(ws, method), tuple(first["args"]), kwargs, PRIORITY_WRITE)
+
+
+def _probe():
+    # the cheapest call there is: spreadsheet metadata
+    _scheduler.run(_client().open_by_key, (SPREADSHEET_ID,), {}, PRIORITY_ANALYTICS)
+
+
+_breaker = _Breaker(SHEETS_BREAKER_FAILURES, SHEETS_BREAKER_COOLDOWN, _probe)
+_snapshots = _Snapshots(SHEETS_SNAPSHOT_ENTRIES)
+_journal = _Journal(SHEETS_JOURNAL)
+
+
+def use_quota_share(shares):
+    """
+    Spend only 1/shares of SHEETS_REQUESTS_PER_MINUTE: each of `shares`
+    worker processes has its own bucket, and together they must stay
+    within the one quota.
+    """
+    global _scheduler
+    _scheduler = _Scheduler(max(1, SHEETS_REQUESTS_PER_MINUTE // max(1, shares)))
+
+
+def use_journal(path):
+    """Journal to this file instead (each worker process needs its own)."""
+    global _journal
+    _journal = _Journal(path)
+    _journal.start_replay()
+
+
+# ---------- SCHEMA / BOOTSTRAP ----------
+# title -> (grid rows when created, header row)
+SHEET_SCHEMAS = {
+    "Customer": (1000, ["Name", "Email", "Phone", "Company", "CreatedAt"]),
+    "Task": (1000, ["Task Name", "Assigned To", "Status", "CreatedAt"]),
+    "Inventory": (1000, ["Product", "Quantity", "Price", "UpdatedAt"]),
+    "Finance": (1000, ["Customer", "Amount", "Type", "Date", "Notes"]),
+    "Report": (1000, ["Timestamp", "Report"]),
+    "Memory": (1000, ["UserID", "Timestamp", "Role", "Text"]),
+    "Invoice": (1000, [
+        "InvoiceID", "Date", "Customer", "ItemsJSON",
+        "Subtotal", "TaxRate", "Discount", "GrandTotal",
+        "Paid", "Due"
+    ]),
+    "Purchase": (1000, [
+        "PurchaseID", "Date", "Supplier", "Product",
+        "Quantity", "PriceEach", "Total", "Notes"
+    ]),
+    "Sales": (1000, [
+        "SaleID", "Date", "Customer", "Product",
+        "Quantity", "PriceEach", "Total", "Profit", "Notes"
+    ]),
+    "CRM": (2000, [
+        "Customer", "Phone", "Email", "LastVisit",
+        "TotalPurchases", "TotalSpent", "TotalProfit",
+        "Notes", "Tags"
+    ]),
+    "ServiceHistory": (2000, [
+        "ServiceID", "Date", "Customer", "Device",
+        "Problem", "Status", "Cost", "Technician", "Notes"
+    ]),
+}
+
+_sheet = None
+_worksheets = {}  # title -> Worksheet, filled by bootstrap()
+_columns = {}  # title -> {header: 1-based column}
+_catalog_listed = 0.0  # monotonic time _worksheets was last listed from the sheet
+_bootstrap_lock = threading.Lock()
+_create_lock = threading.Lock()
+
 
 def _open_sheet():
-    sh = gc.open_by_key(SPREADSHEET_ID)
-    return sh
+    global _sheet
+    if _sheet is None:
+        _sheet = _read(_client(), "open_by_key", SPREADSHEET_ID)
+    return _sheet
+
+
+def bootstrap():
+    """
+    Create missing worksheets and header rows, then cache worksheet handles
+    and header positions. Costs one metadata read and one header read, plus
+    one batch create and one batch header write only when something is
+    missing. After this the request path never checks for existence.
+    """
+    global _catalog_listed
+    with _bootstrap_lock:
+        sh = _open_sheet()
+        existing = {ws.title: ws for ws in _read(sh, "worksheets")}
+
+        missing = [title for title in SHEET_SCHEMAS if title not in existing]
+        if missing:
+            _write(sh, "batch_update", {"requests": [
+                {"addSheet": {"properties": {"title": title, "gridProperties": {
+                    "rowCount": SHEET_SCHEMAS[title][0],
+                    "columnCount": len(SHEET_SCHEMAS[title][1]),
+                }}}}
+                for title in missing
+            ]})
+            existing = {ws.title: ws for ws in _read(sh, "worksheets")}
+            logging.info("Created worksheets: %s", ", ".join(missing))
+
+        titles = list(SHEET_SCHEMAS) + [title for title in existing if _PARTITION_TITLE.match(title)]
+        got = _read(sh, "values_batch_get", [f"'{title}'!1:1" for title in titles])
+        header_writes = []
+        headers = {}
+        for title, value_range in zip(titles, got.get("valueRanges", [])):
+            row = (value_range.get("values") or [[]])[0]
+            if not any(row):
+                row = _schema_headers(title)
+                header_writes.append({"range": f"'{title}'!A1", "values": [row]})
+            headers[title] = row
+        if header_writes:
+            _write(sh, "values_batch_update", {"valueInputOption": "RAW", "data": header_writes})
+
+        _worksheets.clear()
+        _worksheets.update(existing)
+        _catalog_listed = time.monotonic()
+        _columns.clear()
+        for title, row in headers.items():
+            _columns[title] = {name: i + 1 for i, name in enumerate(row) if name}
+
+
+def _schema_headers(title):
+    match = _PARTITION_TITLE.match(title)
+    return SHEET_SCHEMAS[match.group(1) if match else title][1]
+
+
+class _PendingWorksheet:
+    """
+    Stand-in for a worksheet created while Sheets is unavailable. Writes to
+    it are journaled behind its add_worksheet entry; replaying that entry
+    creates the real tab and puts it in _worksheets.
+    """
+
+    def __init__(self, title, rows, cols):
+        self.title = title
+        self.id = None
+        self.row_count = rows
+        self.col_count = cols
+
+
+def _create_ws(title, header, rows):
+    # straight to the scheduler: also used by journal replay, which must not re-journal
+    sh = _open_sheet()
+    try:
+        ws = _scheduler.run(sh.add_worksheet, (), {"title": title, "rows": rows, "cols": len(header)},
+                            PRIORITY_WRITE)
+    except _gspread().exceptions.APIError:
+        # another process created it since we listed the worksheets
+        return _read(sh, "worksheet", title)
+    _scheduler.run(ws.update, (), {"values": [header], "range_name": "A1"}, PRIORITY_WRITE)
+    logging.info("Created worksheet %s", title)
+    return ws
+
+
+def _get_or_add_ws(title, header, rows=1000):
+    """Worksheet outside SHEET_SCHEMAS (partitions, archives), created with its header on first use."""
+    ws = _worksheets.get(title)
+    if ws is not None:
+        return ws
+    with _create_lock:
+        ws = _worksheets.get(title)
+        if ws is None:
+            if _breaker.allow() and not _journal.pending():
+                try:
+                    ws = _create_ws(title, header, rows)
+                except SheetsUnavailable:
+                    pass
+            if ws is None:
+                # degraded: journal the creation; writes to the tab queue up behind it
+                ws = _PendingWorksheet(title, rows, len(header))
+                _journal.add(ws, "add_worksheet", (), {"rows": rows, "header": header})
+            _columns[title] = {name: i + 1 for i, name in enumerate(header)}
+            _worksheets[title] = ws
+    return ws
+
+
+def _ws(title):
+    ws = _worksheets.get(title)
+    if ws is None:
+        bootstrap()
+        ws = _worksheets[title]
+    return ws
+
+
+def _col(title, name):
+    """1-based column of a header, as found in the sheet at bootstrap."""
+    if title not in _columns:
+        bootstrap()
+    cols = _columns.get(title) or {}
+    if name in cols:
+        return cols[name]
+    return _schema_headers(title).index(name) + 1
+
+def _col_letter(col):
+    letters = ""
+    while col:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def get_page(title, offset=0, limit=20):
+    """
+    Data rows offset..offset+limit-1 of a sheet as records, read as one
+    range. Returns (records, has_more); one extra row is read to know
+    whether another page follows.
+    """
+    ws = _ws(title)
+    width = max((_columns.get(title) or {}).values(), default=len(SHEET_SCHEMAS[title][1]))
+    start = offset + 2  # data starts at row 2
+    rows = _read(ws, "get_values", f"A{start}:{_col_letter(width)}{start + limit}")
+    return [_record(title, row) for row in rows[:limit]], len(rows) > limit
 
 # ---------- CUSTOMER ----------
 def add_customer(name, email, phone, company):
-    sh = _open_sheet()
-    ws = sh.worksheet("Customer")
+    ws = _ws("Customer")
     now = datetime.utcnow().isoformat()
-    ws.append_row([name or "", email or "", phone or "", company or "", now])
+    _write(ws, "append_row", [name or "", email or "", phone or "", company or "", now])
     return True
 
 def get_customers():
-    sh = _open_sheet()
-    ws = sh.worksheet("Customer")
-    return ws.get_all_records()
+    ws = _ws("Customer")
+    return _read(ws, "get_all_records")
 
 # ---------- TASK ----------
 def add_task(task_name, assigned_to="self", status="pending"):
-    sh = _open_sheet()
-    ws = sh.worksheet("Task")
+    ws = _ws("Task")
     now = datetime.utcnow().isoformat()
-    ws.append_row([task_name or "", assigned_to or "", status or "", now])
+    _write(ws, "append_row", [task_name or "", assigned_to or "", status or "", now])
     return True
 
 def get_tasks():
-    sh = _open_sheet()
-    ws = sh.worksheet("Task")
-    return ws.get_all_records()
+    ws = _ws("Task")
+    return _read(ws, "get_all_records")
+
+# ---------- ROW INDEXES ----------
+# In-memory lookups (product name, customer, ...) -> sheet row, each built
+# with one download and kept in step with our own writes. They only say which
+# row to read: the row itself is read fresh, so a value changed by another
+# worker process is never overwritten with a cached one.
+class _RowIndex:
+    def __init__(self, title, build):
+        self.title = title
+        self._build = build  # records -> index object
+        self._index = None
+        self._built = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, refresh=False, max_age=None):
+        with self._lock:
+            stale = max_age is not None and time.monotonic() - self._built > max_age
+            if self._index is None or refresh or stale:
+                records = _read(_ws(self.title), "get_all_records")
+                self._index = self._build(records)
+                self._built = time.monotonic()
+            return self._index
+
+    def reset(self):
+        with self._lock:
+            self._index = None
+
+    def locate(self, find, key):
+        """
+        find(index) -> (row, expected key) or None; key(record) must equal the
+        expected key for the fresh row to count. On a mismatch (rows moved by
+        hand) or a miss on an index older than SHEETS_INDEX_TTL (another
+        process may have appended it) the index is rebuilt once.
+        Returns (row, record) or (None, None).
+        """
+        for attempt in range(2):
+            match = self.query(find)  # under the lock: writers update the index in place
+            if match is None:
+                if attempt or time.monotonic() - self._built < SHEETS_INDEX_TTL:
+                    return None, None
+            else:
+                row, expected = match
+                values = _read(_ws(self.title), "row_values", row, value_render_option="UNFORMATTED_VALUE")
+                record = _record(self.title, values)
+                if key(record) == expected:
+                    return row, record
+            self.get(refresh=True)
+        return None, None
+
+    def query(self, fn, max_age=None):
+        """fn(index) under the lock, rebuilding first if older than max_age seconds."""
+        index = self.get(max_age=max_age)
+        with self._lock:
+            return fn(index)
+
+    def update(self, fn, response=None):
+        """fn(index, row) under the lock; row comes from an append response if given."""
+        with self._lock:
+            if self._index is None:
+                return
+            row = None
+            if response is not None:
+                row = _appended_row(response)
+                if row is None:
+                    self._index = None  # rebuild on next lookup
+                    return
+            fn(self._index, row)
+
+
+def _appended_row(response):
+    """First row number written by append_row, from the API response."""
+    try:
+        updated = response["updates"]["updatedRange"]
+        return int(updated.split("!")[-1].split(":")[0].lstrip("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+def _text_key(value):
+    return " ".join(str(value or "").casefold().split())
+
+
+def _record(title, values):
+    """{header: value} for one row of values from the sheet."""
+    cols = _columns.get(title) or {}
+    return {name: values[col - 1] if col <= len(values) else "" for name, col in cols.items()}
+
+# ---------- PRODUCT INDEX ----------
+# Product name -> Inventory row, so "Dell Laptops" and "डेल लैपटॉप" update the
+# "Dell Laptop" row instead of appending duplicates. Building it also gives
+# the stock watcher the quantity of every product's canonical row, replacing
+# the levels it had (rows edited or removed elsewhere included).
+def _build_products(records):
+    index = product_index.ProductIndex()
+    levels = []
+    for row, r in enumerate(records, start=2):  # data starts at row 2
+        entry = index.add(r.get("Product", ""), row)
+        if entry is not None and entry[1] == row:
+            levels.append((entry[0], r.get("Quantity")))
+    stock_alerts.watcher.seed(levels)
+    return index
+
+
+_products = _RowIndex("Inventory", _build_products)
+
+
+def _find_product(product):
+    """Resolve product to its Inventory row: (row, record) or (None, None)."""
+    def find(index):
+        match = index.lookup(product)
+        return (match[1], product_index.normalize(match[0])) if match else None
+    return _products.locate(find, lambda r: product_index.normalize(r.get("Product")))
+
+
+def _index_product(product, response):
+    _products.update(lambda index, row: index.add(product, row), response)
+
+
+def resolve_product(product):
+    """Canonical Inventory name for a free-text product, or product unchanged."""
+    if not product:
+        return product
+    match = _products.query(lambda index: index.lookup(product))
+    return match[0] if match else product
+
+
+def _row_indexes():
+    return (_products, _customers, _services)
+
+
+def warm_caches():
+    """Build the in-memory indexes so the first request does not pay for them."""
+    for index in _row_indexes():
+        index.get()
+    _memory_end()
 
 # ---------- INVENTORY ----------
 def add_inventory(product, quantity, price):
-    sh = _open_sheet()
-    ws = sh.worksheet("Inventory")
+    ws = _ws("Inventory")
     now = datetime.utcnow().isoformat()
-    ws.append_row([product or "", quantity or "", price or "", now])
+    response = _write(ws, "append_row", [product or "", quantity or "", price or "", now])
+    _index_product(product, response)
+    stock_alerts.watcher.observe(product, quantity)
     return True
 
 def update_inventory(product, quantity, price):
-    sh = _open_sheet()
-    ws = sh.worksheet("Inventory")
-    records = ws.get_all_records()
-    for idx, r in enumerate(records, start=2):  # data starts at row 2
-        if str(r.get("Product", "")).strip().lower() == str(product).strip().lower():
-            ws.update_cell(idx, 2, quantity)
-            ws.update_cell(idx, 3, price)
-            return True
+    ws = _ws("Inventory")
+    row, record = _find_product(product)
+    if row is not None:
+        _write(ws, "update_cell", row, _col("Inventory", "Quantity"), quantity)
+        _write(ws, "update_cell", row, _col("Inventory", "Price"), price)
+        stock_alerts.watcher.observe(record.get("Product") or product, quantity)
+        return True
     return add_inventory(product, quantity, price)
 
 def get_inventory():
-    sh = _open_sheet()
-    ws = sh.worksheet("Inventory")
-    return ws.get_all_records()
+    ws = _ws("Inventory")
+    return _read(ws, "get_all_records")
 
-def low_stock_items(threshold=5):
-    items = get_inventory()
-    low = []
-    for it in items:
-        try:
-            qty = float(it.get("Quantity") or 0)
-        except:
-            qty = 0
-        if qty <= threshold:
-            low.append(it)
-    return low
+@_analytics
+def low_stock_items(threshold=None):
+    """get_low_stock() as {"Product", "Quantity"} records."""
+    return [{"Product": name, "Quantity": qty} for name, qty in get_low_stock(threshold)]
 
 # ---------- FINANCE ----------
 def add_finance(customer, amount, ftype, date=None, notes=""):
-    sh = _open_sheet()
-    ws = sh.worksheet("Finance")
+    ws = _ws("Finance")
     date = date or datetime.utcnow().date().isoformat()
-    ws.append_row([customer or "", amount or "", ftype or "", date, notes])
+    _write(ws, "append_row", [customer or "", amount or "", ftype or "", date, notes])
     return True
 
 def get_finance():
-    sh = _open_sheet()
-    ws = sh.worksheet("Finance")
-    return ws.get_all_records()
+    ws = _ws("Finance")
+    return _read(ws, "get_all_records")
 
 # ---------- REPORT ----------
 def add_report(text):
-    sh = _open_sheet()
-    ws = sh.worksheet("Report")
+    ws = _ws("Report")
     now = datetime.utcnow().isoformat()
-    ws.append_row([now, text])
+    _write(ws, "append_row", [now, text])
     return True
 
 # ---------- MEMORY (NEW) ----------
 def _get_or_create_memory_ws():
-    sh = _open_sheet()
-    try:
-        ws = sh.worksheet("Memory")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Memory", rows=1000, cols=4)
-        ws.update("A1:D1", [["UserID", "Timestamp", "Role", "Text"]])
-    return ws
+    return _ws("Memory")
 
 def add_memory(user_id, role, text):
     """Store short message history per user."""
     ws = _get_or_create_memory_ws()
     now = datetime.utcnow().isoformat()
-    ws.append_row([str(user_id), now, role, text or ""])
+    response = _write(ws, "append_row", [str(user_id), now, role, text or ""])
+    row = _appended_row(response)
+    if row is not None:
+        _end_marks["Memory"] = row + 1
     return True
 
+
+def _memory_end():
+    """Row just past the last Memory row, as last seen (searched for once)."""
+    end = _end_marks.get("Memory")
+    if end is None:
+        _get_or_create_memory_ws()
+        end = _end_marks["Memory"] = _first_row("Memory", _col("Memory", "UserID"), lambda value: value == "")
+    return end
+
 def get_memory(user_id, limit=6):
     """Get last N messages (user+bot) for that user."""
-    sh = _open_sheet()
     try:
-        ws = sh.worksheet("Memory")
-    except gspread.WorksheetNotFound:
-        return []
-    records = ws.get_all_records()
-    user_records = [r for r in records if str(r.get("UserID")) == str(user_id)]
-    return user_records[-limit:]
+        return _last_messages(user_id, limit)
+    except SheetsUnavailable:
+        return []  # history is only context; answer without it
+
+
+def _last_messages(user_id, limit):
+    # read the newest rows only; widen the window if this user has too few there
+    window = MEMORY_TAIL_ROWS
+    first = max(2, _memory_end() - window)
+    rows = _tail_rows("Memory", first)
+    _end_marks["Memory"] = first + len(rows)
+
+    user_records = []
+    while True:
+        records = (_record("Memory", row) for row in rows)
+        user_records = [r for r in records if str(r.get("UserID")) == str(user_id)] + user_records
+        if len(user_records) >= limit or first == 2:
+            return user_records[-limit:]
+        window *= 4
+        first, last = max(2, first - window), first - 1
+        rows = _tail_rows("Memory", first, last)
+
+def compact_memory(keep=MEMORY_KEEP_PER_USER):
+    """
+    Keep the newest `keep` Memory rows per user and archive the rest: one
+    read, one archive write, one rewrite of the hot sheet and one delete of
+    the rows it no longer needs, whatever its size. The kept rows stay in
+    time order at the top, so later appends continue right after them.
+    Returns the number of rows archived.
+    """
+    ws = _ws("Memory")
+    rows = _read(ws, "get_all_values")
+    if len(rows) < 2:
+        return 0
+    header, data = rows[0], rows[1:]
+    width = len(header)
+    user_col = _col("Memory", "UserID") - 1
+
+    kept_flags = [False] * len(data)
+    per_user = {}
+    for i in range(len(data) - 1, -1, -1):  # newest rows are at the bottom
+        row = data[i]
+        if not any(row):
+            continue
+        user = row[user_col] if user_col < len(row) else ""
+        if per_user.get(user, 0) < keep:
+            per_user[user] = per_user.get(user, 0) + 1
+            kept_flags[i] = True
+    kept = [row[:width] for row, k in zip(data, kept_flags) if k]
+    old = [row[:width] for row, k in zip(data, kept_flags) if not k and any(row)]
+    if not old:
+        return 0
+
+    # archive first: if the rewrite then fails, rows are archived twice, never lost
+    _archive_memory(header, old)
+    if kept:
+        values = [row + [""] * (width - len(row)) for row in kept]
+        _write(ws, "update", values=values, range_name=f"A2:{_col_letter(width)}{len(kept) + 1}")
+    # delete (not blank) the rest: rows appended meanwhile move up behind the kept ones
+    _write(ws, "delete_rows", len(kept) + 2, len(data) + 1)
+    # remembered row positions no longer hold
+    _end_marks.pop("Memory", None)
+    logging.info("Memory compacted: kept %d rows, archived %d", len(kept), len(old))
+    return len(old)
+
+
+def _archive_memory(header, rows):
+    now = datetime.utcnow()
+    if MEMORY_ARCHIVE == "sheet":
+        ws = _get_or_add_ws(f"Memory_Archive_{now:%Y_%m}", header, rows=len(rows) + 1)
+        _write(ws, "append_rows", rows, value_input_option="RAW")
+        return
+
+    os.makedirs(MEMORY_ARCHIVE_DIR, exist_ok=True)
+    path = os.path.join(MEMORY_ARCHIVE_DIR, f"memory-{now:%Y-%m-%d}.jsonl.gz")
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        f.writelines(json.dumps(dict(zip(header, row)), ensure_ascii=False) + "\n" for row in rows)
 
 # ---------- INVOICE / BILLING ----------
 def _get_or_create_invoice_ws():
-    sh = _open_sheet()
-    try:
-        ws = sh.worksheet("Invoice")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Invoice", rows=1000, cols=10)
-        ws.update("A1:J1", [[
-            "InvoiceID", "Date", "Customer", "ItemsJSON",
-            "Subtotal", "TaxRate", "Discount", "GrandTotal",
-            "Paid", "Due"
-        ]])
-    return ws
+    return _ws("Invoice")
 # INVOICE
 def add_invoice(customer, items, subtotal, tax_rate, discount, grand_total, paid, due):
     """
@@ -149,7 +1086,7 @@ def add_invoice(customer, items, subtotal, tax_rate, discount, grand_total, paid
     # Simple unique id from timestamp
     invoice_id = f"INV-{now.replace('-', '').replace(':', '').split('.')[0]}"
     items_json = json.dumps(items, ensure_ascii=False)
-    ws.append_row([
+    _write(ws, "append_row", [
         invoice_id,
         now,
         customer or "Walk-in Customer",
@@ -163,18 +1100,143 @@ def add_invoice(customer, items, subtotal, tax_rate, discount, grand_total, paid
     ])
     return invoice_id
 
-# ---------- PURCHASE ----------
-def _purchase_ws():
+# ---------- TAIL READS ----------
+# Sales, Purchase, Finance and Memory are appended in time order, so recent
+# rows are read as one open-ended range (A<row>:I) from a remembered starting
+# row instead of downloading the whole sheet: analytics.py keeps the row past
+# what it loaded, get_memory the end of Memory. That end is found once by
+# searching a column, reading TAIL_PROBES evenly spaced cells per request:
+# about four small requests for 100k rows.
+TAIL_PROBES = 32
+# newest Memory rows get_memory reads first; widened 4x while a user has too few there
+MEMORY_TAIL_ROWS = int(os.getenv("MEMORY_TAIL_ROWS", "500"))
+_end_marks = {}  # title -> row just past the data when last read
+
+
+def _first_row(title, col, pred, lo=2):
+    """
+    First row >= lo whose cell in column col satisfies pred, for pred that is
+    False...False True...True down the sheet. pred must hold for "" (past
+    the data).
+    """
+    sh = _open_sheet()
+    letter = _col_letter(col)
+    hi, fresh = _ws(title).row_count, False  # cached grid size until the data reaches it
+    while True:
+        if lo > hi:
+            if fresh:
+                return lo  # the data fills the grid; nothing can be below it
+            # appends may have grown the grid since bootstrap; never probe past it
+            hi, fresh = _grid_rows(title), True
+            continue
+        step = max((hi - lo) // TAIL_PROBES, 1)
+        rows = sorted(set(range(lo, hi, step)) | {hi})
+        got = _read(sh, "values_batch_get", [f"'{title}'!{letter}{row}" for row in rows],
+                    params={"valueRenderOption": "UNFORMATTED_VALUE"})  # as _tail_rows reads them
+        values = []
+        for vr in got.get("valueRanges", []):
+            cells = (vr.get("values") or [[]])[0]
+            values.append(cells[0] if cells else "")
+        hits = [i for i, value in enumerate(values) if pred(value)]
+        if not hits:
+            lo = hi + 1
+            continue
+        i = hits[0]
+        if i == 0 or rows[i] - rows[i - 1] <= 1:
+            return rows[i]
+        lo, hi = rows[i - 1] + 1, rows[i]
+
+
+def _grid_rows(title):
+    """Row count of a worksheet's grid as it is now; refreshes the cached handle."""
+    ws = _read(_open_sheet(), "worksheet", title)
+    if getattr(_worksheets.get(title), "id", None) == ws.id:
+        _worksheets[title] = ws
+    return ws.row_count
+
+
+def _tail_rows(title, first, last=None):
+    """Raw rows first..last (or to the end of the data) as one range read."""
+    width = max((_columns.get(title) or {}).values(), default=len(_schema_headers(title)))
+    end = f"{_col_letter(width)}{last}" if last else _col_letter(width)
+    return _read(_ws(title), "get_values", f"A{first}:{end}", value_render_option="UNFORMATTED_VALUE")
+
+
+# ---------- PARTITIONS ----------
+# With SHEETS_PARTITIONS=1 new Sales/Purchase rows go to the current month's
+# tab. Rows written before that stay in the base tab. The catalog is the
+# cached worksheet list; other workers create month tabs too, so with
+# partitioning on it is re-listed once it is older than SHEETS_INDEX_TTL.
+_PARTITION_TITLE = re.compile(r"^(Sales|Purchase)_(\d{4})_(\d{2})$")
+
+
+def _refresh_catalog():
+    """Add partition tabs created elsewhere since the last listing to _worksheets."""
+    global _catalog_listed
     sh = _open_sheet()
     try:
-        ws = sh.worksheet("Purchase")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Purchase", rows=1000, cols=8)
-        ws.update("A1:H1", [[
-            "PurchaseID", "Date", "Supplier", "Product",
-            "Quantity", "PriceEach", "Total", "Notes"
-        ]])
-    return ws
+        listed = {ws.title: ws for ws in _read(sh, "worksheets") if _PARTITION_TITLE.match(ws.title)}
+    except SheetsUnavailable:
+        return  # keep the catalog we have
+    _catalog_listed = time.monotonic()
+    new = [title for title in listed if title not in _worksheets]
+    if not new:
+        return
+    got = _read(sh, "values_batch_get", [f"'{title}'!1:1" for title in new])
+    with _create_lock:
+        for title, value_range in zip(new, got.get("valueRanges", [])):
+            if title in _worksheets:
+                continue  # created here meanwhile
+            header = (value_range.get("values") or [[]])[0] or _schema_headers(title)
+            _columns[title] = {name: i + 1 for i, name in enumerate(header) if name}
+            _worksheets[title] = listed[title]
+    logging.info("Found new partitions: %s", ", ".join(new))
+
+
+def partitions(base):
+    """[(year, month, title)] of the monthly tabs of Sales or Purchase, oldest first."""
+    if not _worksheets:
+        bootstrap()
+    elif SHEETS_PARTITIONS and time.monotonic() - _catalog_listed > SHEETS_INDEX_TTL:
+        _refresh_catalog()
+    found = []
+    for title in list(_worksheets):
+        match = _PARTITION_TITLE.match(title)
+        if match and match.group(1) == base:
+            found.append((int(match.group(2)), int(match.group(3)), title))
+    return sorted(found)
+
+
+def _current_ws(base):
+    """Where new rows of a partitioned sheet are written."""
+    if not SHEETS_PARTITIONS:
+        return _ws(base)
+    return _get_or_add_ws(f"{base}_{datetime.utcnow():%Y_%m}", SHEET_SCHEMAS[base][1])
+
+
+def tabs(base):
+    """Every tab holding rows of base: the base tab, then its monthly partitions."""
+    if base not in ("Sales", "Purchase"):
+        return [base]
+    return [base] + [title for _, _, title in partitions(base)]
+
+
+def get_columns(title, names, first=2):
+    """
+    Raw values of the named columns from row `first` to the end of the data,
+    as {name: [values]}, and the row just past the data. One range read.
+    """
+    _ws(title)
+    rows = _tail_rows(title, first)
+    out = {}
+    for name in names:
+        i = _col(title, name) - 1
+        out[name] = [row[i] if i < len(row) else "" for row in rows]
+    return out, first + len(rows)
+
+# ---------- PURCHASE ----------
+def _purchase_ws():
+    return _current_ws("Purchase")
 
 
 def add_purchase(supplier, product, quantity, price_each, notes=""):
@@ -186,7 +1248,7 @@ def add_purchase(supplier, product, quantity, price_each, notes=""):
     price_each = float(price_each)
     total = quantity * price_each
 
-    ws.append_row([
+    _write(ws, "append_row", [
         pid,
         now,
         supplier or "",
@@ -201,16 +1263,7 @@ def add_purchase(supplier, product, quantity, price_each, notes=""):
 
 # ---------- SALES ----------
 def _sales_ws():
-    sh = _open_sheet()
-    try:
-        ws = sh.worksheet("Sales")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Sales", rows=1000, cols=9)
-        ws.update("A1:I1", [[
-            "SaleID", "Date", "Customer", "Product",
-            "Quantity", "PriceEach", "Total", "Profit", "Notes"
-        ]])
-    return ws
+    return _current_ws("Sales")
 
 
 def add_sale(customer, product, quantity, selling_price, purchase_price, notes=""):
@@ -225,7 +1278,7 @@ def add_sale(customer, product, quantity, selling_price, purchase_price, notes="
     total = quantity * selling_price
     profit = (selling_price - purchase_price) * quantity
 
-    ws.append_row([
+    _write(ws, "append_row", [
         sid,
         now,
         customer or "",
@@ -242,208 +1295,271 @@ def add_sale(customer, product, quantity, selling_price, purchase_price, notes="
 # ---------- INVENTORY AUTO UPDATE ----------
 def increase_stock(product, quantity, purchase_price=None):
     """Add stock; update purchase price if provided"""
-    sh = _open_sheet()
-    ws = sh.worksheet("Inventory")
-    records = ws.get_all_records()
+    ws = _ws("Inventory")
+    i, row = _find_product(product)
 
     quantity = float(quantity)
 
-    for i, row in enumerate(records, start=2):
-        if row["Product"].strip().lower() == product.strip().lower():
-            new_qty = float(row["Quantity"]) + quantity
+    if i is not None:
+        new_qty = float(row["Quantity"] or 0) + quantity
 
-            ws.update_cell(i, 2, new_qty)
+        _write(ws, "update_cell", i, _col("Inventory", "Quantity"), new_qty)
+        stock_alerts.watcher.observe(row.get("Product") or product, new_qty)
 
-            # update purchase price if given
-            if purchase_price is not None:
-                ws.update_cell(i, 3, float(purchase_price))
+        # update purchase price if given
+        if purchase_price is not None:
+            _write(ws, "update_cell", i, _col("Inventory", "Price"), float(purchase_price))
 
-            return True
+        return True
 
     # If product not found → add new row
-    ws.append_row([product, quantity, purchase_price or 0, datetime.utcnow().isoformat()])
+    response = _write(ws, "append_row", [product, quantity, purchase_price or 0, datetime.utcnow().isoformat()])
+    _index_product(product, response)
+    stock_alerts.watcher.observe(product, quantity)
     return True
 
 
 def decrease_stock(product, quantity):
     """Subtract stock when selling"""
-    sh = _open_sheet()
-    ws = sh.worksheet("Inventory")
-    records = ws.get_all_records()
+    ws = _ws("Inventory")
+    i, row = _find_product(product)
 
     quantity = float(quantity)
 
-    for i, row in enumerate(records, start=2):
-        if row["Product"].strip().lower() == product.strip().lower():
-            new_qty = float(row["Quantity"]) - quantity
-            if new_qty < 0: new_qty = 0
-            ws.update_cell(i, 2, new_qty)
-            return True
+    if i is not None:
+        new_qty = float(row["Quantity"] or 0) - quantity
+        if new_qty < 0: new_qty = 0
+        _write(ws, "update_cell", i, _col("Inventory", "Quantity"), new_qty)
+        stock_alerts.watcher.observe(row.get("Product") or product, new_qty)
+        return True
 
     return False
 
 
 def get_purchase_price(product):
     """Get last purchase price; needed for profit calc"""
-    sh = _open_sheet()
-    ws = sh.worksheet("Inventory")
-    records = ws.get_all_records()
-
-    for row in records:
-        if row["Product"].strip().lower() == product.strip().lower():
-            return float(row.get("Price") or 0)
+    _, row = _find_product(product)
+    if row is not None:
+        return float(row.get("Price") or 0)
 
     return 0
 
 # ---------- SMART ANALYTICS ----------
-def get_low_stock(threshold=5):
-    items = get_inventory()
-    low = []
-    for it in items:
-        try:
-            qty = float(it.get("Quantity") or 0)
-        except:
-            qty = 0
-        if qty <= threshold:
-            low.append((it.get("Product"), qty))
-    return low
+def get_low_stock(threshold=None):
+    """
+    [(product, quantity)] at/below each product's own threshold (or at/below
+    `threshold` if given), from the levels the stock watcher keeps in memory.
+    Those are reloaded from Inventory once older than SHEETS_INDEX_TTL, so
+    stock changed by other workers (or by hand) is seen within that time.
+    """
+    _products.get(max_age=SHEETS_INDEX_TTL)  # (re)seeds the watcher
+    return stock_alerts.watcher.low_items(threshold)
 
 
+# Totals and top-N come from the columnar tables in analytics.py, which keep
+# Sales/Purchase loaded and read only new rows. Imported late: analytics
+# reads through this module.
+@_analytics
 def get_top_selling(limit=3):
-    sh = _open_sheet()
-    try:
-        ws = sh.worksheet("Sales")
-    except:
-        return []
+    import analytics
+    return analytics.top_selling(limit)
 
-    records = ws.get_all_records()
-    sales_count = {}
 
-    for r in records:
-        p = r.get("Product")
-        q = float(r.get("Quantity") or 0)
-        sales_count[p] = sales_count.get(p, 0) + q
+@_analytics
+def get_total_profit():
+    import analytics
+    return analytics.total_profit()
 
-    sorted_items = sorted(sales_count.items(), key=lambda x: x[1], reverse=True)
-    return sorted_items[:limit]
 
+@_analytics
+def get_today_summary():
+    import analytics
+    return analytics.today_summary()
 
-def get_total_profit():
-    sh = _open_sheet()
-    try:
-        ws = sh.worksheet("Sales")
-    except:
-        return 0
+# ---------- CRM ----------
+def _crm_ws():
+    return _ws("CRM")
 
-    records = ws.get_all_records()
-    total = 0
-    for r in records:
-        try:
-            total += float(r.get("Profit") or 0)
-        except:
-            pass
-    return total
 
+def _phone_key(phone):
+    # last 10 digits, so "+91 98765-43210" and "9876543210" are one number
+    digits = "".join(ch for ch in str(phone or "") if ch.isdigit())
+    return digits[-10:] if len(digits) >= 6 else ""
 
-def get_today_summary():
-    today = datetime.utcnow().date().isoformat()
 
-    sh = _open_sheet()
-    summary = {
-        "purchases": 0,
-        "sales": 0,
-        "profit": 0
-    }
+def _email_key(email):
+    email = str(email or "").strip().casefold()
+    return email if "@" in email else ""
 
-    # Purchases
-    try:
-        ws_p = sh.worksheet("Purchase")
-        records = ws_p.get_all_records()
-        for r in records:
-            if r.get("Date", "").startswith(today):
-                summary["purchases"] += float(r.get("Total") or 0)
-    except:
-        pass
-
-    # Sales
-    try:
-        ws_s = sh.worksheet("Sales")
-        records = ws_s.get_all_records()
-        for r in records:
-            if r.get("Date", "").startswith(today):
-                summary["sales"] += float(r.get("Total") or 0)
-                summary["profit"] += float(r.get("Profit") or 0)
-    except:
-        pass
 
-    return summary
+class _CustomerIndex:
+    """CRM rows by normalized name, phone and email, with their last known fields."""
+
+    def __init__(self):
+        self.records = {}  # row -> record
+        self.by_name = {}
+        self.by_phone = {}
+        self.by_email = {}
+
+    def _keys(self, record):
+        return ((self.by_name, _text_key(record.get("Customer"))),
+                (self.by_phone, _phone_key(record.get("Phone"))),
+                (self.by_email, _email_key(record.get("Email"))))
+
+    def put(self, row, record):
+        old = self.records.get(row)
+        if old is not None:
+            for keys, key in self._keys(old):
+                if keys.get(key) == row:
+                    del keys[key]
+        self.records[row] = dict(record)
+        for keys, key in self._keys(record):
+            if key:
+                keys.setdefault(key, row)  # first row wins, like the old scan
+
+    def find(self, query, by_contact=True):
+        """Row for a name or, with by_contact, a phone number or email."""
+        row = self.by_name.get(_text_key(query))
+        if row is None and by_contact:
+            row = self.by_phone.get(_phone_key(query)) or self.by_email.get(_email_key(query))
+        return row
 
-# ---------- CRM ----------
-def _crm_ws():
-    sh = _open_sheet()
-    try:
-        ws = sh.worksheet("CRM")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="CRM", rows=2000, cols=9)
-        ws.update("A1:I1", [[
-            "Customer", "Phone", "Email", "LastVisit",
-            "TotalPurchases", "TotalSpent", "TotalProfit",
-            "Notes", "Tags"
-        ]])
-    return ws
+
+def _build_customers(records):
+    index = _CustomerIndex()
+    for row, r in enumerate(records, start=2):
+        index.put(row, r)
+    return index
+
+
+_customers = _RowIndex("CRM", _build_customers)
+
+
+def _find_customer(query, by_contact=False):
+    """(row, fresh record) of a CRM customer, or (None, None)."""
+    def find(index):
+        row = index.find(query, by_contact)
+        return (row, _text_key(index.records[row].get("Customer"))) if row else None
+    row, record = _customers.locate(find, lambda r: _text_key(r.get("Customer")))
+    if row is not None:
+        _customers.update(lambda index, _: index.put(row, record))
+    return row, record
 
 
 def crm_add_or_update(customer, phone="", email="", notes="", tags=""):
     ws = _crm_ws()
-    records = ws.get_all_records()
+    idx, row = _find_customer(customer)
 
     # If customer exists → update
-    for idx, row in enumerate(records, start=2):
-        if row["Customer"].strip().lower() == customer.strip().lower():
-            ws.update_cell(idx, 2, phone or row["Phone"])
-            ws.update_cell(idx, 3, email or row["Email"])
-            ws.update_cell(idx, 4, datetime.utcnow().date().isoformat())
-            ws.update_cell(idx, 8, (row["Notes"] + " " + notes).strip())
-            ws.update_cell(idx, 9, (row["Tags"] + "," + tags).strip())
-            return
+    if idx is not None:
+        row.update({
+            "Phone": phone or row["Phone"],
+            "Email": email or row["Email"],
+            "LastVisit": datetime.utcnow().date().isoformat(),
+            "Notes": (str(row["Notes"]) + " " + notes).strip(),
+            "Tags": (str(row["Tags"]) + "," + tags).strip(),
+        })
+        for name in ("Phone", "Email", "LastVisit", "Notes", "Tags"):
+            _write(ws, "update_cell", idx, _col("CRM", name), row[name])
+        _customers.update(lambda index, _: index.put(idx, row))
+        return
 
     # If new customer → add
-    ws.append_row([
+    values = [
         customer, phone, email,
         datetime.utcnow().date().isoformat(),
         0, 0, 0, notes, tags
-    ])
+    ]
+    response = _write(ws, "append_row", values)
+    record = dict(zip(SHEET_SCHEMAS["CRM"][1], values))
+    _customers.update(lambda index, new_row: index.put(new_row, record), response)
 
 
 def crm_update_sales(customer, amount, profit):
     ws = _crm_ws()
-    records = ws.get_all_records()
+    idx, row = _find_customer(customer)
 
-    for idx, row in enumerate(records, start=2):
-        if row["Customer"].strip().lower() == customer.strip().lower():
-            total_spent = float(row["TotalSpent"] or 0) + amount
-            total_profit = float(row["TotalProfit"] or 0) + profit
-            total_purchase = float(row["TotalPurchases"] or 0) + 1
+    if idx is not None:
+        row["TotalSpent"] = float(row["TotalSpent"] or 0) + amount
+        row["TotalProfit"] = float(row["TotalProfit"] or 0) + profit
+        row["TotalPurchases"] = float(row["TotalPurchases"] or 0) + 1
 
-            ws.update_cell(idx, 5, total_purchase)
-            ws.update_cell(idx, 6, total_spent)
-            ws.update_cell(idx, 7, total_profit)
-            return True
+        for name in ("TotalPurchases", "TotalSpent", "TotalProfit"):
+            _write(ws, "update_cell", idx, _col("CRM", name), row[name])
+        _customers.update(lambda index, _: index.put(idx, row))
+        return True
 
     return False
 
+
+def get_customer_profile(customer):
+    """CRM record for a customer name, phone number or email, or None."""
+    _, record = _find_customer(customer, by_contact=True)
+    return record
+
+
+def get_crm():
+    ws = _crm_ws()
+    return _read(ws, "get_all_records")
+
 # ---------- SERVICE HISTORY ----------
 def _service_ws():
-    sh = _open_sheet()
-    try:
-        ws = sh.worksheet("ServiceHistory")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="ServiceHistory", rows=2000, cols=9)
-        ws.update("A1:I1", [[
-            "ServiceID", "Date", "Customer", "Device",
-            "Problem", "Status", "Cost", "Technician", "Notes"
-        ]])
-    return ws
+    return _ws("ServiceHistory")
+
+
+def _job_key(job_id):
+    return str(job_id or "").strip().upper()
+
+
+class _ServiceIndex:
+    """ServiceHistory rows by ServiceID, plus Status, Technician and Customer queues."""
+
+    def __init__(self):
+        self.records = {}  # row -> record
+        self.by_id = {}
+        # field -> {normalized value -> {row: None}} (dicts keep insertion order)
+        self.queues = {"Status": {}, "Technician": {}, "Customer": {}}
+
+    def put(self, row, record):
+        old = self.records.get(row)
+        if old is not None:
+            if self.by_id.get(_job_key(old.get("ServiceID"))) == row:
+                del self.by_id[_job_key(old.get("ServiceID"))]
+            for field, queue in self.queues.items():
+                queue.get(_text_key(old.get(field)), {}).pop(row, None)
+        self.records[row] = dict(record)
+        self.by_id.setdefault(_job_key(record.get("ServiceID")), row)
+        for field, queue in self.queues.items():
+            queue.setdefault(_text_key(record.get(field)), {})[row] = None
+
+    def select(self, **filters):
+        """Records matching every given field (Status="pending", ...), oldest first."""
+        rows = None
+        for field, value in filters.items():
+            matched = self.queues[field].get(_text_key(value), {})
+            rows = set(matched) if rows is None else rows & set(matched)
+        rows = self.records if rows is None else rows
+        return [self.records[row] for row in sorted(rows)]
+
+
+def _build_services(records):
+    index = _ServiceIndex()
+    for row, r in enumerate(records, start=2):
+        index.put(row, r)
+    return index
+
+
+_services = _RowIndex("ServiceHistory", _build_services)
+
+
+def _find_service(job_id):
+    def find(index):
+        row = index.by_id.get(_job_key(job_id))
+        return (row, _job_key(job_id)) if row else None
+    row, record = _services.locate(find, lambda r: _job_key(r.get("ServiceID")))
+    if row is not None:
+        _services.update(lambda index, _: index.put(row, record))
+    return row, record
 
 
 def add_service(customer, device, problem, status="Pending", cost=0, tech="", notes=""):
@@ -451,9 +1567,63 @@ def add_service(customer, device, problem, status="Pending", cost=0, tech="", no
     now = datetime.utcnow().isoformat()
     sid = f"JOB-{now.replace('-', '').replace(':', '').split('.')[0]}"
 
-    ws.append_row([
+    values = [
         sid, now, customer, device, problem, status,
         cost, tech, notes
-    ])
+    ]
+    response = _write(ws, "append_row", values)
+    record = dict(zip(SHEET_SCHEMAS["ServiceHistory"][1], values))
+    _services.update(lambda index, row: index.put(row, record), response)
+
+    return sid
 
-    return sid
\ No newline at end of file
+
+def get_service(job_id):
+    """Current record of one service job, or None."""
+    _, record = _find_service(job_id)
+    return record
+
+
+def update_service(job_id, status=None, cost=None, technician=None, notes=None):
+    """Change a job's status/cost/technician/notes. Returns the updated record or None."""
+    idx, record = _find_service(job_id)
+    if idx is None:
+        return None
+
+    ws = _service_ws()
+    changes = {"Status": status, "Cost": cost, "Technician": technician, "Notes": notes}
+    for name, value in changes.items():
+        if value is not None and value != "":
+            record[name] = value
+            _write(ws, "update_cell", idx, _col("ServiceHistory", name), value)
+    _services.update(lambda index, _: index.put(idx, record))
+    return record
+
+
+def list_services(status=None, technician=None, customer=None):
+    """
+    Jobs by status, technician and/or customer from the in-memory queues.
+    Edits made directly in the sheet show up within SHEETS_INDEX_TTL.
+    """
+    filters = {"Status": status, "Technician": technician, "Customer": customer}
+    filters = {k: v for k, v in filters.items() if v}
+    return _services.query(lambda index: index.select(**filters), max_age=SHEETS_INDEX_TTL)
+
+
+def get_service_history():
+    ws = _service_ws()
+    return _read(ws, "get_all_records")
+
+# ---------- INSTRUMENTATION ----------
+def _instrument():
+    """Latency histogram for every public function in this module."""
+    import inspect
+    for name, fn in list(globals().items()):
+        if name.startswith("_") or name in ("analytics_priority", "set_client"):
+            continue
+        if inspect.isfunction(fn) and fn.__module__ == __name__:
+            globals()[name] = metrics.timed(
+                "sheets_function_latency_seconds", "Latency per google_sheets function", function=name,
+            )(fn)
+
+_instrument()
@@ -0,0 +1,227 @@
+# intent_classifier.py - local intent-family classifier for picking sub-prompts
+#
+# Multinomial logistic regression over hashed character 2-4-grams, in plain
+# Python. Prediction touches ~100 weights and takes tens of microseconds, so
+# ask_ai_agent can send the model only the schema of the family a message
+# belongs to instead of the whole SYSTEM_PROMPT.
+#
+# Training data is the bot's own traffic. With INTENT_LOG set (it is off by
+# default: the log holds customers' messages verbatim) handle_message
+# appends each (message, intent) pair to it; past INTENT_LOG_MAX_BYTES the
+# file is moved to INTENT_LOG.1, replacing the previous one, so at most
+# twice that is kept on disk. Then
+#
+#   python -m intent_classifier train        # rebuild INTENT_MODEL_FILE from the log
+#
+# refits the model on both files. Until there is a saved model, one is
+# fitted on SEED.
+import os
+import sys
+import json
+import math
+import zlib
+import random
+import logging
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+INTENT_LOG = os.getenv("INTENT_LOG", "")  # e.g. intent_log.jsonl; "" keeps no log
+INTENT_LOG_MAX_BYTES = int(os.getenv("INTENT_LOG_MAX_BYTES", str(5 << 20)))
+INTENT_MODEL_FILE = os.getenv("INTENT_MODEL_FILE", "intent_model.json")
+BUCKETS = 1 << 18
+
+# intent -> family; each family has its own section of the prompt in ai_agent
+FAMILY_OF = {
+    "purchase_entry": "trade", "sales_entry": "trade", "mixed_transaction": "trade",
+    "supplier_add": "trade", "invoice_needed": "trade", "create_invoice": "trade",
+    "add_stock": "stock", "reduce_stock": "stock", "update_stock": "stock", "check_stock": "stock",
+    "add_inventory": "stock", "update_inventory": "stock", "get_inventory": "stock", "low_stock_check": "stock",
+    "add_customer": "crm", "auto_create_customer": "crm", "get_customers": "crm", "get_customer_profile": "crm",
+    "add_task": "crm", "get_tasks": "crm", "add_finance": "crm", "get_finance": "crm",
+    "add_service": "service", "update_service": "service", "get_service_status": "service",
+    "list_services": "service",
+    "profit_report": "reports", "sales_report": "reports", "purchase_report": "reports",
+    "daily_report": "reports", "weekly_report": "reports", "suggestions": "reports",
+    "general_chat": "chat",
+}
+FAMILIES = ("trade", "stock", "crm", "service", "reports", "chat")
+
+# a few examples per family so a fresh install has a (cautious) model
+SEED = [
+    ("10 chawal aaye 40 ke", "purchase_entry"), ("20 cheeni kharidi Sharma se", "purchase_entry"),
+    ("bought 5 mouse at 300", "purchase_entry"), ("2 mouse beche 450 me", "sales_entry"),
+    ("Rahul ko 3 keyboard bech diye", "sales_entry"), ("sold 4 cables to Amit", "sales_entry"),
+    ("10 maal aaya aur 2 bik gaye", "mixed_transaction"), ("bill banao Rahul ka", "create_invoice"),
+    ("invoice bhejo Amit ko", "create_invoice"),
+    ("stock dikhao", "get_inventory"), ("inventory list", "get_inventory"), ("kitna maal bacha hai", "get_inventory"),
+    ("low stock", "low_stock_check"), ("kya khatam hone wala hai", "low_stock_check"),
+    ("add 10 mouse at 300", "add_inventory"), ("mouse stock 20 karo", "update_inventory"),
+    ("add customer Rahul 9876543210", "add_customer"), ("customers dikhao", "get_customers"),
+    ("Rahul ki profile", "get_customer_profile"), ("task: call supplier", "add_task"),
+    ("tasks dikhao", "get_tasks"), ("5000 income from Rahul", "add_finance"),
+    ("rent 8000 kharcha", "add_finance"), ("finance dikhao", "get_finance"),
+    ("laptop repair Rahul screen toot gayi", "add_service"), ("printer service Amit", "add_service"),
+    ("JOB-1 status", "get_service_status"), ("JOB-12 kahan tak hua", "get_service_status"),
+    ("JOB-1 done", "update_service"), ("JOB-3 technician Ravi", "update_service"),
+    ("pending jobs", "list_services"), ("repair list dikhao", "list_services"),
+    ("sales this month", "sales_report"), ("is hafte ki bikri", "sales_report"),
+    ("purchase report", "purchase_report"), ("profit kitna hua", "profit_report"),
+    ("munafa batao", "profit_report"), ("weekly report", "weekly_report"),
+    ("aaj ki report", "daily_report"), ("business insights", "suggestions"),
+    ("hello", "general_chat"), ("namaste", "general_chat"), ("thank you", "general_chat"),
+    ("kaise ho", "general_chat"), ("what can you do", "general_chat"),
+]
+
+
+def features(text):
+    """Hashed char 2-4-gram buckets of the normalized text (a set)."""
+    text = " " + " ".join((text or "").casefold().split()) + " "
+    out = set()
+    for n in (2, 3, 4):
+        for i in range(len(text) - n + 1):
+            out.add(zlib.crc32(text[i:i + n].encode("utf-8")) % BUCKETS)
+    return out
+
+
+class Classifier:
+    """Softmax regression: bucket -> per-family weights."""
+
+    def __init__(self, classes=FAMILIES, weights=None, bias=None):
+        self.classes = tuple(classes)
+        self.weights = weights or {}  # bucket -> [weight per class]
+        self.bias = bias or [0.0] * len(self.classes)
+
+    def _probabilities(self, feats):
+        scores = list(self.bias)
+        scale = 1 / math.sqrt(len(feats) or 1)
+        for f in feats:
+            w = self.weights.get(f)
+            if w is not None:
+                for c, v in enumerate(w):
+                    scores[c] += v * scale
+        top = max(scores)
+        exps = [math.exp(s - top) for s in scores]
+        total = sum(exps)
+        return [e / total for e in exps]
+
+    def predict(self, text):
+        """(family, probability) of the likeliest family."""
+        probs = self._probabilities(features(text))
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.classes[best], probs[best]
+
+    def fit(self, samples, epochs=15, rate=0.5, l2=1e-4, seed=0):
+        """Plain SGD over (text, family) pairs."""
+        rows = [(features(text), self.classes.index(label)) for text, label in samples if label in self.classes]
+        rng = random.Random(seed)
+        k = len(self.classes)
+        for _ in range(epochs):
+            rng.shuffle(rows)
+            for feats, y in rows:
+                probs = self._probabilities(feats)
+                scale = 1 / math.sqrt(len(feats) or 1)
+                for c in range(k):
+                    grad = probs[c] - (c == y)
+                    self.bias[c] -= rate * grad
+                    for f in feats:
+                        w = self.weights.setdefault(f, [0.0] * k)
+                        w[c] -= rate * (grad * scale + l2 * w[c])
+        return self
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"classes": self.classes, "bias": self.bias,
+                       "weights": {str(b): [round(v, 5) for v in w] for b, w in self.weights.items()}}, f)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            raw = json.load(f)
+        return cls(raw["classes"], {int(b): w for b, w in raw["weights"].items()}, raw["bias"])
+
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def model():
+    """The saved model, or one fitted on SEED the first time it is needed."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                try:
+                    _model = Classifier.load(INTENT_MODEL_FILE)
+                except FileNotFoundError:
+                    _model = Classifier().fit(_family_samples(SEED))
+                except (OSError, ValueError, KeyError) as e:
+                    logging.error("Ignoring %s: %s", INTENT_MODEL_FILE, e)
+                    _model = Classifier().fit(_family_samples(SEED))
+    return _model
+
+
+def predict(text):
+    """(family, probability) for a user message."""
+    return model().predict(text)
+
+
+def _family_samples(pairs):
+    return [(text, FAMILY_OF[intent]) for text, intent in pairs if intent in FAMILY_OF]
+
+# ---------- TRAINING DATA ----------
+_log_lock = threading.Lock()
+
+
+def log_example(message, intent):
+    """Append a (message, intent) pair the bot acted on to INTENT_LOG."""
+    if not INTENT_LOG or not message or intent not in FAMILY_OF:
+        return
+    line = json.dumps({"text": message, "intent": intent}, ensure_ascii=False)
+    try:
+        with _log_lock:
+            with open(INTENT_LOG, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+                full = f.tell() >= INTENT_LOG_MAX_BYTES
+            if full:
+                os.replace(INTENT_LOG, INTENT_LOG + ".1")
+    except OSError as e:
+        logging.error("Could not log intent example: %s", e)
+
+
+def read_log(path=INTENT_LOG):
+    """(message, intent) pairs from the rotated log, then the current one."""
+    pairs = []
+    for name in (path + ".1", path):
+        try:
+            with open(name, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        pairs.append((entry["text"], entry["intent"]))
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+    return pairs
+
+
+def train(log_path=INTENT_LOG, model_path=INTENT_MODEL_FILE):
+    """Fit on SEED plus the logged traffic (latest label per message) and save."""
+    global _model
+    latest = dict(SEED)
+    latest.update((" ".join(text.casefold().split()), intent) for text, intent in read_log(log_path))
+    samples = _family_samples(latest.items())
+    clf = Classifier().fit(samples)
+    clf.save(model_path)
+    with _model_lock:
+        _model = clf
+    correct = sum(clf.predict(text)[0] == family for text, family in samples)
+    return len(samples), correct
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] != ["train"]:
+        sys.exit("usage: python -m intent_classifier train [LOG] [MODEL]")
+    n, correct = train(*sys.argv[2:4])
+    print(f"trained on {n} messages, {correct}/{n} fit")
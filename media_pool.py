@@ -0,0 +1,102 @@
+# media_pool.py - bounded worker pool for voice notes and TTS
+#
+# Voice notes are not handled inline: voice_handler submits a job and
+# returns, so the next update (often a text message) is not stuck behind
+# ffmpeg, STT and gTTS. MEDIA_WORKERS jobs run at a time from a queue of at
+# most MEDIA_QUEUE_SIZE, and one chat may have at most MEDIA_PER_CHAT jobs
+# queued or running, so a single busy counter cannot crowd out the others.
+# Blocking media calls (ffmpeg, STT, gTTS) go through run(), which uses a
+# thread pool of the same size, so there are never more than MEDIA_WORKERS
+# ffmpeg processes however many voice notes arrive.
+import os
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import metrics
+
+load_dotenv()
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))
+MEDIA_QUEUE_SIZE = int(os.getenv("MEDIA_QUEUE_SIZE", "8"))
+MEDIA_PER_CHAT = int(os.getenv("MEDIA_PER_CHAT", "2"))
+
+# submit() outcomes
+STARTED, QUEUED, BUSY, FULL = "started", "queued", "busy", "full"
+
+
+class MediaPool:
+    """asyncio job queue with a fixed number of worker tasks and a per-chat cap."""
+
+    def __init__(self, workers=MEDIA_WORKERS, queue_size=MEDIA_QUEUE_SIZE, per_chat=MEDIA_PER_CHAT):
+        self.workers = workers
+        self.per_chat = per_chat
+        self._queue_size = queue_size
+        self._queue = None  # created on first submit, inside the running loop
+        self._loop = None
+        self._tasks = []
+        self._per_chat = {}  # chat id -> jobs queued or running
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media")
+
+    def _start(self):
+        loop = self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+        self._tasks, self._per_chat = [], {}
+        for _ in range(self.workers):
+            # workers start from an empty context, not the submitting update's
+            # metrics scope; each job is tracked on its own
+            self._tasks.append(contextvars.Context().run(loop.create_task, self._worker()))
+
+    def pending(self, chat_id=None):
+        """Jobs queued or running, for one chat or in total."""
+        if chat_id is not None:
+            return self._per_chat.get(chat_id, 0)
+        return sum(self._per_chat.values())
+
+    def submit(self, chat_id, job, *args):
+        """
+        Queue `await job(*args)`. Returns STARTED (a worker is free), QUEUED
+        (it waits behind others), or BUSY / FULL when it was refused because
+        this chat or the whole queue is at its limit.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            self._start()  # first use, or the previous loop is gone (tests, restarts)
+        if self._per_chat.get(chat_id, 0) >= self.per_chat:
+            outcome = BUSY
+        elif self._queue.full():
+            outcome = FULL
+        else:
+            outcome = STARTED if self.pending() < self.workers else QUEUED
+            self._per_chat[chat_id] = self._per_chat.get(chat_id, 0) + 1
+            self._queue.put_nowait((chat_id, job, args, time.perf_counter()))
+        metrics.inc("media_jobs_total", "Media jobs by submit outcome", outcome=outcome)
+        metrics.observe("media_queue_depth", self._queue.qsize(), "Media jobs waiting when one is submitted",
+                        buckets=metrics.COUNT_BUCKETS)
+        return outcome
+
+    async def _worker(self):
+        while True:
+            chat_id, job, args, queued_at = await self._queue.get()
+            metrics.observe("media_queue_wait_seconds", time.perf_counter() - queued_at,
+                            "Time a media job waited for a worker")
+            try:
+                await job(*args)
+            except Exception:
+                logging.exception("Media job failed")
+            finally:
+                left = self._per_chat.get(chat_id, 1) - 1
+                if left > 0:
+                    self._per_chat[chat_id] = left
+                else:
+                    self._per_chat.pop(chat_id, None)
+                self._queue.task_done()
+
+    async def run(self, fn, *args):
+        """Run a blocking media call (ffmpeg, STT, TTS) on the media threads."""
+        ctx = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, ctx.run, fn, *args)
+
+
+pool = MediaPool()
@@ -0,0 +1,202 @@
+# metrics.py - in-process latency histograms and counters, Prometheus text format
+import time
+import threading
+import contextvars
+from functools import wraps
+from contextlib import contextmanager, nullcontext
+
+import tracing
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+# intents come from the LLM; don't let a creative model explode the label set
+MAX_LABEL_VALUES = 64
+
+_lock = threading.Lock()
+_metrics = {}  # name -> _Counter | _Histogram
+
+
+class _Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}  # label tuple -> float
+
+    def inc(self, labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def lines(self):
+        for labels, value in sorted(self.values.items()):
+            yield f"{self.name}{_fmt(labels)} {_num(value)}"
+
+
+class _Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.values = {}  # label tuple -> [bucket counts..., sum, count]
+
+    def observe(self, labels, value):
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def lines(self):
+        for labels, row in sorted(self.values.items()):
+            for bound, n in zip(self.buckets, row):
+                yield f"{self.name}_bucket{_fmt(labels + (('le', _num(bound)),))} {n}"
+            yield f"{self.name}_bucket{_fmt(labels + (('le', '+Inf'),))} {row[-1]}"
+            yield f"{self.name}_sum{_fmt(labels)} {_num(row[-2])}"
+            yield f"{self.name}_count{_fmt(labels)} {row[-1]}"
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _get(name, factory):
+    metric = _metrics.get(name)
+    if metric is None:
+        metric = _metrics[name] = factory()
+    return metric
+
+
+def _labels(metric, labels):
+    key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+    if key not in metric.values and len(metric.values) >= MAX_LABEL_VALUES:
+        key = tuple((k, "other") for k, _ in key)
+    return key
+
+
+def inc(name, help_text="", amount=1, **labels):
+    with _lock:
+        metric = _get(name, lambda: _Counter(name, help_text))
+        metric.inc(_labels(metric, labels), amount)
+
+
+def observe(name, value, help_text="", buckets=LATENCY_BUCKETS, **labels):
+    with _lock:
+        metric = _get(name, lambda: _Histogram(name, help_text, buckets))
+        metric.observe(_labels(metric, labels), value)
+
+
+def render():
+    """All metrics in Prometheus text exposition format."""
+    with _lock:
+        out = []
+        for name in sorted(_metrics):
+            metric = _metrics[name]
+            if metric.help:
+                out.append(f"# HELP {name} {metric.help}")
+            out.append(f"# TYPE {name} {metric.kind}")
+            out.extend(metric.lines())
+        return "\n".join(out) + "\n"
+
+# ---------- TIMERS ----------
+@contextmanager
+def timer(name, help_text="", **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, help_text, **labels)
+
+
+def timed(name, help_text="", **labels):
+    """Decorator form of timer() for sync functions."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(name, help_text, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def stage(name):
+    """Media pipeline stage: stt, tts, pdf, ffmpeg..."""
+    return timer("bot_stage_latency_seconds", "Latency of STT/TTS/PDF/ffmpeg stages", stage=name)
+
+# ---------- PER-UPDATE SCOPE ----------
+# One scope per incoming update, so Sheets calls and tokens can be
+# attributed to the intent that caused them.
+_scope = contextvars.ContextVar("metrics_scope", default=None)
+
+
+def current_scope():
+    return _scope.get()
+
+
+def set_intent(intent):
+    scope = _scope.get()
+    if scope is not None:
+        scope["intent"] = intent or "unknown"
+
+
+def track_update(handler_name):
+    """
+    Decorator for async Telegram handlers. Nested handlers (menu_handler ->
+    handle_message) share the outer scope, so each update is counted once.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        async def wrapper(*args, **kwargs):
+            if _scope.get() is not None:
+                return await fn(*args, **kwargs)
+
+            scope = {"intent": "unknown", "sheets_calls": 0}
+            token = _scope.set(scope)
+            start = time.perf_counter()
+            calls = None
+            try:
+                with tracing.recording() if tracing.TRACE_ENABLED else nullcontext() as calls:
+                    return await fn(*args, **kwargs)
+            finally:
+                _scope.reset(token)
+                if calls is not None:
+                    tracing.log_trace(scope["intent"], calls)
+                observe("bot_intent_latency_seconds", time.perf_counter() - start,
+                        "End-to-end handler latency per intent",
+                        handler=handler_name, intent=scope["intent"])
+                observe("bot_sheets_calls_per_update", scope["sheets_calls"],
+                        "Sheets API requests made while handling one update",
+                        buckets=COUNT_BUCKETS, intent=scope["intent"])
+        return wrapper
+    return decorate
+
+
+def count_sheets_call(method):
+    inc("sheets_api_calls_total", "Sheets API requests sent", method=method)
+    scope = _scope.get()
+    if scope is not None:
+        scope["sheets_calls"] += 1
+
+
+def count_llm_tokens(model, prompt_tokens, completion_tokens):
+    inc("llm_tokens_total", "LLM tokens", amount=prompt_tokens or 0, model=model, direction="in")
+    inc("llm_tokens_total", "LLM tokens", amount=completion_tokens or 0, model=model, direction="out")
+
+
+def add_metrics_route():
+    import status_server
+    status_server.add_route("/metrics", lambda: (200, "text/plain; version=0.0.4; charset=utf-8", render()))
@@ -0,0 +1,270 @@
+# product_index.py - resolve free-text product names to one canonical Inventory row
+#
+# "dell laptop", "Dell Laptops" and "डेल लैपटॉप" should all land on the same
+# row. Names are normalized (Devanagari -> Latin, lowercase, plurals
+# stripped). Lookups try the exact key, the key without spaces, a rough
+# phonetic key (only across scripts, where transliteration spelling varies),
+# and finally trigram similarity for typos.
+import os
+import re
+import math
+import unicodedata
+
+# Dice similarity (0..1) a typo match needs; exact and phonetic hits always win
+PRODUCT_MATCH_THRESHOLD = float(os.getenv("PRODUCT_MATCH_THRESHOLD", "0.7"))
+# fuzzy matches must be about the same length, so "laptop bag" != "laptop"
+MIN_LENGTH_RATIO = 0.8
+
+# ---------- TRANSLITERATION ----------
+_CONSONANTS = {
+    "क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n",
+    "च": "ch", "छ": "chh", "ज": "j", "झ": "jh", "ञ": "n",
+    "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh", "ण": "n",
+    "त": "t", "थ": "th", "द": "d", "ध": "dh", "न": "n",
+    "प": "p", "फ": "f", "ब": "b", "भ": "bh", "म": "m",
+    "य": "y", "र": "r", "ल": "l", "व": "v",
+    "श": "sh", "ष": "sh", "स": "s", "ह": "h",
+    "क़": "q", "ख़": "kh", "ग़": "g", "ज़": "z", "ड़": "r", "ढ़": "rh", "फ़": "f",
+}
+_VOWELS = {
+    "अ": "a", "आ": "aa", "इ": "i", "ई": "ii", "उ": "u", "ऊ": "uu", "ऋ": "ri",
+    "ए": "e", "ऐ": "ai", "ओ": "o", "औ": "au", "ऑ": "o", "ऍ": "e",
+}
+_MATRAS = {
+    "ा": "aa", "ि": "i", "ी": "ii", "ु": "u", "ू": "uu", "ृ": "ri",
+    "े": "e", "ै": "ai", "ो": "o", "ौ": "au", "ॉ": "o", "ॅ": "e",
+}
+_VIRAMA = "्"
+_NUKTA = "़"
+_SIGNS = {"ं": "n", "ँ": "n", "ः": "h"}
+_DIGITS = {chr(0x0966 + i): str(i) for i in range(10)}
+
+
+def transliterate(text):
+    """
+    Devanagari -> Latin. The inherent 'a' is dropped at word ends and in the
+    VC_CV position (Hindi schwa deletion): लैपटॉप -> laiptop, कमरा -> kamraa.
+    """
+    # units: [latin, vowel, is_consonant]; vowel "a" marks a pending inherent a
+    units = []
+    chars = unicodedata.normalize("NFC", text)
+    i = 0
+    while i < len(chars):
+        ch = chars[i]
+        if i + 1 < len(chars) and chars[i + 1] == _NUKTA:
+            ch += _NUKTA
+            i += 1
+        if ch in _CONSONANTS:
+            units.append([_CONSONANTS[ch], "a", True])
+        elif ch in _MATRAS and units and units[-1][2]:
+            units[-1][1] = _MATRAS[ch]
+        elif ch == _VIRAMA and units and units[-1][2]:
+            units[-1][1] = ""
+        elif ch in _VOWELS:
+            units.append([_VOWELS[ch], "", False])
+        elif ch in _SIGNS:
+            units.append([_SIGNS[ch], "", False])
+        elif ch != _NUKTA:
+            units.append([_DIGITS.get(ch, ch), "", None])  # not a letter: ends the word
+        i += 1
+
+    def voiced(unit):
+        return unit is not None and unit[2] is not None and (unit[2] is False or unit[1] != "")
+
+    for i in range(len(units) - 1, -1, -1):
+        unit = units[i]
+        if not unit[2] or unit[1] != "a":
+            continue
+        nxt = units[i + 1] if i + 1 < len(units) else None
+        prev = units[i - 1] if i > 0 else None
+        if nxt is None or nxt[2] is None:
+            unit[1] = ""
+        elif nxt[2] and voiced(nxt) and voiced(prev):
+            unit[1] = ""
+    return "".join(latin + (vowel or "") for latin, vowel, _ in units)
+
+# ---------- NORMALIZATION ----------
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_VOWEL_RUN = re.compile(r"[aeiou]+")
+_REPEATS = re.compile(r"(.)\1+")
+
+
+def _singular(token):
+    if len(token) <= 3 or token.isdigit():
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("ches", "shes", "xes", "sses")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def normalize(name):
+    """Lowercase Latin words, singular, single spaces: 'Dell  Laptops!' -> 'dell laptop'."""
+    text = str(name or "")
+    if not text.isascii():
+        text = transliterate(text)
+    text = text.lower()
+    return " ".join(_singular(t) for t in _NON_WORD.split(text) if t)
+
+
+def fold(key):
+    """
+    Phonetic key of a normalized name, spaces removed. Spelling variants from
+    transliteration collapse: 'dell laptop' and 'del laiptop' -> 'dallaptap'.
+    """
+    out = []
+    for token in key.split():
+        if not token.isdigit():
+            token = token.replace("ph", "f").replace("w", "v").replace("c", "k").replace("q", "k")
+            if len(token) > 3 and token.endswith("e"):
+                token = token[:-1]
+            token = _VOWEL_RUN.sub("a", token)
+        out.append(token)
+    return _REPEATS.sub(r"\1", "".join(out))
+
+
+def trigrams(folded):
+    padded = f" {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _is_devanagari(text):
+    return any("\u0900" <= ch <= "\u097f" for ch in str(text or ""))
+
+
+def _numbers(key):
+    # model numbers must match exactly: "iphone 13" is never "iphone 14"
+    return frozenset(t for t in key.split() if any(c.isdigit() for c in t))
+
+# ---------- INDEX ----------
+class _GramIndex:
+    """key -> entry with trigram postings for fuzzy lookups. First key wins."""
+
+    def __init__(self):
+        self.entries = {}
+        self._grams = {}  # trigram -> set of keys
+        self._gram_sets = {}  # key -> its trigrams
+        self._numbers = {}  # key -> digit tokens of the name
+        self._by_numbers = {}  # digit tokens -> keys, for names with model numbers
+
+    def add(self, key, numbers, entry):
+        if key in self.entries:
+            return self.entries[key]
+        self.entries[key] = entry
+        grams = trigrams(key)
+        self._gram_sets[key] = grams
+        self._numbers[key] = numbers
+        if numbers:
+            self._by_numbers.setdefault(numbers, set()).add(key)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(key)
+        return entry
+
+    def best(self, key, numbers, threshold, accept=lambda entry: True):
+        """Entry whose key is most similar (Dice over trigrams) and >= threshold."""
+        grams = trigrams(key)
+        if numbers:
+            # numbers must match exactly, which already narrows it to a handful
+            return self._best_of(self._by_numbers.get(numbers, ()), key, numbers, grams, threshold, accept)
+        # Anything scoring >= t shares at least t*|A|/(2-t) trigrams with the
+        # query, so it holds one of the |A|-that+1 rarest of them. Only those
+        # short posting lists are scanned (prefix filtering).
+        needed = math.ceil(threshold * len(grams) / (2 - threshold))
+        rare = sorted(grams, key=lambda g: len(self._grams.get(g, ())))
+        candidates = set()
+        for gram in rare[:len(grams) - needed + 1]:
+            candidates.update(self._grams.get(gram, ()))
+        return self._best_of(candidates, key, numbers, grams, threshold, accept)
+
+    def _best_of(self, candidates, key, numbers, grams, threshold, accept):
+        shortest = MIN_LENGTH_RATIO * len(key)
+        longest = len(key) / MIN_LENGTH_RATIO
+        size = len(grams)
+        best, best_score = None, threshold
+        for candidate in candidates:
+            if not shortest <= len(candidate) <= longest or self._numbers[candidate] != numbers:
+                continue
+            other = self._gram_sets[candidate]
+            score = 2 * len(grams & other) / (size + len(other))
+            if score < best_score or not accept(self.entries[candidate]):
+                continue
+            if score > best_score or best is None or candidate < best:
+                best, best_score = candidate, score
+        return self.entries[best] if best is not None else None
+
+
+class ProductIndex:
+    """
+    name -> (canonical name, sheet row). The first row registered for a
+    product wins, matching the old first-match scan. Latin names are compared
+    by spelling; phonetic keys are only used when one side is Devanagari, so
+    "pen" and "pan" stay different products. Not thread safe; callers lock.
+    """
+
+    def __init__(self, threshold=PRODUCT_MATCH_THRESHOLD):
+        self.threshold = threshold
+        self._exact = {}  # normalized key -> entry
+        self._spelling = _GramIndex()  # normalized key without spaces
+        self._phonetic = _GramIndex()  # fold() key
+        self._devanagari = set()  # rows whose sheet name is written in Devanagari
+
+    def __len__(self):
+        return len(self._exact)
+
+    def add(self, name, row):
+        """Register a sheet row. Returns the entry the name now resolves to."""
+        key = normalize(name)
+        if not key:
+            return None
+        entry = self._known(name, key)
+        if entry is not None:
+            # a duplicate row, or the same product written in the other script
+            self._exact.setdefault(key, entry)
+            return entry
+        entry = (str(name).strip(), row)
+        if _is_devanagari(name):
+            self._devanagari.add(row)
+        numbers = _numbers(key)
+        self._exact[key] = entry
+        self._spelling.add(key.replace(" ", ""), numbers, entry)
+        self._phonetic.add(fold(key), numbers, entry)
+        return entry
+
+    def lookup(self, name):
+        """(canonical name, row) for the closest registered product, or None."""
+        key = normalize(name)
+        if not key:
+            return None
+        entry = self._known(name, key)
+        if entry is not None:
+            return entry
+        numbers = _numbers(key)
+        entry = self._spelling.best(key.replace(" ", ""), numbers, self.threshold)
+        if entry is None and self._has_other_script(name):
+            entry = self._phonetic.best(fold(key), numbers, self.threshold, self._cross_script(name))
+        return entry
+
+    def _known(self, name, key):
+        """Entry for an exact, spacing or (across scripts) phonetic match."""
+        entry = self._exact.get(key) or self._spelling.entries.get(key.replace(" ", ""))
+        if entry is not None:
+            return entry
+        entry = self._phonetic.entries.get(fold(key))
+        accept = self._cross_script(name)
+        if entry is not None and accept(entry):
+            return entry
+        return None
+
+    def _has_other_script(self, name):
+        if _is_devanagari(name):
+            return len(self._devanagari) < len(self._spelling.entries)
+        return bool(self._devanagari)
+
+    def _cross_script(self, name):
+        # a Latin query may only match a Devanagari row phonetically, and vice versa
+        if _is_devanagari(name):
+            return lambda entry: entry[1] not in self._devanagari
+        return lambda entry: entry[1] in self._devanagari
@@ -0,0 +1,58 @@
+# status_server.py - tiny local HTTP server for health/readiness probes
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# path -> callable returning (status_code, content_type, body_text)
+_routes = {}
+_server = None
+
+
+def add_route(path, handler):
+    _routes[path] = handler
+
+
+def _text(status, body):
+    return status, "text/plain; charset=utf-8", body
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        handler = _routes.get(self.path.split("?", 1)[0])
+        if handler is None:
+            status, ctype, body = _text(404, "not found\n")
+        else:
+            try:
+                status, ctype, body = handler()
+            except Exception as e:
+                logging.error("Status route %s failed: %s", self.path, e)
+                status, ctype, body = _text(500, "error\n")
+
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # probes hit this every few seconds; keep them out of the bot log
+        pass
+
+
+def add_health_routes(is_ready):
+    """/healthz = process is alive, /readyz = bot is accepting updates."""
+    add_route("/healthz", lambda: _text(200, "ok\n"))
+    add_route("/readyz", lambda: _text(200, "ready\n") if is_ready() else _text(503, "starting\n"))
+
+
+def start(host, port):
+    """Serve registered routes from a daemon thread. Safe to call twice."""
+    global _server
+    if _server is not None:
+        return _server
+    _server = ThreadingHTTPServer((host, port), _Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="status-server", daemon=True).start()
+    logging.info("Status server on http://%s:%d", host, port)
+    return _server
@@ -0,0 +1,155 @@
+# stock_alerts.py - low-stock tracking from quantity writes, with owner alerts
+#
+# google_sheets reports every Inventory quantity it writes (and every row it
+# loads into the product index), so the current level of each product is
+# in memory and "what is low?" needs no sheet scan; the levels are reloaded
+# from the sheet every SHEETS_INDEX_TTL, so writes made by other processes
+# show up too. When a write in this process takes a product from above its
+# threshold to at/below it, an alert is queued; the
+# bot sends queued alerts to OWNER_CHAT_ID from a JobQueue job. Alerts wait
+# STOCK_ALERT_DELAY seconds first (a restock in the meantime cancels them)
+# and a product alerts at most once per STOCK_ALERT_COOLDOWN.
+import os
+import json
+import time
+import logging
+import threading
+from dotenv import load_dotenv
+
+from product_index import normalize
+
+load_dotenv()
+OWNER_CHAT_ID = os.getenv("OWNER_CHAT_ID") or None
+LOW_STOCK_THRESHOLD = float(os.getenv("LOW_STOCK_THRESHOLD", "5"))
+# {"Product name": threshold} overrides, editable by hand or via set_threshold()
+STOCK_THRESHOLDS_FILE = os.getenv("STOCK_THRESHOLDS_FILE", "stock_thresholds.json")
+STOCK_ALERT_DELAY = float(os.getenv("STOCK_ALERT_DELAY", "10"))
+STOCK_ALERT_COOLDOWN = float(os.getenv("STOCK_ALERT_COOLDOWN", str(6 * 3600)))
+
+
+def _quantity(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class StockWatcher:
+    """Product -> last known quantity, plus which products are low. Thread safe."""
+
+    def __init__(self, thresholds_file=STOCK_THRESHOLDS_FILE, default=LOW_STOCK_THRESHOLD, alerts=bool(OWNER_CHAT_ID)):
+        self.default = default
+        self.alerts = alerts
+        self._file = thresholds_file
+        self._thresholds = self._load_thresholds()  # normalized name -> threshold
+        self._levels = {}  # normalized name -> (name, quantity)
+        self._low = set()  # normalized names at/below their threshold
+        self._pending = {}  # normalized name -> queued at (monotonic)
+        self._alerted = {}  # normalized name -> last alert sent (monotonic)
+        self._lock = threading.Lock()
+
+    def _load_thresholds(self):
+        try:
+            with open(self._file, encoding="utf-8") as f:
+                return {normalize(name): float(limit) for name, limit in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as e:
+            logging.error("Ignoring %s: %s", self._file, e)
+            return {}
+
+    def threshold(self, product):
+        return self._thresholds.get(normalize(product), self.default)
+
+    def set_threshold(self, product, limit):
+        """Per-product threshold, saved to STOCK_THRESHOLDS_FILE."""
+        with self._lock:
+            key = normalize(product)
+            self._thresholds[key] = float(limit)
+            saved = {self._levels.get(k, (k, 0))[0]: v for k, v in self._thresholds.items()}
+            with open(self._file, "w", encoding="utf-8") as f:
+                json.dump(saved, f, ensure_ascii=False, indent=2)
+            if key in self._levels:
+                self._classify(key, self._levels[key][1], seed=True)
+
+    def observe(self, product, quantity, seed=False):
+        """
+        Record a product's quantity. seed=True (rows loaded from the sheet)
+        updates the state silently; a write that crosses the threshold queues
+        an alert.
+        """
+        key = normalize(product)
+        if not key:
+            return
+        with self._lock:
+            name = self._levels.get(key, (str(product).strip(), 0))[0]
+            self._levels[key] = (name, _quantity(quantity))
+            self._classify(key, _quantity(quantity), seed)
+
+    def seed(self, levels):
+        """
+        Replace every level with [(product, quantity)] loaded from the sheet,
+        silently: products gone from the sheet are dropped, alerts still
+        queued for products that are low stay queued.
+        """
+        levels = [(normalize(product), str(product).strip(), quantity) for product, quantity in levels]
+        with self._lock:
+            self._levels.clear()
+            self._low.clear()
+            for key, name, quantity in levels:
+                if key:
+                    self._levels[key] = (name, _quantity(quantity))
+                    self._classify(key, _quantity(quantity), True)
+            for key in list(self._pending):
+                if key not in self._low:
+                    del self._pending[key]
+
+    def _classify(self, key, quantity, seed):
+        low = quantity <= self._thresholds.get(key, self.default)
+        if low and key not in self._low and not seed and self.alerts:
+            self._pending.setdefault(key, time.monotonic())
+        if low:
+            self._low.add(key)
+        else:
+            self._low.discard(key)
+            self._pending.pop(key, None)  # restocked before the alert went out
+
+    def due_alerts(self):
+        """[(name, quantity, threshold)] ready to send now; marks them sent."""
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            for key, queued in list(self._pending.items()):
+                if now - queued < STOCK_ALERT_DELAY:
+                    continue
+                del self._pending[key]
+                if key not in self._low or now - self._alerted.get(key, -STOCK_ALERT_COOLDOWN) < STOCK_ALERT_COOLDOWN:
+                    continue
+                self._alerted[key] = now
+                name, quantity = self._levels[key]
+                due.append((name, quantity, self._thresholds.get(key, self.default)))
+        return due
+
+    def low_items(self, threshold=None):
+        """[(name, quantity)] at/below their own threshold, or below `threshold` if given."""
+        with self._lock:
+            if threshold is None:
+                items = [self._levels[key] for key in self._low]
+            else:
+                items = [level for level in self._levels.values() if level[1] <= threshold]
+        return sorted(items, key=lambda item: (item[1], item[0]))
+
+    def reset(self):
+        with self._lock:
+            self._levels.clear()
+            self._low.clear()
+            self._pending.clear()
+
+
+watcher = StockWatcher()
+
+
+def format_alert(items):
+    lines = ["⚠️ Low stock alert:"]
+    lines += [f"• {name}: {quantity:g} left (alert at {limit:g})" for name, quantity, limit in items]
+    return "\n".join(lines)
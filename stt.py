@@ -0,0 +1,145 @@
+# stt.py - speech-to-text behind one interface
+#
+#   STT_BACKEND=google   Google's web recognizer via speech_recognition (default)
+#   STT_BACKEND=vosk     offline Vosk models on the CPU, one per language
+#
+# Both take the mono 16 kHz WAV that audio.prepare_for_stt produces, try
+# every language in STT_LANGUAGES and keep the longest transcript. The Vosk
+# models are loaded once (warm() does it at startup) and shared by all
+# recognitions; each call gets its own recognizer, so calls can run in
+# parallel worker threads. The Google backend has nothing to warm: it
+# imports speech_recognition on the first voice note.
+import os
+import json
+import wave
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import tracing
+
+load_dotenv()
+STT_BACKEND = os.getenv("STT_BACKEND", "google").lower()
+STT_LANGUAGES = tuple(lang.strip() for lang in os.getenv("STT_LANGUAGES", "hi-IN,en-IN").split(",") if lang.strip())
+# language -> Vosk model directory, e.g. VOSK_MODEL_HI_IN=models/vosk-model-small-hi-0.22
+VOSK_MODEL_DIR = os.getenv("VOSK_MODEL_DIR", "models")
+_VOSK_DEFAULTS = {"hi-IN": "vosk-model-small-hi-0.22", "en-IN": "vosk-model-small-en-in-0.4"}
+
+
+class STTUnavailable(Exception):
+    """The recognizer could not be reached or loaded (as opposed to: it heard nothing)."""
+
+
+def _best(results):
+    results = [(text, lang) for text, lang in results if text]
+    if not results:
+        return "", STT_LANGUAGES[-1] if STT_LANGUAGES else "en-IN"
+    return max(results, key=lambda r: len(r[0]))
+
+
+class GoogleSTT:
+    name = "google"
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="stt")
+
+    def warm(self):
+        pass  # nothing to load ahead: speech_recognition is imported on first use
+
+    def _recognize(self, recognizer, audio_data, lang):
+        import speech_recognition as sr
+        try:
+            with tracing.span("stt", lang):
+                return recognizer.recognize_google(audio_data, language=lang), lang, None
+        except sr.UnknownValueError:
+            return "", lang, None
+        except (sr.RequestError, OSError) as e:
+            return "", lang, e
+
+    def transcribe(self, wav_path, languages=STT_LANGUAGES):
+        import speech_recognition as sr
+        recognizer = sr.Recognizer()
+        with sr.AudioFile(wav_path) as source:
+            audio_data = recognizer.record(source)
+        # one request per language, sent together rather than one after another
+        # each in a copy of this context, so the stt spans land in the caller's trace
+        futures = [self._pool.submit(contextvars.copy_context().run, self._recognize, recognizer, audio_data, lang)
+                   for lang in languages]
+        results = [f.result() for f in futures]
+        errors = [e for _, _, e in results if e is not None]
+        if errors and len(errors) == len(results):
+            raise STTUnavailable(str(errors[0]))
+        return _best((text, lang) for text, lang, _ in results)
+
+
+class VoskSTT:
+    name = "vosk"
+
+    def __init__(self):
+        self._models = {}  # language -> vosk.Model
+        self._lock = threading.Lock()
+
+    def _model_path(self, lang):
+        env = os.getenv("VOSK_MODEL_" + lang.upper().replace("-", "_"))
+        return env or os.path.join(VOSK_MODEL_DIR, _VOSK_DEFAULTS.get(lang, lang))
+
+    def _model(self, lang):
+        model = self._models.get(lang)
+        if model is None:
+            with self._lock:
+                model = self._models.get(lang)
+                if model is None:
+                    try:
+                        import vosk
+                        vosk.SetLogLevel(-1)
+                        model = vosk.Model(self._model_path(lang))
+                    except Exception as e:  # ImportError, or vosk's own "failed to create a model"
+                        raise STTUnavailable(f"Vosk model for {lang}: {e}") from e
+                    self._models[lang] = model
+        return model
+
+    def warm(self):
+        for lang in STT_LANGUAGES:
+            self._model(lang)
+
+    def _recognize(self, wav_path, lang):
+        import vosk
+        with wave.open(wav_path, "rb") as w, tracing.span("stt", f"vosk-{lang}"):
+            recognizer = vosk.KaldiRecognizer(self._model(lang), w.getframerate())
+            while True:
+                frames = w.readframes(4000)
+                if not frames:
+                    break
+                recognizer.AcceptWaveform(frames)
+            return json.loads(recognizer.FinalResult()).get("text", "")
+
+    def transcribe(self, wav_path, languages=STT_LANGUAGES):
+        return _best((self._recognize(wav_path, lang), lang) for lang in languages)
+
+
+BACKENDS = {"google": GoogleSTT, "vosk": VoskSTT}
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        if STT_BACKEND not in BACKENDS:
+            logging.error("Unknown STT_BACKEND %r, using google", STT_BACKEND)
+        _backend = BACKENDS.get(STT_BACKEND, GoogleSTT)()
+    return _backend
+
+
+def transcribe(wav_path, languages=STT_LANGUAGES):
+    """(text, language) for a mono WAV; ("", lang) if nothing was recognized."""
+    return backend().transcribe(wav_path, languages)
+
+
+def warm():
+    """Load the engine (and its models) now instead of on the first voice note."""
+    try:
+        backend().warm()
+    except Exception as e:
+        logging.error("STT warm-up failed, will retry on first use: %s", e)
@@ -0,0 +1,75 @@
+# tracing.py - record every outbound call (Sheets, LLM, STT, TTS) made for one update
+import os
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+
+# API_TRACE=1 logs the call list of every update together with its intent
+TRACE_ENABLED = os.getenv("API_TRACE", "0") == "1"
+
+# Sheets requests that download a whole table rather than a cell/range
+DOWNLOAD_METHODS = {"get_all_records", "get_all_values", "col_values"}
+
+_calls = contextvars.ContextVar("api_trace", default=None)
+
+
+class Call:
+    __slots__ = ("kind", "name", "seconds")
+
+    def __init__(self, kind, name, seconds):
+        self.kind = kind
+        self.name = name
+        self.seconds = seconds
+
+    def __repr__(self):
+        return f"{self.kind}.{self.name}({self.seconds * 1000:.1f}ms)"
+
+
+@contextmanager
+def recording():
+    """Collect every outbound call made inside the block (nested blocks share the list)."""
+    calls = _calls.get()
+    if calls is not None:
+        yield calls
+        return
+    calls = []
+    token = _calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _calls.reset(token)
+
+
+def active():
+    return _calls.get() is not None
+
+
+@contextmanager
+def span(kind, name):
+    """Time one outbound call and add it to the current recording, if any."""
+    calls = _calls.get()
+    if calls is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        calls.append(Call(kind, name, time.perf_counter() - start))
+
+
+def summarize(calls):
+    """{"sheets": n, "downloads": n, "llm": n, "stt": n, "tts": n}"""
+    counts = {"sheets": 0, "downloads": 0, "llm": 0, "stt": 0, "tts": 0}
+    for call in calls:
+        counts[call.kind] = counts.get(call.kind, 0) + 1
+        if call.kind == "sheets" and call.name in DOWNLOAD_METHODS:
+            counts["downloads"] += 1
+    return counts
+
+
+def log_trace(intent, calls):
+    counts = summarize(calls)
+    logging.info("TRACE intent=%s %s calls=%s", intent,
+                 " ".join(f"{k}={v}" for k, v in counts.items() if v), calls)
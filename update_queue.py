@@ -0,0 +1,86 @@
+# update_queue.py - local SQLite queue between the intake process and workers
+import time
+import sqlite3
+
+UPDATE_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS updates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    shard INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS updates_shard_state ON updates (shard, state, id);
+"""
+
+
+def connect(path):
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def shard_for(chat_id, shards):
+    """Same chat -> same shard -> same worker, so per-chat order is kept."""
+    return (chat_id or 0) % shards
+
+
+def put(conn, shard, payload):
+    conn.execute(
+        "INSERT INTO updates (shard, payload, created_at) VALUES (?, ?, ?)",
+        (shard, payload, time.time()),
+    )
+
+
+def claim(conn, shard):
+    """Take the oldest queued update of a shard. Returns (id, payload) or None."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id, payload FROM updates WHERE shard = ? AND state = 'queued' ORDER BY id LIMIT 1",
+            (shard,),
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE updates SET state = 'running', attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                (time.time(), row[0]),
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row
+
+
+def done(conn, update_id):
+    conn.execute("DELETE FROM updates WHERE id = ?", (update_id,))
+
+
+def recover(conn, shard, max_attempts=UPDATE_MAX_ATTEMPTS):
+    """
+    Called when a worker (re)starts: whatever its predecessor was running is
+    queued again, unless it already crashed a worker max_attempts times.
+    """
+    conn.execute(
+        "UPDATE updates SET state = 'failed' WHERE shard = ? AND state = 'running' AND attempts >= ?",
+        (shard, max_attempts),
+    )
+    cur = conn.execute(
+        "UPDATE updates SET state = 'queued' WHERE shard = ? AND state = 'running'",
+        (shard,),
+    )
+    return cur.rowcount
+
+
+def depth(conn):
+    """Queued updates per shard."""
+    rows = conn.execute(
+        "SELECT shard, COUNT(*) FROM updates WHERE state = 'queued' GROUP BY shard"
+    ).fetchall()
+    return dict(rows)
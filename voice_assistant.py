@@ -31,19 +31,12 @@ def transcribe_audio_free(audio_file_path):
             # For free tier without API key, we'll use a simple approach
             # In production, use proper speech-to-text service
             
-            # Using SpeechRecognition library as fallback
-            import speech_recognition as sr
-            recognizer = sr.Recognizer()
-            
-            with sr.AudioFile(audio_file_path) as source:
-                audio = recognizer.record(source)
-            
+            # Using the configured STT backend (stt.py) as fallback
+            import stt
             try:
-                text = recognizer.recognize_google(audio)
-                return text
-            except sr.UnknownValueError:
-                return "Could not understand audio"
-            except sr.RequestError:
+                text, _ = stt.transcribe(audio_file_path)
+                return text or "Could not understand audio"
+            except stt.STTUnavailable:
                 return "Error with speech recognition service"
     
     except Exception as e:
@@ -0,0 +1,76 @@
+# webhook_receiver.py - accept webhook updates without registering the webhook
+#
+# Application.run_webhook always calls setWebhook while bootstrapping (it
+# builds a URL from listen/port when none is given), so replicas started with
+# WEBHOOK_REGISTER=0 use this instead: a plain HTTP server that checks the
+# secret token, decodes the update and hands it to the running Application.
+# Nothing here talks to the Bot API; the registering replica owns the webhook.
+import json
+import signal
+import asyncio
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telegram import Update
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_BODY = 1 << 20  # Telegram updates are far smaller
+
+
+def _handler_class(app, loop, path, secret_token):
+    class _Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.split("?", 1)[0].strip("/") != path:
+                return self._reply(404)
+            if secret_token and self.headers.get(SECRET_HEADER) != secret_token:
+                return self._reply(403)
+            length = int(self.headers.get("Content-Length") or 0)
+            if not 0 < length <= MAX_BODY:
+                return self._reply(400)
+            try:
+                update = Update.de_json(json.loads(self.rfile.read(length)), app.bot)
+            except (ValueError, TypeError) as e:
+                logging.error("Bad webhook payload: %s", e)
+                return self._reply(400)
+            asyncio.run_coroutine_threadsafe(app.update_queue.put(update), loop).result()
+            self._reply(200)
+
+        def _reply(self, status):
+            self.send_response(status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return _Handler
+
+
+def start(app, loop, listen, port, path, secret_token=None):
+    """Serve POST /<path> from a daemon thread, feeding app.update_queue on `loop`."""
+    server = ThreadingHTTPServer((listen, port), _handler_class(app, loop, path.strip("/"), secret_token))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="webhook-receiver", daemon=True).start()
+    logging.info("Webhook receiver on http://%s:%d/%s (not registering)", listen, port, path)
+    return server
+
+
+async def serve(app, listen, port, path, secret_token=None, stop=None):
+    """Run `app` on updates POSTed to this replica until `stop` is set (or SIGINT/SIGTERM)."""
+    loop = asyncio.get_running_loop()
+    stop = stop or asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows, or not the main thread: Ctrl+C still ends asyncio.run
+    async with app:
+        await app.start()
+        server = start(app, loop, listen, port, path, secret_token)
+        try:
+            await stop.wait()
+        finally:
+            server.shutdown()
+            server.server_close()
+            await app.stop()
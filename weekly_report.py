@@ -1,31 +1,25 @@
 # weekly_report.py
-from google_sheets import get_finance, get_customers, get_tasks, get_inventory, add_report
+import threading
+
+import analytics
+from google_sheets import get_customers, get_tasks, get_low_stock, add_report, analytics_priority
 from datetime import datetime, timedelta
 
-def generate_weekly_report():
+def build_weekly_report():
     # Simple example summary. Customize as needed.
-    finance = get_finance()
-    customers = get_customers()
-    tasks = get_tasks()
-    inventory = get_inventory()
+    # Report reads queue behind sales/purchase writes
+    week_ago = datetime.utcnow().date() - timedelta(days=7)
+    # income/expense of the last 7 days from the columnar Finance table
+    total_income, total_expense = analytics.finance_totals(week_ago)
+    with analytics_priority():
+        customers = get_customers()
+        tasks = get_tasks()
 
     # Simple aggregates
-    total_income = 0
-    total_expense = 0
-    for f in finance:
-        try:
-            amt = float(f.get("Amount") or 0)
-        except:
-            amt = 0
-        if (f.get("Type") or "").lower() == "income":
-            total_income += amt
-        else:
-            total_expense += amt
-
     new_customers = len(customers)
     pending_tasks = sum(1 for t in tasks if (t.get("Status") or "").lower() != "done")
 
-    low_stock = [i for i in inventory if (float(i.get("Quantity") or 0) <= 5)]
+    low_stock = get_low_stock()  # kept in memory by the stock watcher
 
     report = (
         f"Weekly report ({datetime.utcnow().date().isoformat()}):\n"
@@ -35,7 +29,51 @@ def generate_weekly_report():
         f"Pending tasks: {pending_tasks}\n"
         f"Low stock items: {len(low_stock)}\n"
     )
+    return report
 
+def generate_weekly_report():
+    report = build_weekly_report()
     # Save to Report sheet
     add_report(report)
-    return report
\ No newline at end of file
+    return report
+
+def build_daily_report():
+    today = datetime.utcnow().date()
+    sales = analytics.sales_report(today, today)
+    purchases = analytics.purchase_report(today, today)
+    income, expense = analytics.finance_totals(today, today)
+    low_stock = get_low_stock()
+
+    return (
+        f"Daily report ({today.isoformat()}):\n"
+        f"Sales: ₹{sales['revenue']:.2f} ({sales['count']} entries)\n"
+        f"Profit: ₹{sales['profit']:.2f}\n"
+        f"Purchases: ₹{purchases['spent']:.2f}\n"
+        f"Income: ₹{income:.2f}\n"
+        f"Expense: ₹{expense:.2f}\n"
+        f"Low stock items: {len(low_stock)}\n"
+    )
+
+# ---------- PRECOMPUTED REPORTS ----------
+# The bot serves reports from here; a JobQueue job rebuilds them in the
+# background, and an explicit refresh rebuilds (and saves) one on demand.
+REPORTS = {"daily": build_daily_report, "weekly": build_weekly_report}
+_cache = {}  # kind -> (generated_at, text)
+_refresh_lock = threading.Lock()
+
+def refresh_report(kind, save=False):
+    """Rebuild one report now. save=True also appends it to the Report sheet."""
+    with _refresh_lock:
+        text = REPORTS[kind]()
+        entry = _cache[kind] = (datetime.utcnow(), text)
+    if save:
+        add_report(text)
+    return entry
+
+def refresh_reports():
+    for kind in REPORTS:
+        refresh_report(kind)
+
+def cached_report(kind):
+    """(generated_at, text) from the last refresh, or None before the first one."""
+    return _cache.get(kind)
@@ -0,0 +1,124 @@
+# workers.py - intake process + N worker processes sharded by chat id
+import os
+import json
+import asyncio
+import logging
+import threading
+import multiprocessing
+
+from telegram import Update
+from telegram.ext import Application, ApplicationHandlerStop, TypeHandler
+
+import update_queue
+
+UPDATE_QUEUE_PATH = os.getenv("UPDATE_QUEUE_PATH", "update_queue.sqlite3")
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "0.05"))
+WORKER_RESTART_DELAY = float(os.getenv("WORKER_RESTART_DELAY", "1"))
+
+# ---------- INTAKE ----------
+def build_intake_application(token, shards, db_path=UPDATE_QUEUE_PATH):
+    """Application that only receives updates and queues them for the workers."""
+    conn = update_queue.connect(db_path)
+
+    async def enqueue(update: Update, context):
+        chat = update.effective_chat
+        shard = update_queue.shard_for(chat.id if chat else 0, shards)
+        update_queue.put(conn, shard, json.dumps(update.to_dict()))
+        raise ApplicationHandlerStop
+
+    app = Application.builder().token(token).build()
+    app.add_handler(TypeHandler(Update, enqueue))
+    return app
+
+
+class Supervisor:
+    """Keeps one worker process alive per shard; a crashed worker is restarted."""
+
+    def __init__(self, shards, db_path=UPDATE_QUEUE_PATH):
+        self.shards = shards
+        self.db_path = db_path
+        # spawn: workers start clean instead of inheriting our threads
+        self.ctx = multiprocessing.get_context("spawn")
+        self.procs = {}
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def _spawn(self, shard):
+        p = self.ctx.Process(
+            target=run_worker, args=(shard, self.shards, self.db_path),
+            name=f"bot-worker-{shard}", daemon=True,
+        )
+        p.start()
+        self.procs[shard] = p
+        logging.info("Started worker %d (pid %s)", shard, p.pid)
+
+    def _watch(self):
+        while not self.stopping.wait(WORKER_RESTART_DELAY):
+            for shard, p in list(self.procs.items()):
+                if not p.is_alive():
+                    logging.error("Worker %d exited with code %s, restarting", shard, p.exitcode)
+                    self._spawn(shard)
+
+    def start(self):
+        for shard in range(self.shards):
+            self._spawn(shard)
+        self.thread = threading.Thread(target=self._watch, name="worker-supervisor", daemon=True)
+        self.thread.start()
+
+    def alive(self):
+        return sum(1 for p in self.procs.values() if p.is_alive())
+
+    def stop(self):
+        self.stopping.set()
+        for p in self.procs.values():
+            p.terminate()
+        for p in self.procs.values():
+            p.join(timeout=5)
+
+# ---------- WORKER ----------
+def run_worker(shard, shards, db_path=UPDATE_QUEUE_PATH):
+    """Process entry point: handle every queued update of one shard, in order."""
+    logging.basicConfig(format=f"%(asctime)s - worker-{shard} - %(levelname)s - %(message)s", level=logging.INFO)
+    asyncio.run(_worker_loop(shard, shards, db_path))
+
+
+async def _worker_loop(shard, shards, db_path):
+    # imported here so the intake process never loads the handler stack
+    import bot
+    import google_sheets as gs
+    import metrics
+    import status_server
+
+    # each worker exposes its own /metrics next to the intake's status port
+    metrics.add_metrics_route()
+    status_server.start(bot.STATUS_HOST, bot.STATUS_PORT + 1 + shard)
+
+    conn = update_queue.connect(db_path)
+    requeued = update_queue.recover(conn, shard)
+    if requeued:
+        logging.warning("Re-queued %d update(s) left running by a crashed worker", requeued)
+
+    # the Sheets quota is per user, not per process: split it between the workers
+    gs.use_quota_share(shards)
+    # a journal file per shard, so degraded-mode writes replay in shard order
+    root, ext = os.path.splitext(gs.SHEETS_JOURNAL)
+    gs.use_journal(f"{root}.{shard}{ext}")
+    bot.start_warm_up()
+    app = bot.build_application()
+    bot.schedule_local_jobs(app)
+    await app.initialize()
+    await app.start()
+    try:
+        while True:
+            job = update_queue.claim(conn, shard)
+            if job is None:
+                await asyncio.sleep(WORKER_POLL_INTERVAL)
+                continue
+            update_id, payload = job
+            update = Update.de_json(json.loads(payload), app.bot)
+            # handler errors are caught and logged by the Application
+            await app.process_update(update)
+            update_queue.done(conn, update_id)
+    finally:
+        await app.stop()
+        await app.shutdown()